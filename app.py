@@ -1,4 +1,5 @@
-from utils.db import init_db
+from utils.db import init_db, get_pool_metrics
+from utils.emergency_outbox import OUTBOX_IN_PROCESS_WORKER, start_outbox_worker, get_outbox_stats
 
 import streamlit as st
 
@@ -68,6 +69,29 @@ def display_system_info():
             st.write("**Environment:**")
             st.write(f"Python: {sys.version.split()[0]}")
             st.write("Running on CPU")
+            
+            st.write("**Database Pool:**")
+            pool_metrics = get_pool_metrics()
+            st.write(f"Checked out: {pool_metrics['checked_out']} / {pool_metrics['pool_size']} (overflow {pool_metrics['overflow']})")
+            st.write(f"Max checkout wait: {pool_metrics['wait_seconds_max'] * 1000:.1f} ms")
+            
+            st.write("**Facility Registry:**")
+            from utils.location_utils import get_facility_registry
+            registry_stats = get_facility_registry().get_stats()
+            st.write(f"{registry_stats['facilities']} facilities, cache hits {registry_stats['hits']} / misses {registry_stats['misses']}")
+            
+            st.write("**Triage Rules:**")
+            from utils.triage_rules import get_catalog_status
+            catalog_status = get_catalog_status()
+            st.write(f"Version {catalog_status['version']}")
+            if catalog_status['error']:
+                st.warning(f"Rule catalog not reloaded: {catalog_status['error']}")
+            
+            st.write("**Emergency Outbox:**")
+            outbox_stats = get_outbox_stats()
+            st.write(f"Queued {outbox_stats['queued']}, failed {outbox_stats['failed']}")
+            if outbox_stats['detected_to_sent_p50'] is not None:
+                st.write(f"Alert latency: p50 {outbox_stats['detected_to_sent_p50']:.1f} s, p95 {outbox_stats['detected_to_sent_p95']:.1f} s")
         
         with col2:
             st.write("**AI Model Status:**")
@@ -192,6 +216,11 @@ def load_model():
     st.session_state.model_loaded = True
     st.session_state.model_manager = model_manager
     
+    local_status = model_status["local_backend"]
+    if local_status["state"] in ("loading", "ready"):
+        st.info(f"🖥️ Local {local_status['backend']} model {local_status['model']}: {local_status['state']} "
+                f"({local_status['replicas_loaded']} warm replica(s))")
+    
     if model_status["api_available"]:
         st.success("⚡ Bolt AI models deployed successfully!")
         if not model_status["api_token_configured"]:
@@ -323,6 +352,10 @@ def main():
     """Main application entry point"""
     # Initialize database
     init_db()
+    
+    # Retry emergency alerts left unsent by an interrupted run
+    if OUTBOX_IN_PROCESS_WORKER:
+        start_outbox_worker()
 
     # Initialize session state
     initialize_session_state()
@@ -27,21 +27,8 @@ def show_chat_page():
     # Display chat history with Bolt.new styling
     chat_container = st.container()
     with chat_container:
-        for i, message in enumerate(st.session_state.chat_history):
-            if message['role'] == 'user':
-                st.markdown(f"""
-                <div class="bolt-card" style="background: rgba(37, 99, 235, 0.1); border-left: 4px solid #2563eb; color: #1f2937;">
-                    <strong>👤 You ({message['timestamp']}):</strong><br>
-                    {message['content']}
-                </div>
-                """, unsafe_allow_html=True)
-            else:
-                st.markdown(f"""
-                <div class="bolt-card" style="background: rgba(5, 150, 105, 0.1); border-left: 4px solid #059669; color: #1f2937;">
-                    <strong>🤖 Bolt AI Assistant ({message['timestamp']}):</strong><br>
-                    {message['content']}
-                </div>
-                """, unsafe_allow_html=True)
+        for message in st.session_state.chat_history:
+            render_chat_message(message)
     
     # Chat input
     st.subheader("Send Message")
@@ -56,26 +43,11 @@ def show_chat_page():
             emergency_button = st.form_submit_button("🚨 EMERGENCY", type="secondary")
         
         if send_button and user_message:
-            # Add user message to chat history
-            timestamp = datetime.now().strftime("%H:%M")
-            st.session_state.chat_history.append({
-                'role': 'user',
-                'content': user_message,
-                'timestamp': timestamp
-            })
-            
             # Check for emergency keywords
             severity_assessment = emergency_manager.assess_symptom_severity(user_message)
             
-            # Generate AI response
-            ai_response = generate_ai_response(user_message, severity_assessment)
-            
-            # Add AI response to chat history
-            st.session_state.chat_history.append({
-                'role': 'assistant',
-                'content': ai_response,
-                'timestamp': timestamp
-            })
+            # Show the exchange under the history, streaming the AI response as it is generated
+            post_message(user_message, chat_container, severity_assessment)
             
             # Check if emergency mode should be activated
             if severity_assessment['is_emergency']:
@@ -85,8 +57,9 @@ def show_chat_page():
                 
                 # Show emergency hospital calling options
                 show_emergency_hospital_calling(emergency_manager)
-            
-            st.rerun()
+                
+                # Switch the app into emergency mode
+                st.rerun()
         
         if emergency_button:
             st.session_state.emergency_mode = True
@@ -99,17 +72,17 @@ def show_chat_page():
     with col1:
         if st.button("💊 Medication Questions"):
             quick_message = "I have questions about my medications and potential side effects."
-            add_quick_message(quick_message)
+            add_quick_message(quick_message, chat_container)
     
     with col2:
         if st.button("🤒 Symptom Check"):
             quick_message = "I'm experiencing some symptoms and would like guidance."
-            add_quick_message(quick_message)
+            add_quick_message(quick_message, chat_container)
     
     with col3:
         if st.button("🏃 Wellness Tips"):
             quick_message = "I'd like some general wellness and health tips."
-            add_quick_message(quick_message)
+            add_quick_message(quick_message, chat_container)
     
     # Clear chat button
     if st.session_state.chat_history:
@@ -117,41 +90,72 @@ def show_chat_page():
             st.session_state.chat_history = []
             st.rerun()
 
-def add_quick_message(message):
-    """Add quick message to chat"""
+def render_chat_message(message, target=None):
+    """Render a chat message card, into target (e.g. an st.empty placeholder) if given"""
+    if message['role'] == 'user':
+        html = f"""
+        <div class="bolt-card" style="background: rgba(37, 99, 235, 0.1); border-left: 4px solid #2563eb; color: #1f2937;">
+            <strong>👤 You ({message['timestamp']}):</strong><br>
+            {message['content']}
+        </div>
+        """
+    else:
+        html = f"""
+        <div class="bolt-card" style="background: rgba(5, 150, 105, 0.1); border-left: 4px solid #059669; color: #1f2937;">
+            <strong>🤖 Bolt AI Assistant ({message['timestamp']}):</strong><br>
+            {message['content']}
+        </div>
+        """
+    (target or st).markdown(html, unsafe_allow_html=True)
+
+def post_message(user_message, chat_container, severity_assessment=None):
+    """Add a user message and the streamed AI response to the chat"""
     timestamp = datetime.now().strftime("%H:%M")
-    st.session_state.chat_history.append({
-        'role': 'user',
-        'content': message,
-        'timestamp': timestamp
-    })
+    user_entry = {'role': 'user', 'content': user_message, 'timestamp': timestamp}
+    st.session_state.chat_history.append(user_entry)
     
-    # Generate AI response
-    ai_response = generate_ai_response(message)
-    st.session_state.chat_history.append({
-        'role': 'assistant',
-        'content': ai_response,
-        'timestamp': timestamp
-    })
+    with chat_container:
+        render_chat_message(user_entry)
+        placeholder = st.empty()
+        ai_entry = {'role': 'assistant', 'content': "", 'timestamp': timestamp}
+        for chunk in stream_ai_response(user_message, severity_assessment):
+            ai_entry['content'] += chunk
+            render_chat_message(dict(ai_entry, content=ai_entry['content'] + " ▌"), placeholder)
+        render_chat_message(ai_entry, placeholder)
     
-    st.rerun()
+    st.session_state.chat_history.append(ai_entry)
 
-def generate_ai_response(user_message, severity_assessment=None):
-    """Generate AI response using Hugging Face models"""
-    from utils.ai_models import model_manager
-    
+def add_quick_message(message, chat_container):
+    """Add quick message to chat"""
+    post_message(message, chat_container)
+
+def stream_ai_response(user_message, severity_assessment=None):
+    """Yield the AI response in chunks as the Hugging Face model generates it"""
     # Check if AI models are loaded
     if hasattr(st.session_state, 'model_manager') and st.session_state.model_manager:
+        emitted = False
         try:
-            # Use the AI model for response generation
-            ai_response = st.session_state.model_manager.generate_medical_response(user_message)
-            if ai_response:
-                return ai_response
+            # Never answer a message triaged as an emergency from the cache
+            is_emergency = bool(severity_assessment and severity_assessment['is_emergency'])
+            for chunk in st.session_state.model_manager.stream_medical_response(
+                user_message, bypass_cache=is_emergency
+            ):
+                emitted = True
+                yield chunk
         except Exception as e:
             st.warning(f"AI model temporarily unavailable: {str(e)}")
+        if emitted:
+            return
     
     # Fallback to rule-based responses if AI is not available
-    
+    yield generate_fallback_response(user_message, severity_assessment)
+
+def generate_ai_response(user_message, severity_assessment=None):
+    """Generate AI response using Hugging Face models"""
+    return "".join(stream_ai_response(user_message, severity_assessment))
+
+def generate_fallback_response(user_message, severity_assessment=None):
+    """Generate a rule-based response when the AI model is not available"""
     message_lower = user_message.lower()
     
     # Emergency responses
@@ -222,7 +226,7 @@ def show_emergency_hospital_calling(emergency_manager):
     
     st.error("🚨 DANGEROUS SYMPTOMS DETECTED - IMMEDIATE MEDICAL ATTENTION REQUIRED")
     
-    location_manager = LocationManager()
+    location_manager = LocationManager(st.session_state)
     
     # Get nearest hospitals
     try:
@@ -12,8 +12,8 @@ def show_emergency_response():
     
     # Initialize managers
     emergency_manager = EmergencyManager()
-    location_manager = LocationManager()
-    notification_manager = NotificationManager()
+    location_manager = LocationManager(st.session_state)
+    notification_manager = NotificationManager(st.session_state.get("username"))
     auth_manager = AuthManager()
     
     # Emergency status banner
@@ -176,6 +176,17 @@ def display_emergency_assessment(assessment, emergency_manager):
         with col2:
             if st.button("📞 ALERT CONTACTS", type="secondary"):
                 emergency_manager.notify_emergency_contacts(f"Emergency assessment: {recommendation['level']}")
+        
+        # Nearest open hospitals equipped for the detected condition
+        facilities = emergency_manager.find_facilities_for_assessment(assessment)
+        if facilities:
+            st.subheader("🏥 Recommended Hospitals")
+            for facility in facilities:
+                capabilities = ", ".join(c.replace("_", " ").title() for c in facility["matched_capabilities"])
+                st.write(f"**{facility['name']}** - {facility['distance']} miles ({capabilities})")
+                if facility["missing_capabilities"]:
+                    missing = ", ".join(c.replace("_", " ").title() for c in facility["missing_capabilities"])
+                    st.caption(f"No open facility within range offers: {missing}")
     
     elif recommendation['level'] == 'CONCERNING':
         st.warning(f"⚠️ **{recommendation['level']}**")
@@ -208,9 +219,12 @@ def show_emergency_map(location_manager):
         return
     
     # Get nearby facilities
-    hospitals = location_manager.find_nearby_facilities("hospitals", max_distance=25)
-    pharmacies = location_manager.find_nearby_facilities("pharmacies", max_distance=10)
-    urgent_care = location_manager.find_nearby_facilities("urgent_care", max_distance=15)
+    by_type = location_manager.find_nearby_facilities_by_type(
+        {"hospitals": 25, "pharmacies": 10, "urgent_care": 15}, location
+    )
+    hospitals = by_type.get("hospitals", [])
+    pharmacies = by_type.get("pharmacies", [])
+    urgent_care = by_type.get("urgent_care", [])
     
     # Create map
     try:
@@ -564,12 +578,12 @@ def send_emergency_sms(contact, notification_manager):
     """Send emergency SMS to specific contact"""
     message = f"🚨 EMERGENCY: This is an urgent message from HealthAssist AI. {st.session_state.get('username', 'User')} may need immediate assistance. Please respond or call them directly."
     
-    success = notification_manager.send_sms(contact['phone'], message)
+    delivery = notification_manager.send_sms_delivery(contact['phone'], message)
     
-    if success:
+    if delivery.success:
         st.success(f"✅ Emergency SMS sent to {contact['name']}")
     else:
-        st.error(f"❌ Failed to send SMS to {contact['name']}")
+        st.error(f"❌ Failed to send SMS to {contact['name']}: {delivery.error}")
 
 def show_nearest_hospital(location_manager):
     """Show nearest hospital information"""
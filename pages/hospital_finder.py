@@ -22,7 +22,7 @@ def show_hospital_finder():
     </div>
     """, unsafe_allow_html=True)
     
-    location_manager = LocationManager()
+    location_manager = LocationManager(st.session_state)
     emergency_manager = EmergencyManager()
     
     # Location input section
@@ -79,10 +79,10 @@ def show_hospital_finder():
         # Get facilities
         try:
             if facility_type == "all":
-                hospitals = location_manager.find_nearby_facilities("hospitals", max_distance)
-                urgent_care = location_manager.find_nearby_facilities("urgent_care", max_distance)
-                pharmacies = location_manager.find_nearby_facilities("pharmacies", max_distance)
-                facilities = hospitals + urgent_care + pharmacies
+                by_type = location_manager.find_nearby_facilities_by_type(
+                    {"hospitals": max_distance, "urgent_care": max_distance, "pharmacies": max_distance}
+                )
+                facilities = by_type["hospitals"] + by_type["urgent_care"] + by_type["pharmacies"]
             else:
                 facilities = location_manager.find_nearby_facilities(facility_type, max_distance)
             
@@ -198,23 +198,18 @@ def show_enhanced_facility_list(facilities, location_manager, emergency_manager)
     """Display enhanced list of facilities with quick actions"""
     st.subheader("🏥 Nearby Facilities")
     
-    # Sort facilities by distance if user location is available
+    # Rank by estimated drive time plus reported wait, not straight-line distance
     if st.session_state.get('user_location'):
-        user_lat = st.session_state.user_location['lat']
-        user_lng = st.session_state.user_location['lng']
-        
-        for facility in facilities:
-            distance = location_manager.calculate_distance(
-                user_lat, user_lng,
-                facility['coordinates']['lat'],
-                facility['coordinates']['lng']
-            )
-            facility['distance'] = distance
-        
-        facilities.sort(key=lambda x: x.get('distance', float('inf')))
+        facilities = location_manager.rank_facilities_by_eta(facilities)
     
     for i, facility in enumerate(facilities):
-        with st.expander(f"🏥 {facility['name']}" + (f" ({facility['distance']:.1f} miles)" if 'distance' in facility else "")):
+        title = f"🏥 {facility['name']}"
+        if 'distance' in facility:
+            title += f" ({facility['distance']:.1f} miles"
+            if 'eta_minutes' in facility:
+                title += f", ~{facility['eta_minutes']:.0f} min drive"
+            title += ")"
+        with st.expander(title):
             
             col1, col2, col3 = st.columns([2, 1, 1])
             
@@ -346,7 +341,7 @@ def show_emergency_hospital_map():
     """Quick emergency hospital finder"""
     st.subheader("🚨 Emergency Hospital Finder")
     
-    location_manager = LocationManager()
+    location_manager = LocationManager(st.session_state)
     emergency_facilities = location_manager.find_nearby_facilities("hospitals", 25)
     
     # Filter for emergency rooms only
@@ -8,7 +8,7 @@ def show_notifications():
     st.title("🔔 Notifications & Alerts")
     st.write("Manage your health notifications, reminders, and emergency alerts.")
     
-    notification_manager = NotificationManager()
+    notification_manager = NotificationManager(st.session_state.get("username"))
     auth_manager = AuthManager()
     username = st.session_state.get('username')
     
@@ -50,37 +50,48 @@ def show_all_notifications(notification_manager, username):
     with col3:
         show_read = st.checkbox("Include read notifications", value=True)
     
-    # Get notifications
+    # Get notifications (date and read filters are applied before the page limit)
     notification_type = None if filter_type == "All" else filter_type
-    notifications = notification_manager.get_notifications(
+    cutoff_date = datetime.now() - timedelta(days=days_back)
+    
+    # Reset paging whenever the filters change
+    filters = (notification_type, days_back, show_read)
+    if st.session_state.get('notification_filters') != filters:
+        st.session_state.notification_filters = filters
+        st.session_state.notification_cursors = [None]
+    cursors = st.session_state.notification_cursors
+    
+    page = notification_manager.get_notifications_page(
         user=username, 
         notification_type=notification_type,
-        limit=50
+        limit=50,
+        since=cutoff_date,
+        unread_only=not show_read,
+        before=cursors[-1]
     )
-    
-    # Filter by date
-    cutoff_date = datetime.now() - timedelta(days=days_back)
-    notifications = [
-        n for n in notifications 
-        if datetime.fromisoformat(n['timestamp']) >= cutoff_date
-    ]
-    
-    # Filter by read status
-    if not show_read:
-        notifications = [n for n in notifications if not n.get('read', False)]
+    notifications = page['notifications']
     
     if notifications:
         # Display notifications
         for notification in notifications:
             display_notification(notification, notification_manager)
         
+        # Paging
+        col1, col2 = st.columns(2)
+        with col1:
+            if len(cursors) > 1 and st.button("◀ Newer notifications"):
+                cursors.pop()
+                st.rerun()
+        with col2:
+            if page['next_cursor'] and st.button("Older notifications ▶"):
+                cursors.append(page['next_cursor'])
+                st.rerun()
+        
         # Mark all as read button
-        unread_count = len([n for n in notifications if not n.get('read', False)])
-        if unread_count > 0:
-            if st.button(f"Mark all {unread_count} notifications as read"):
-                for notification in notifications:
-                    if not notification.get('read', False):
-                        notification_manager.mark_notification_read(notification['id'])
+        unread_ids = [n['id'] for n in notifications if not n.get('read', False)]
+        if unread_ids:
+            if st.button(f"Mark all {len(unread_ids)} notifications as read"):
+                notification_manager.mark_all_read(username, unread_ids)
                 st.success("All notifications marked as read!")
                 st.rerun()
     
@@ -271,7 +282,7 @@ def show_emergency_contacts(auth_manager, username):
         st.write("**Test Emergency Notification:**")
         if st.button("🧪 Send Test Alert", help="Send a test emergency alert to all contacts"):
             from utils.notification_utils import NotificationManager
-            notification_manager = NotificationManager()
+            notification_manager = NotificationManager(st.session_state.get("username"))
             
             test_message = f"TEST ALERT: This is a test emergency notification from HealthAssist AI for user {username}. Please disregard - this is only a test."
             
@@ -345,13 +356,13 @@ TWILIO_PHONE_NUMBER=your_twilio_phone_number
             if st.form_submit_button("Send Test SMS"):
                 if test_phone and test_message:
                     from utils.notification_utils import NotificationManager
-                    notification_manager = NotificationManager()
+                    notification_manager = NotificationManager(st.session_state.get("username"))
                     
-                    success = notification_manager.send_sms(test_phone, test_message)
+                    delivery = notification_manager.send_sms_delivery(test_phone, test_message)
                     
-                    if success:
+                    if delivery.success:
                         st.success("✅ Test SMS sent successfully!")
                     else:
-                        st.error("❌ Failed to send test SMS. Check phone number and try again.")
+                        st.error(f"❌ Failed to send test SMS: {delivery.error}")
                 else:
                     st.error("Please enter both phone number and message.")
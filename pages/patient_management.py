@@ -1,7 +1,7 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
-from utils.health_data import HealthDataManager
+from utils.health_data import HealthDataManager, get_health_status
 from utils.auth_utils import AuthManager
 
 def show_patient_management():
@@ -36,71 +36,91 @@ def show_patient_list(health_manager):
     """Display list of all patients"""
     st.subheader("📋 Patient Directory")
     
-    patients = health_manager.get_all_patients()
+    # Search and filter
+    col1, col2, col3 = st.columns([2, 1, 1])
+    with col1:
+        search_term = st.text_input("🔍 Search patients by name or ID:")
+    with col2:
+        status_filter = st.selectbox("Filter by status:", ["All", "Excellent", "Good", "Needs Attention"])
+    with col3:
+        page_size = st.selectbox("Patients per page:", [25, 50, 100], index=1)
+    
+    # Reset paging whenever the search or filters change
+    filters = (search_term, status_filter, page_size)
+    if st.session_state.get('patient_directory_filters') != filters:
+        st.session_state.patient_directory_filters = filters
+        st.session_state.patient_directory_page = 1
+    page = st.session_state.patient_directory_page
+    directory = health_manager.get_patient_directory(
+        search=search_term or None,
+        status=None if status_filter == "All" else status_filter,
+        page=page,
+        page_size=page_size
+    )
+    total_pages = max(1, -(-directory['total'] // page_size))
+    
+    if directory['total'] == 0 and not search_term and status_filter == "All":
+        st.info("No patients registered yet.")
+        return
     
-    if patients:
-        # Create patient DataFrame
-        patient_data = []
-        for patient_id, patient_info in patients.items():
-            last_visit = get_last_visit(health_manager, patient_id)
-            health_score = health_manager.calculate_health_score(patient_id)
-            
-            patient_data.append({
-                "ID": patient_id,
-                "Name": f"{patient_info.get('first_name', '')} {patient_info.get('last_name', '')}",
-                "Age": patient_info.get('age', 'N/A'),
-                "Gender": patient_info.get('gender', 'N/A'),
-                "Last Visit": last_visit,
-                "Health Score": f"{health_score}/100",
-                "Status": get_patient_status(health_score)
-            })
+    if page > total_pages:
+        st.session_state.patient_directory_page = total_pages
+        st.rerun()
+    
+    # Create patient DataFrame
+    patient_data = []
+    for patient in directory['patients']:
+        patient_data.append({
+            "ID": patient['patient_id'],
+            "Name": f"{patient['first_name']} {patient['last_name']}",
+            "Age": patient['age'] if patient['age'] is not None else 'N/A',
+            "Gender": patient['gender'] or 'N/A',
+            "Last Visit": patient['last_visit'].strftime("%Y-%m-%d") if patient['last_visit'] else "Never",
+            "Health Score": patient['health_score'],
+            "Status": patient['status']
+        })
+    
+    df = pd.DataFrame(patient_data)
+    
+    # Display patient table
+    if not df.empty:
+        st.dataframe(
+            df,
+            use_container_width=True,
+            column_config={
+                "Health Score": st.column_config.ProgressColumn(
+                    "Health Score",
+                    help="Overall health score",
+                    min_value=0,
+                    max_value=100,
+                ),
+            }
+        )
         
-        df = pd.DataFrame(patient_data)
-        
-        # Search and filter
-        col1, col2 = st.columns([2, 1])
+        # Pagination controls
+        col1, col2, col3 = st.columns([1, 2, 1])
         with col1:
-            search_term = st.text_input("🔍 Search patients by name or ID:")
+            if st.button("◀ Previous", disabled=page <= 1):
+                st.session_state.patient_directory_page = page - 1
+                st.rerun()
         with col2:
-            status_filter = st.selectbox("Filter by status:", ["All", "Excellent", "Good", "Needs Attention"])
-        
-        # Apply filters
-        if search_term:
-            df = df[df['Name'].str.contains(search_term, case=False, na=False) | 
-                   df['ID'].str.contains(search_term, case=False, na=False)]
+            st.caption(f"Page {page} of {total_pages} • {directory['total']} patients")
+        with col3:
+            if st.button("Next ▶", disabled=page >= total_pages):
+                st.session_state.patient_directory_page = page + 1
+                st.rerun()
         
-        if status_filter != "All":
-            df = df[df['Status'] == status_filter]
+        # Patient selection for details
+        selected_patient = st.selectbox(
+            "Select patient for details:",
+            options=[""] + df['ID'].tolist(),
+            format_func=lambda x: f"{x} - {df[df['ID']==x]['Name'].iloc[0]}" if x and x in df['ID'].values else "Select a patient..."
+        )
         
-        # Display patient table
-        if not df.empty:
-            st.dataframe(
-                df,
-                use_container_width=True,
-                column_config={
-                    "Health Score": st.column_config.ProgressColumn(
-                        "Health Score",
-                        help="Overall health score",
-                        min_value=0,
-                        max_value=100,
-                    ),
-                }
-            )
-            
-            # Patient selection for details
-            selected_patient = st.selectbox(
-                "Select patient for details:",
-                options=[""] + df['ID'].tolist(),
-                format_func=lambda x: f"{x} - {df[df['ID']==x]['Name'].iloc[0]}" if x and x in df['ID'].values else "Select a patient..."
-            )
-            
-            if selected_patient:
-                st.session_state.selected_patient_id = selected_patient
-        else:
-            st.info("No patients found matching your criteria.")
-    
+        if selected_patient:
+            st.session_state.selected_patient_id = selected_patient
     else:
-        st.info("No patients registered yet.")
+        st.info("No patients found matching your criteria.")
 
 def show_patient_details(health_manager):
     """Display detailed patient information"""
@@ -313,9 +333,9 @@ def show_patient_analytics(health_manager):
     """Show patient analytics and statistics"""
     st.subheader("📊 Patient Analytics")
     
-    patients = health_manager.get_all_patients()
+    stats = health_manager.get_health_score_stats()
     
-    if not patients:
+    if not stats['total_patients']:
         st.info("No patients to analyze.")
         return
     
@@ -323,29 +343,25 @@ def show_patient_analytics(health_manager):
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        st.metric("Total Patients", len(patients))
+        st.metric("Total Patients", stats['total_patients'])
     
     with col2:
-        # Calculate average health score
-        health_scores = [health_manager.calculate_health_score(pid) for pid in patients.keys()]
-        avg_score = sum(health_scores) / len(health_scores) if health_scores else 0
-        st.metric("Avg Health Score", f"{avg_score:.1f}/100")
+        st.metric("Avg Health Score", f"{stats['average_score']:.1f}/100")
     
     with col3:
         # Count patients needing attention
-        needs_attention = sum(1 for score in health_scores if score < 70)
-        st.metric("Needs Attention", needs_attention)
+        st.metric("Needs Attention", stats['needs_attention'])
     
     with col4:
         # Count high-risk patients
-        high_risk = sum(1 for score in health_scores if score < 50)
-        st.metric("High Risk", high_risk)
+        st.metric("High Risk", stats['high_risk'])
     
     # Demographics
     st.subheader("Demographics")
     
     # Age distribution
-    ages = [p.get('age', 0) for p in patients.values() if isinstance(p.get('age'), int)]
+    patients = health_manager.get_all_patients()
+    ages = [p.get('age', 0) for p in patients if isinstance(p.get('age'), int)]
     if ages:
         import plotly.express as px
         
@@ -368,18 +384,6 @@ def show_patient_analytics(health_manager):
         fig = px.pie(values=age_counts.values, names=age_counts.index, title="Age Distribution")
         st.plotly_chart(fig, use_container_width=True)
 
-def get_last_visit(health_manager, patient_id):
-    """Get last visit date for patient"""
-    records = health_manager.get_health_records(patient_id, limit=1)
-    if records:
-        return datetime.fromisoformat(records[0]['timestamp']).strftime("%Y-%m-%d")
-    return "Never"
-
 def get_patient_status(health_score):
     """Get patient status based on health score"""
-    if health_score >= 90:
-        return "Excellent"
-    elif health_score >= 70:
-        return "Good"
-    else:
-        return "Needs Attention"
+    return get_health_status(health_score)
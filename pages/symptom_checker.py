@@ -11,7 +11,7 @@ def show_symptom_checker():
     
     # Initialize managers
     emergency_manager = EmergencyManager()
-    location_manager = LocationManager()
+    location_manager = LocationManager(st.session_state)
     health_manager = HealthDataManager()
     
     # Quick Emergency Access
@@ -188,7 +188,7 @@ def show_nearby_hospitals():
     """Show nearby hospitals and emergency facilities"""
     st.subheader("🏥 Nearby Emergency Facilities")
     
-    location_manager = LocationManager()
+    location_manager = LocationManager(st.session_state)
     emergency_manager = EmergencyManager()
     
     # Get nearby hospitals
@@ -228,7 +228,7 @@ def show_emergency_map(facilities):
         import folium
         from streamlit_folium import st_folium
         
-        location_manager = LocationManager()
+        location_manager = LocationManager(st.session_state)
         user_location = location_manager.get_current_location()
         
         if user_location:
@@ -282,7 +282,8 @@ def save_symptom_record(symptoms, severity_assessment, health_manager):
                 "severity_score": severity_assessment['severity_score'],
                 "is_emergency": severity_assessment['is_emergency'],
                 "recommendation": severity_assessment['recommendation'],
-                "detected_conditions": severity_assessment['detected_conditions']
+                "detected_conditions": severity_assessment['detected_conditions'],
+                "rules_version": severity_assessment.get('rules_version')
             }
             
             health_manager.add_health_record(username, "symptoms", symptom_data)
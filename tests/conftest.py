@@ -0,0 +1,7 @@
+import os
+import tempfile
+
+# utils.db binds its engine at import time, so the test database must be chosen
+# before any test module imports it
+_database_dir = tempfile.mkdtemp(prefix="healthassist-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_database_dir, 'test.db')}"
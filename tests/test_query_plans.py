@@ -0,0 +1,18 @@
+import pytest
+
+from utils.db import init_db
+from utils.migrations import check_query_plans
+
+HOT_QUERIES = ("get_vital_signs", "get_symptoms_history", "get_last_visit")
+
+
+@pytest.fixture(scope="module")
+def query_plans():
+    init_db()
+    return check_query_plans()
+
+
+@pytest.mark.parametrize("name", HOT_QUERIES)
+def test_hot_query_uses_its_index(query_plans, name):
+    assert name in query_plans
+    assert query_plans[name] == [], f"{name}: {', '.join(query_plans[name])}"
@@ -4,10 +4,35 @@ Supports multiple modern medical AI models for healthcare assistance
 """
 
 import requests
+from requests.adapters import HTTPAdapter
 import os
 import json
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional
 import streamlit as st
+from utils.circuit_breaker import CircuitBreaker
+from utils.inference_cache import InferenceCache, make_cache_key
+from utils.local_inference import get_local_backend, LocalModelError
+from utils.triage_rules import get_triage_catalog, matches_in
+from utils.triage import classify_severity_level
+
+# Point at a local stub server to exercise the client offline
+HUGGINGFACE_API_URL = os.getenv("HUGGINGFACE_API_URL", "https://api-inference.huggingface.co/models")
+HF_CONNECT_TIMEOUT = float(os.getenv("HF_CONNECT_TIMEOUT", "3"))
+HF_READ_TIMEOUT = float(os.getenv("HF_READ_TIMEOUT", "30"))
+HF_HEALTH_TIMEOUT = float(os.getenv("HF_HEALTH_TIMEOUT", "2"))
+HF_POOL_SIZE = int(os.getenv("HF_POOL_SIZE", "10"))
+
+# Responses that mean the API itself is unhealthy, as opposed to a bad request
+UNHEALTHY_STATUS_CODES = {429, 500, 502, 504}
+
+# Longest model answer shown before the disclaimer
+MAX_RESPONSE_CHARS = 500
+
+MEDICAL_DISCLAIMER = "\n\n**Important**: This is general information only. Please consult with a healthcare professional for personalized medical advice."
+
+
+class ModelStreamError(Exception):
+    """Raised by stream_model when a streamed generation cannot start or is cut off"""
 
 
 class HuggingFaceModelManager:
@@ -15,7 +40,22 @@ class HuggingFaceModelManager:
     
     def __init__(self):
         self.api_token = os.getenv("HUGGINGFACE_API_TOKEN")
-        self.base_url = "https://api-inference.huggingface.co/models"
+        self.base_url = HUGGINGFACE_API_URL.rstrip("/")
+        
+        # One keep-alive session for every call, so requests reuse pooled TCP/TLS connections
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=HF_POOL_SIZE, pool_maxsize=HF_POOL_SIZE)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        if self.api_token:
+            self.session.headers["Authorization"] = f"Bearer {self.api_token}"
+        
+        # Fails calls fast while the API is down and caches its health between checks
+        self.circuit_breaker = CircuitBreaker(
+            failure_threshold=int(os.getenv("HF_FAILURE_THRESHOLD", "3")),
+            reset_timeout=float(os.getenv("HF_RESET_TIMEOUT", "30")),
+            health_ttl=float(os.getenv("HF_HEALTH_TTL", "60"))
+        )
         
         # Available medical models
         self.models = {
@@ -42,6 +82,9 @@ class HuggingFaceModelManager:
         }
         
         self.fallback_responses = self._load_fallback_responses()
+        self.cache = InferenceCache()
+        # Shared by every manager in the process; disabled unless LOCAL_MODEL_BACKEND is set
+        self.local_backend = get_local_backend()
     
     def _load_fallback_responses(self) -> Dict:
         """Load fallback responses for when API is unavailable"""
@@ -68,74 +111,263 @@ class HuggingFaceModelManager:
         }
     
     def is_available(self) -> bool:
-        """Check if Hugging Face API is available"""
+        """Check if Hugging Face API is available, using the cached health while it is fresh"""
+        cached = self.circuit_breaker.cached_health()
+        if cached is not None:
+            return cached
+        if not self.circuit_breaker.allow_request():
+            return False
         try:
-            # Test with a simple request
-            response = requests.get(
+            response = self.session.get(
                 f"{self.base_url}/microsoft/DialoGPT-medium",
-                headers={"Authorization": f"Bearer {self.api_token}"} if self.api_token else {},
-                timeout=5
+                timeout=(HF_CONNECT_TIMEOUT, HF_HEALTH_TIMEOUT)
             )
-            return response.status_code in [200, 503]  # 503 means model is loading
-        except:
+        except requests.exceptions.RequestException:
+            self.circuit_breaker.record_failure()
             return False
+        if response.status_code in [200, 503]:  # 503 means model is loading
+            self.circuit_breaker.record_success()
+            return True
+        self.circuit_breaker.record_failure()
+        return False
     
-    def query_model(self, model_key: str, inputs: str, parameters: Optional[Dict] = None) -> Dict:
-        """Query a specific Hugging Face model"""
+    def query_model(self, model_key: str, inputs: str, parameters: Optional[Dict] = None, use_cache: bool = True) -> Dict:
+        """Query a specific Hugging Face model, serving repeated questions from the inference cache"""
         if model_key not in self.models:
             raise ValueError(f"Model {model_key} not available")
         
-        model = self.models[model_key]
-        headers = {}
-        if self.api_token:
-            headers["Authorization"] = f"Bearer {self.api_token}"
+        cache_key = make_cache_key(self.models[model_key]["name"], inputs, parameters)
+        if use_cache:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return {"success": True, "data": cached, "cached": True}
+        else:
+            self.cache.record_bypass()
         
+        if not self.circuit_breaker.allow_request():
+            return {"success": False, "error": "AI service unavailable (circuit open)", "circuit_open": True}
+        
+        model = self.models[model_key]
         payload = {"inputs": inputs}
         if parameters:
             payload["parameters"] = parameters
         
         try:
-            response = requests.post(
+            response = self.session.post(
                 model["endpoint"],
-                headers=headers,
                 json=payload,
-                timeout=30
+                timeout=(HF_CONNECT_TIMEOUT, HF_READ_TIMEOUT)
             )
-            
-            if response.status_code == 200:
-                return {"success": True, "data": response.json()}
-            elif response.status_code == 503:
-                return {"success": False, "error": "Model is loading, please try again in a moment"}
-            else:
-                return {"success": False, "error": f"API Error: {response.status_code}"}
-                
         except requests.exceptions.Timeout:
+            self.circuit_breaker.record_failure()
             return {"success": False, "error": "Request timeout"}
         except Exception as e:
+            self.circuit_breaker.record_failure()
             return {"success": False, "error": f"Connection error: {str(e)}"}
+        
+        if response.status_code == 200:
+            self.circuit_breaker.record_success()
+            data = response.json()
+            # Emergency calls skip the lookup but still refresh the entry
+            self.cache.set(cache_key, data)
+            return {"success": True, "data": data}
+        elif response.status_code == 503:
+            # The API answered; only this model is still loading
+            self.circuit_breaker.record_success()
+            return {"success": False, "error": "Model is loading, please try again in a moment"}
+        elif response.status_code in UNHEALTHY_STATUS_CODES:
+            self.circuit_breaker.record_failure()
+        else:
+            self.circuit_breaker.release()
+        return {"success": False, "error": f"API Error: {response.status_code}"}
+    
+    def stream_model(self, model_key: str, inputs: str, parameters: Optional[Dict] = None, use_cache: bool = True) -> Iterator[str]:
+        """Yield generated text chunks from a model as they arrive.
+
+        Text-generation endpoints stream tokens over server-sent events; endpoints
+        that answer with a single JSON body yield their whole text at once. The
+        finished text is stored in the inference cache under the same key as
+        query_model. Raises ModelStreamError if the call fails.
+        """
+        if model_key not in self.models:
+            raise ValueError(f"Model {model_key} not available")
+        
+        cache_key = make_cache_key(self.models[model_key]["name"], inputs, parameters)
+        if use_cache:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                yield self._extract_generated_text(cached)
+                return
+        else:
+            self.cache.record_bypass()
+        
+        if not self.circuit_breaker.allow_request():
+            raise ModelStreamError("AI service unavailable (circuit open)")
+        
+        payload = {"inputs": inputs, "stream": True}
+        if parameters:
+            payload["parameters"] = parameters
+        
+        try:
+            response = self.session.post(
+                self.models[model_key]["endpoint"],
+                json=payload,
+                stream=True,
+                timeout=(HF_CONNECT_TIMEOUT, HF_READ_TIMEOUT)
+            )
+        except requests.exceptions.RequestException as e:
+            self.circuit_breaker.record_failure()
+            raise ModelStreamError(f"Connection error: {str(e)}")
+        
+        # Every exit path settles the breaker exactly once, so a half-open probe is never left in flight
+        settled = False
+        generated = []
+        try:
+            if response.status_code != 200:
+                settled = True
+                if response.status_code == 503:
+                    self.circuit_breaker.record_success()
+                    raise ModelStreamError("Model is loading, please try again in a moment")
+                if response.status_code in UNHEALTHY_STATUS_CODES:
+                    self.circuit_breaker.record_failure()
+                else:
+                    self.circuit_breaker.release()
+                raise ModelStreamError(f"API Error: {response.status_code}")
+            
+            if "text/event-stream" not in response.headers.get("Content-Type", ""):
+                data = response.json()
+                settled = True
+                self.circuit_breaker.record_success()
+                self.cache.set(cache_key, data)
+                yield self._extract_generated_text(data)
+                return
+            
+            for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                event = json.loads(line[5:])
+                if "error" in event:
+                    settled = True
+                    self.circuit_breaker.record_failure()
+                    raise ModelStreamError(f"Generation error: {event['error']}")
+                token = event.get("token") or {}
+                if token.get("text") and not token.get("special"):
+                    generated.append(token["text"])
+                    yield token["text"]
+            settled = True
+            self.circuit_breaker.record_success()
+            self.cache.set(cache_key, [{"generated_text": "".join(generated)}])
+        except (requests.exceptions.RequestException, ValueError) as e:
+            # Dropped connection, read timeout between tokens, or a malformed event
+            if not settled:
+                settled = True
+                self.circuit_breaker.record_failure()
+            raise ModelStreamError(f"Stream interrupted: {str(e)}")
+        finally:
+            # Also runs when the consumer stops early (truncation, a Streamlit rerun), which
+            # aborts the generation server-side; tokens arriving means the service is healthy
+            if not settled:
+                if generated:
+                    self.circuit_breaker.record_success()
+                else:
+                    self.circuit_breaker.release()
+            response.close()
+    
+    def stream_local(self, inputs: str, parameters: Optional[Dict] = None, use_cache: bool = True) -> Iterator[str]:
+        """Yield generated text chunks from the local CPU model, using the same cache as the remote models.
+
+        Raises ModelStreamError if the local model is unavailable, busy or fails.
+        """
+        cache_key = make_cache_key(self.local_backend.model_name, inputs, parameters)
+        if use_cache:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                yield self._extract_generated_text(cached)
+                return
+        else:
+            self.cache.record_bypass()
+        
+        generated = []
+        try:
+            for chunk in self.local_backend.stream(inputs, parameters):
+                generated.append(chunk)
+                yield chunk
+        except LocalModelError as e:
+            raise ModelStreamError(str(e))
+        self.cache.set(cache_key, [{"generated_text": "".join(generated)}])
     
-    def generate_medical_response(self, user_message: str, context: Optional[str] = None) -> str:
-        """Generate medical response using available AI models"""
+    @staticmethod
+    def _extract_generated_text(data) -> str:
+        """Get the generated text from a text-generation response body"""
+        if isinstance(data, list) and data and isinstance(data[0], dict):
+            return data[0].get("generated_text", "")
+        return ""
+    
+    def stream_medical_response(self, user_message: str, context: Optional[str] = None, bypass_cache: bool = False) -> Iterator[str]:
+        """Stream a medical response chunk by chunk, falling back to rule-based text if the model fails.
+
+        The local model is tried first once it has loaded, then the Hugging Face API.
+        The chunks join to the same text generate_medical_response returns.
+        """
+        parameters = {"max_length": 200, "temperature": 0.7}
+        sources = []
+        if self.local_backend.is_available():
+            sources.append(self.stream_local(user_message, parameters, use_cache=not bypass_cache))
+        sources.append(self.stream_model("medical_chat", user_message, parameters, use_cache=not bypass_cache))
         
-        # First try Hugging Face API
-        if self.is_available():
+        emitted = 0
+        for chunks in sources:
             try:
-                # Use medical chat model for conversational responses
-                result = self.query_model(
-                    "medical_chat", 
-                    user_message,
-                    {"max_length": 200, "temperature": 0.7}
-                )
-                
-                if result["success"]:
-                    response_data = result["data"]
-                    if isinstance(response_data, list) and len(response_data) > 0:
-                        generated_text = response_data[0].get("generated_text", "")
-                        if generated_text:
-                            return self._format_medical_response(generated_text)
-                
-            except Exception as e:
-                st.warning(f"AI model temporarily unavailable: {str(e)}")
+                for chunk in chunks:
+                    if not emitted:
+                        chunk = chunk.lstrip()
+                    if emitted + len(chunk) > MAX_RESPONSE_CHARS:
+                        yield chunk[:max(0, MAX_RESPONSE_CHARS - 3 - emitted)] + "..."
+                        emitted = MAX_RESPONSE_CHARS
+                        break
+                    if chunk:
+                        emitted += len(chunk)
+                        yield chunk
+            except ModelStreamError:
+                if emitted:
+                    yield "\n\n_The response was interrupted._"
+            finally:
+                chunks.close()
+            if emitted:
+                break
+        
+        if emitted:
+            yield MEDICAL_DISCLAIMER
+        else:
+            yield self._generate_fallback_response(user_message)
+    
+    def generate_medical_response(self, user_message: str, context: Optional[str] = None, bypass_cache: bool = False) -> str:
+        """Generate medical response using available AI models.
+
+        bypass_cache forces a fresh model call; use it for messages triaged as emergencies.
+        """
+        if self.local_backend.is_available():
+            return "".join(self.stream_medical_response(user_message, context, bypass_cache))
+        
+        # First try Hugging Face API; query_model fails fast while the circuit is open
+        try:
+            # Use medical chat model for conversational responses
+            result = self.query_model(
+                "medical_chat", 
+                user_message,
+                {"max_length": 200, "temperature": 0.7},
+                use_cache=not bypass_cache
+            )
+            
+            if result["success"]:
+                response_data = result["data"]
+                if isinstance(response_data, list) and len(response_data) > 0:
+                    generated_text = response_data[0].get("generated_text", "")
+                    if generated_text:
+                        return self._format_medical_response(generated_text)
+            
+        except Exception as e:
+            st.warning(f"AI model temporarily unavailable: {str(e)}")
         
         # Fallback to rule-based responses
         return self._generate_fallback_response(user_message)
@@ -145,38 +377,24 @@ class HuggingFaceModelManager:
         # Clean up the response
         response = generated_text.strip()
         
-        # Add medical disclaimer
-        disclaimer = "\n\n**Important**: This is general information only. Please consult with a healthcare professional for personalized medical advice."
-        
         # Ensure response is appropriate length
-        if len(response) > 500:
-            response = response[:497] + "..."
+        if len(response) > MAX_RESPONSE_CHARS:
+            response = response[:MAX_RESPONSE_CHARS - 3] + "..."
         
-        return response + disclaimer
+        # Add medical disclaimer
+        return response + MEDICAL_DISCLAIMER
     
     def _generate_fallback_response(self, user_message: str) -> str:
         """Generate response using rule-based system when AI is unavailable"""
-        message_lower = user_message.lower()
+        matches = get_triage_catalog().matcher.scan(user_message)
         
         # Check for emergency keywords
-        emergency_keywords = {
-            "chest pain": "chest_pain",
-            "heart attack": "chest_pain",
-            "can't breathe": "difficulty_breathing",
-            "difficulty breathing": "difficulty_breathing",
-            "bleeding": "severe_bleeding",
-            "unconscious": "unconscious",
-            "stroke": "stroke_symptoms",
-            "seizure": "unconscious"
-        }
-        
-        for keyword, emergency_type in emergency_keywords.items():
-            if keyword in message_lower:
-                return self.fallback_responses["emergency"][emergency_type]
+        emergency_matches = matches_in(matches, "fallback_emergency")
+        if emergency_matches:
+            return self.fallback_responses["emergency"][emergency_matches[0].label]
         
         # Check for wellness topics
-        wellness_keywords = ["wellness", "healthy", "tips", "lifestyle", "prevention"]
-        if any(keyword in message_lower for keyword in wellness_keywords):
+        if matches_in(matches, "wellness_topics"):
             import random
             return random.choice(self.fallback_responses["wellness"])
         
@@ -184,64 +402,25 @@ class HuggingFaceModelManager:
         import random
         return random.choice(self.fallback_responses["general_medical"])
     
-    def analyze_symptom_severity(self, symptoms: str) -> Dict:
-        """Analyze symptom severity using AI models"""
-        
-        # Critical symptoms that always require emergency response
-        critical_symptoms = [
-            "chest pain", "heart attack", "can't breathe", "difficulty breathing",
-            "severe bleeding", "unconscious", "stroke", "seizure", "overdose"
-        ]
-        
-        symptoms_lower = symptoms.lower()
+    def analyze_symptom_severity(self, symptoms: str, matches: Optional[List] = None, catalog=None) -> Dict:
+        """Analyze symptom severity using AI models; pass matches and their catalog to reuse a triage scan"""
+        if catalog is None:
+            catalog = get_triage_catalog()
+        if matches is None:
+            matches = catalog.matcher.scan(symptoms)
         
-        # Check for critical symptoms
-        for symptom in critical_symptoms:
-            if symptom in symptoms_lower:
-                return {
-                    "severity": "critical",
-                    "requires_emergency": True,
-                    "confidence": 0.95,
-                    "recommendation": "Seek immediate emergency medical attention"
-                }
-        
-        # Use AI model for more nuanced analysis if available
-        if self.is_available():
-            try:
-                # This would use a specialized medical classification model
-                # For now, we'll use rule-based analysis
-                pass
-            except:
-                pass
-        
-        # Moderate severity keywords
-        moderate_keywords = [
-            "severe pain", "high fever", "persistent vomiting", 
-            "severe headache", "vision problems", "severe allergic"
-        ]
-        
-        for keyword in moderate_keywords:
-            if keyword in symptoms_lower:
-                return {
-                    "severity": "moderate",
-                    "requires_emergency": False,
-                    "confidence": 0.7,
-                    "recommendation": "Consider urgent care or contact your doctor today"
-                }
-        
-        # Default to mild severity
-        return {
-            "severity": "mild",
-            "requires_emergency": False,
-            "confidence": 0.6,
-            "recommendation": "Monitor symptoms and consult healthcare provider if they worsen"
-        }
+        # A specialized medical classification model would refine this;
+        # for now the analysis is rule-based
+        return classify_severity_level(matches, catalog)
     
     def get_model_status(self) -> Dict:
         """Get status of all available models"""
         status = {
             "api_available": self.is_available(),
             "api_token_configured": bool(self.api_token),
+            "circuit_breaker": self.circuit_breaker.snapshot(),
+            "inference_cache": self.cache.get_stats(),
+            "local_backend": self.local_backend.get_status(),
             "models": {}
         }
         
@@ -0,0 +1,233 @@
+"""
+Parallel SMS fan-out for emergency alerts
+Messages go out through one pooled Twilio REST client per process, each
+recipient with its own deadline and retry budget
+"""
+
+import os
+import time
+import random
+import threading
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+
+# Twilio REST endpoint; point at a local fake gateway to exercise dispatch offline
+SMS_API_BASE_URL = os.getenv("TWILIO_API_BASE_URL", "https://api.twilio.com")
+
+ALERT_MAX_WORKERS = int(os.getenv("ALERT_MAX_WORKERS", "8"))
+SMS_REQUEST_TIMEOUT = float(os.getenv("SMS_REQUEST_TIMEOUT", "5"))  # seconds per HTTP attempt
+ALERT_RECIPIENT_TIMEOUT = float(os.getenv("ALERT_RECIPIENT_TIMEOUT", "15"))  # seconds per recipient, retries included
+ALERT_MAX_RETRIES = int(os.getenv("ALERT_MAX_RETRIES", "2"))
+ALERT_BACKOFF_BASE = float(os.getenv("ALERT_BACKOFF_BASE", "0.5"))  # seconds, doubled per retry
+
+# Throttling and server-side failures are worth another attempt; other 4xx are not
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class SmsDeliveryError(Exception):
+    """Raised when the SMS gateway rejects or fails a message"""
+
+    def __init__(self, message, retryable=False, status_code=None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.status_code = status_code
+
+
+class TwilioSmsClient:
+    """Minimal Twilio Messages API client over a pooled keep-alive session"""
+
+    def __init__(self, account_sid, auth_token, from_number, base_url=SMS_API_BASE_URL, pool_size=ALERT_MAX_WORKERS):
+        self.account_sid = account_sid
+        self.from_number = from_number
+        self.messages_url = f"{base_url.rstrip('/')}/2010-04-01/Accounts/{account_sid}/Messages.json"
+        self.session = requests.Session()
+        self.session.auth = (account_sid, auth_token)
+        # One pooled connection per worker so parallel sends never queue on the pool
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def send(self, to, body, timeout=SMS_REQUEST_TIMEOUT):
+        """Send one message and return its SID"""
+        try:
+            response = self.session.post(
+                self.messages_url,
+                data={"To": to, "From": self.from_number, "Body": body},
+                timeout=timeout
+            )
+        except (requests.exceptions.InvalidURL, requests.exceptions.MissingSchema,
+                requests.exceptions.InvalidSchema) as e:
+            raise SmsDeliveryError(f"SMS gateway misconfigured: {e}", retryable=False) from e
+        except requests.RequestException as e:
+            # Connection failures, timeouts and bodies cut off mid-transfer
+            raise SmsDeliveryError(f"SMS gateway unreachable: {e}", retryable=True) from e
+
+        try:
+            payload = response.json()
+        except ValueError:
+            payload = None
+
+        if response.status_code >= 400:
+            detail = payload.get("message", response.text) if isinstance(payload, dict) else response.text
+            raise SmsDeliveryError(
+                f"SMS gateway returned {response.status_code}: {detail}",
+                retryable=response.status_code in RETRYABLE_STATUS_CODES,
+                status_code=response.status_code
+            )
+        if not isinstance(payload, dict):
+            raise SmsDeliveryError("SMS gateway returned an unreadable response", retryable=False,
+                                   status_code=response.status_code)
+        return payload.get("sid", "")
+
+
+_client_lock = threading.Lock()
+_clients = {}
+
+
+def get_sms_client():
+    """Get the process-wide SMS client for the configured credentials, or None if unconfigured"""
+    account_sid = os.getenv("TWILIO_ACCOUNT_SID")
+    auth_token = os.getenv("TWILIO_AUTH_TOKEN")
+    from_number = os.getenv("TWILIO_PHONE_NUMBER")
+    if not all([account_sid, auth_token, from_number]):
+        return None
+
+    key = (account_sid, auth_token, from_number, SMS_API_BASE_URL)
+    with _client_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = TwilioSmsClient(account_sid, auth_token, from_number)
+            _clients[key] = client
+        return client
+
+
+@dataclass
+class DeliveryResult:
+    """Outcome of sending one alert to one recipient"""
+
+    contact: str
+    method: str
+    destination: str
+    success: bool
+    attempts: int = 0
+    latency_ms: float = 0.0  # From dispatch start until this recipient's outcome was known
+    sid: str = ""
+    error: str = ""
+    retryable: bool = True  # False when another attempt cannot succeed (no credentials, rejected number)
+
+    def to_dict(self):
+        """Convert to the result dict shape the pages expect"""
+        key = "phone" if self.method == "SMS" else "email"
+        return {
+            "contact": self.contact,
+            "method": self.method,
+            key: self.destination,
+            "success": self.success,
+            "attempts": self.attempts,
+            "latency_ms": self.latency_ms,
+            "error": self.error
+        }
+
+
+@dataclass
+class AlertDispatchResult:
+    """Per-recipient outcomes of one alert fan-out"""
+
+    deliveries: list = field(default_factory=list)
+    elapsed_ms: float = 0.0
+
+    @property
+    def delivered(self):
+        return [d for d in self.deliveries if d.success]
+
+    @property
+    def failed(self):
+        return [d for d in self.deliveries if not d.success]
+
+    @property
+    def max_latency_ms(self):
+        return max((d.latency_ms for d in self.deliveries), default=0.0)
+
+    def to_list(self):
+        """Convert to the list of result dicts returned by send_emergency_alert"""
+        return [delivery.to_dict() for delivery in self.deliveries]
+
+
+class AlertDispatcher:
+    """Sends SMS messages to many recipients concurrently"""
+
+    def __init__(self, client=None, max_workers=ALERT_MAX_WORKERS, request_timeout=SMS_REQUEST_TIMEOUT,
+                 recipient_timeout=ALERT_RECIPIENT_TIMEOUT, max_retries=ALERT_MAX_RETRIES,
+                 backoff_base=ALERT_BACKOFF_BASE):
+        self.client = client if client is not None else get_sms_client()
+        self.max_workers = max_workers
+        self.request_timeout = request_timeout
+        self.recipient_timeout = recipient_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+
+    def _deliver(self, contact, phone, body, started):
+        """Send to one recipient, retrying transient failures until its deadline.
+
+        The deadline runs from when a worker picks the recipient up, so time
+        spent queued behind other recipients does not count against it.
+        """
+        result = DeliveryResult(contact=contact, method="SMS", destination=phone, success=False)
+        deadline = time.perf_counter() + self.recipient_timeout
+
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                result.error = result.error or "Recipient timeout exceeded"
+                break
+            result.attempts += 1
+            try:
+                result.sid = self.client.send(phone, body, timeout=min(self.request_timeout, remaining))
+                result.success = True
+                result.error = ""
+                break
+            except SmsDeliveryError as e:
+                result.error = str(e)
+                result.retryable = e.retryable
+                if not e.retryable or result.attempts > self.max_retries:
+                    break
+            except Exception as e:
+                # Never let one recipient's bug take down the other recipients' results;
+                # a later dispatch (e.g. an outbox retry) may still get through
+                result.error = f"Unexpected SMS error: {type(e).__name__}: {e}"
+                result.retryable = True
+                break
+            # Exponential backoff with jitter, never sleeping past the deadline
+            delay = self.backoff_base * (2 ** (result.attempts - 1)) * random.uniform(0.5, 1.0)
+            time.sleep(max(0.0, min(delay, deadline - time.perf_counter())))
+
+        result.latency_ms = (time.perf_counter() - started) * 1000
+        return result
+
+    def dispatch(self, messages):
+        """Send every (contact, phone, body) message in parallel and collect the outcomes.
+
+        Results keep the order of the input so callers can match them up.
+        """
+        started = time.perf_counter()
+        if self.client is None:
+            deliveries = [
+                DeliveryResult(contact=contact, method="SMS", destination=phone, success=False,
+                               error="Twilio credentials not configured", retryable=False)
+                for contact, phone, _ in messages
+            ]
+            return AlertDispatchResult(deliveries=deliveries)
+        if not messages:
+            return AlertDispatchResult()
+
+        workers = max(1, min(self.max_workers, len(messages)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="alert-dispatch") as pool:
+            futures = [
+                pool.submit(self._deliver, contact, phone, body, started)
+                for contact, phone, body in messages
+            ]
+            deliveries = [future.result() for future in futures]
+
+        return AlertDispatchResult(deliveries=deliveries, elapsed_ms=(time.perf_counter() - started) * 1000)
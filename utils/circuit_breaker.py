@@ -0,0 +1,84 @@
+"""
+Circuit breaker for calls to remote services
+After repeated failures the circuit opens and calls fail fast; once the reset
+timeout passes a single probe is let through to decide whether to close it
+"""
+
+import time
+import threading
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Tracks the health of one remote dependency"""
+
+    def __init__(self, failure_threshold=3, reset_timeout=30.0, health_ttl=60.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.health_ttl = health_ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+        self._health = None  # (healthy, checked_at) from the last observed outcome
+        self.rejected = 0
+
+    def allow_request(self):
+        """Return True if a call may go out now; in half-open state only one probe is allowed"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and self._clock() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        """Close the circuit after a successful call"""
+        with self._lock:
+            self.state = CLOSED
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self._probe_in_flight = False
+            self._health = (True, self._clock())
+
+    def record_failure(self):
+        """Count a failed call, opening the circuit at the threshold or when a probe fails"""
+        with self._lock:
+            self.consecutive_failures += 1
+            self._health = (False, self._clock())
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                self.state = OPEN
+                self.opened_at = self._clock()
+            self._probe_in_flight = False
+
+    def release(self):
+        """End a call whose outcome says nothing about health, freeing the half-open probe slot"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def cached_health(self):
+        """Get the last observed health if it is younger than health_ttl, else None"""
+        with self._lock:
+            if self.state == OPEN and self._clock() - self.opened_at < self.reset_timeout:
+                return False
+            if self._health is None or self._clock() - self._health[1] >= self.health_ttl:
+                return None
+            return self._health[0]
+
+    def snapshot(self):
+        """Get the breaker state for status displays"""
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "rejected_calls": self.rejected,
+            }
@@ -1,8 +1,17 @@
+import os
 import json
-from utils.db import SessionLocal, User, EmergencyContact, Patient, HealthRecord
-from utils.auth_utils import AuthManager
-from utils.health_data import HealthDataManager
+import time
+import argparse
 from datetime import datetime
+from sqlalchemy import insert
+from utils.db import get_session, init_db, Patient, HealthRecord
+from utils.import_checkpoints import checkpoint_source, load_checkpoint, save_checkpoint
+from utils.auth_utils import AuthManager
+from utils.health_data import HealthDataManager, extract_vital_columns
+
+DEFAULT_BATCH_SIZE = 1000
+READ_CHUNK_SIZE = 1 << 16
+NUMBER_CHARS = frozenset("0123456789+-.eE")
 
 def migrate_users():
     """Migrate users from JSON to database"""
@@ -10,49 +19,299 @@ def migrate_users():
     # This will ensure default users are created, so no need to migrate existing JSON users separately
     print("Default users ensured in database.")
 
-def migrate_patients_and_records():
-    """Migrate patients and health records from JSON files to database"""
-    db = SessionLocal()
-    try:
-        with open("data/patients.json", "r") as f:
-            patients_data = json.load(f)
-    except FileNotFoundError:
-        patients_data = {}
-
-    try:
-        with open("data/health_records.json", "r") as f:
-            health_records_data = json.load(f)
-    except FileNotFoundError:
-        health_records_data = {}
-
-    for patient_id, patient_data in patients_data.items():
-        existing_patient = db.query(Patient).filter(Patient.patient_id == patient_id).first()
-        if not existing_patient:
-            patient = Patient(
-                patient_id=patient_id,
-                data=json.dumps(patient_data),
-                created_at=datetime.utcnow(),
-                last_updated=datetime.utcnow()
+class JsonChunkReader:
+    """Incremental JSON tokenizer over a file read in fixed-size chunks"""
+
+    def __init__(self, f, path, chunk_size=READ_CHUNK_SIZE):
+        self.f = f
+        self.path = path
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def more(self):
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Skip whitespace and return the next character, or "" at end of file"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.more():
+                return ""
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} in {self.path}")
+        self.pos += 1
+
+    def decode(self):
+        """Decode the next complete JSON value"""
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A number cut at the chunk edge (e.g. "3." of "3.25") may continue in the next chunk
+                if self.eof or (end < len(self.buffer) and self.buffer[end] not in NUMBER_CHARS):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            if not self.more():
+                value, self.pos = self.decoder.raw_decode(self.buffer, self.pos)
+                return value
+
+    def iter_members(self):
+        """Yield the keys of the object starting at the cursor, leaving the cursor on each value"""
+        self.expect("{")
+        first = True
+        while True:
+            char = self.peek()
+            if char == "":
+                raise ValueError(f"Unexpected end of file in {self.path}")
+            if char == "}":
+                self.pos += 1
+                return
+            if not first:
+                self.expect(",")
+                self.peek()
+            first = False
+            key = self.decode()
+            self.expect(":")
+            self.peek()
+            yield key
+
+    def iter_items(self):
+        """Yield the elements of the array starting at the cursor"""
+        self.expect("[")
+        first = True
+        while True:
+            char = self.peek()
+            if char == "":
+                raise ValueError(f"Unexpected end of file in {self.path}")
+            if char == "]":
+                self.pos += 1
+                return
+            if not first:
+                self.expect(",")
+                self.peek()
+            first = False
+            yield self.decode()
+
+def iter_json_object(path, chunk_size=READ_CHUNK_SIZE):
+    """Yield (key, value) pairs of a top-level JSON object, reading the file in chunks.
+
+    Only one entry is held in memory at a time, so exports far larger than
+    RAM can be imported.
+    """
+    with open(path, "r") as f:
+        reader = JsonChunkReader(f, path, chunk_size)
+        if reader.peek() != "{":
+            raise ValueError(f"{path} does not contain a JSON object")
+        for key in reader.iter_members():
+            yield key, reader.decode()
+
+def iter_json_array(path, key=None, chunk_size=READ_CHUNK_SIZE):
+    """Yield the elements of a top-level JSON array, or of the array under `key` of a top-level object.
+
+    Other members of the object are decoded and discarded, so e.g. the
+    features of a GeoJSON FeatureCollection stream one at a time.
+    """
+    with open(path, "r") as f:
+        reader = JsonChunkReader(f, path, chunk_size)
+        if key is None:
+            yield from reader.iter_items()
+            return
+        if reader.peek() != "{":
+            raise ValueError(f"{path} does not contain a JSON object")
+        for member in reader.iter_members():
+            if member == key:
+                yield from reader.iter_items()
+            else:
+                reader.decode()
+
+def print_progress(stage, rows, elapsed):
+    """Print rows inserted by this run and the throughput"""
+    rate = rows / elapsed if elapsed > 0 else 0.0
+    print(f"[{stage}] {rows} rows in {elapsed:.1f}s ({rate:,.0f} rows/sec)")
+
+def import_patients(path, batch_size=DEFAULT_BATCH_SIZE, progress=print_progress, restart=False):
+    """Insert patients that do not exist yet, batch_size rows per transaction"""
+    source = checkpoint_source("patients", path)
+    start_index, _, _, completed = load_checkpoint(source, restart)
+    if completed:
+        return 0
+
+    started = time.perf_counter()
+    inserted = 0
+    batch = {}
+
+    def flush(next_index):
+        nonlocal inserted
+        with get_session() as db:
+            existing = {
+                row.patient_id for row in
+                db.query(Patient.patient_id).filter(Patient.patient_id.in_(list(batch)))
+            }
+            now = datetime.utcnow()
+            rows = [
+                {"patient_id": patient_id, "data": data, "created_at": now, "last_updated": now}
+                for patient_id, data in batch.items() if patient_id not in existing
+            ]
+            if rows:
+                db.execute(insert(Patient), rows)
+            save_checkpoint(db, source, next_index, 0, len(rows))
+        inserted += len(rows)
+        batch.clear()
+        if progress:
+            progress("patients", inserted, time.perf_counter() - started)
+
+    index = -1
+    for index, (patient_id, patient_data) in enumerate(iter_json_object(path)):
+        if index < start_index:
+            continue
+        batch[patient_id] = patient_data
+        if len(batch) >= batch_size:
+            flush(index + 1)
+
+    if batch:
+        flush(index + 1)
+    with get_session() as db:
+        save_checkpoint(db, source, index + 1, 0, 0, completed=True)
+    return inserted
+
+def import_health_records(path, batch_size=DEFAULT_BATCH_SIZE, progress=print_progress, restart=False):
+    """Insert health records for patients that have none yet, batch_size rows per transaction.
+
+    A patient's record list may be split across batches; the checkpoint keeps
+    both the entry index and the offset within it so a resumed run continues
+    exactly after the last committed row.
+    """
+    source = checkpoint_source("health_records", path)
+    start_index, start_offset, _, completed = load_checkpoint(source, restart)
+    if completed:
+        return 0
+
+    started = time.perf_counter()
+    inserted = 0
+    # (entry index, patient_id, records slice, offset of slice within entry, entry length)
+    pending = []
+    pending_rows = 0
+    # Patients whose history this run (or the interrupted run being resumed) started writing
+    continuing = set()
+
+    def flush():
+        nonlocal inserted, pending_rows
+        with get_session() as db:
+            patient_ids = {patient_id for _, patient_id, _, _, _ in pending}
+            patient_pks = dict(
+                db.query(Patient.patient_id, Patient.id).filter(Patient.patient_id.in_(patient_ids))
             )
-            db.add(patient)
-            db.commit()
-            db.refresh(patient)
-            # Migrate health records for this patient
-            records = health_records_data.get(patient_id, [])
-            for record in records:
-                hr = HealthRecord(
-                    patient_id=patient.id,
-                    record_type=record.get("type", "unknown"),
-                    data=json.dumps(record.get("data", {})),
-                    timestamp=datetime.fromisoformat(record.get("timestamp")) if record.get("timestamp") else datetime.utcnow()
-                )
-                db.add(hr)
-            db.commit()
+            # Patients that already have history are skipped so re-running an import is safe;
+            # a continuation slice is written only if this import wrote the entry's earlier rows
+            fresh_check = [patient_pks[pid] for _, pid, _, offset, _ in pending if offset == 0 and pid in patient_pks]
+            has_history = {
+                row.patient_id for row in
+                db.query(HealthRecord.patient_id).filter(HealthRecord.patient_id.in_(fresh_check)).distinct()
+            }
+            rows = []
+            for _, patient_id, records, offset, _ in pending:
+                patient_pk = patient_pks.get(patient_id)
+                if patient_pk is None:
+                    continue
+                if offset == 0:
+                    if patient_pk in has_history:
+                        continue
+                    continuing.add(patient_id)
+                elif patient_id not in continuing:
+                    continue
+                for record in records:
+                    record_type = record.get("type", "unknown")
+                    data = record.get("data", {})
+                    row = {
+                        "patient_id": patient_pk,
+                        "record_type": record_type,
+                        "data": data,
+                        "timestamp": datetime.fromisoformat(record["timestamp"]) if record.get("timestamp") else datetime.utcnow(),
+                        "blood_pressure_systolic": None,
+                        "blood_pressure_diastolic": None,
+                        "heart_rate": None,
+                        "temperature": None,
+                        "weight": None
+                    }
+                    row.update(extract_vital_columns(record_type, data))
+                    rows.append(row)
+            if rows:
+                db.execute(insert(HealthRecord), rows)
+
+            last_index, _, last_records, last_offset, entry_length = pending[-1]
+            end_offset = last_offset + len(last_records)
+            if end_offset >= entry_length:
+                save_checkpoint(db, source, last_index + 1, 0, len(rows))
+            else:
+                save_checkpoint(db, source, last_index, end_offset, len(rows))
+        inserted += len(rows)
+        pending.clear()
+        pending_rows = 0
+        if progress:
+            progress("health_records", inserted, time.perf_counter() - started)
+
+    index = -1
+    for index, (patient_id, records) in enumerate(iter_json_object(path)):
+        if index < start_index:
+            continue
+        offset = start_offset if index == start_index else 0
+        if offset:
+            continuing.add(patient_id)
+        while offset < len(records):
+            take = batch_size - pending_rows
+            pending.append((index, patient_id, records[offset:offset + take], offset, len(records)))
+            pending_rows += len(pending[-1][2])
+            offset += take
+            if pending_rows >= batch_size:
+                flush()
+
+    if pending:
+        flush()
+    with get_session() as db:
+        save_checkpoint(db, source, index + 1, 0, 0, completed=True)
+    return inserted
+
+def migrate_patients_and_records(patients_file="data/patients.json", records_file="data/health_records.json",
+                                 batch_size=DEFAULT_BATCH_SIZE, progress=print_progress, restart=False):
+    """Migrate patients and health records from JSON files to database"""
+    if os.path.exists(patients_file):
+        import_patients(patients_file, batch_size, progress, restart)
+    if os.path.exists(records_file):
+        imported = import_health_records(records_file, batch_size, progress, restart)
+        if imported:
+            # Bulk inserts bypass add_health_record, so refresh the materialized scores once
+            HealthDataManager().rebuild_health_summaries()
     print("Patients and health records migration completed.")
 
-def migrate_all():
+def migrate_all(batch_size=DEFAULT_BATCH_SIZE, restart=False):
+    init_db()
     migrate_users()
-    migrate_patients_and_records()
+    migrate_patients_and_records(batch_size=batch_size, restart=restart)
 
 if __name__ == "__main__":
-    migrate_all()
+    parser = argparse.ArgumentParser(description="Import JSON exports into the HealthAssist database")
+    parser.add_argument("--patients", default="data/patients.json", help="Patients JSON export")
+    parser.add_argument("--records", default="data/health_records.json", help="Health records JSON export")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Rows per transaction")
+    parser.add_argument("--restart", action="store_true", help="Ignore saved checkpoints and start over")
+    args = parser.parse_args()
+
+    init_db()
+    migrate_users()
+    migrate_patients_and_records(args.patients, args.records, args.batch_size, restart=args.restart)
@@ -1,16 +1,125 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, ForeignKey, Text
+import os
+import threading
+import time
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event, Column, Integer, String, DateTime, ForeignKey, Text, Index, Boolean, Float, JSON
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import sessionmaker, relationship, scoped_session
+from sqlalchemy.pool import QueuePool
 from datetime import datetime
 
-# SQLite database URL
-DATABASE_URL = "sqlite:///emergency_helper.db"
+# Database URL (SQLite by default, override with e.g. postgresql+psycopg2://...)
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///emergency_helper.db")
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+# SQLite pragmas applied to every new connection. WAL lets dashboard reads
+# proceed while vitals are being written; NORMAL sync is durable in WAL mode.
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),  # negative = KiB, i.e. 64 MiB
+    "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "foreign_keys": "ON",
+}
+
+# Connection pool bounds (shared by every manager in the process)
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+
+class PoolStats:
+    """Counters for connection checkout latency and pool exhaustion"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def record_wait(self, elapsed, timed_out=False):
+        """Record how long a caller waited for a pooled connection"""
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_time_total += elapsed
+            self.wait_time_max = max(self.wait_time_max, elapsed)
+
+    def snapshot(self):
+        """Return a consistent copy of the counters"""
+        with self._lock:
+            return {
+                "checkouts_total": self.checkouts,
+                "checkout_timeouts_total": self.timeouts,
+                "wait_seconds_total": self.wait_time_total,
+                "wait_seconds_max": self.wait_time_max,
+            }
+
+
+pool_stats = PoolStats()
+
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            pool_stats.record_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        pool_stats.record_wait(time.perf_counter() - start)
+        return connection
+
+
+def build_engine(database_url=DATABASE_URL):
+    """Create an engine with the pool and driver settings for the target database"""
+    connect_args = {}
+    if database_url.startswith("sqlite"):
+        # Python-level busy wait on top of the busy_timeout pragma
+        connect_args = {"check_same_thread": False, "timeout": SQLITE_PRAGMAS["busy_timeout"] / 1000}
+
+    new_engine = create_engine(
+        database_url,
+        connect_args=connect_args,
+        poolclass=MeteredQueuePool,
+        pool_size=POOL_SIZE,
+        max_overflow=MAX_OVERFLOW,
+        pool_timeout=POOL_TIMEOUT,
+        pool_recycle=POOL_RECYCLE,
+        pool_pre_ping=True,
+    )
+
+    if database_url.startswith("sqlite"):
+        event.listen(new_engine, "connect", apply_sqlite_pragmas)
+
+    return new_engine
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """Apply the SQLite engine profile to a freshly opened connection"""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
 
 # Create engine
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+engine = build_engine()
 
 # Create session local class
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+# Thread-local session registry used by get_session()
+ScopedSession = scoped_session(SessionLocal)
+_session_depth = threading.local()
 
 # Base class for models
 Base = declarative_base()
@@ -42,11 +151,12 @@ class Patient(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     patient_id = Column(String, unique=True, index=True, nullable=False)
-    data = Column(Text)  # JSON serialized string of patient data
+    data = Column(JSON)  # Patient profile document
     created_at = Column(DateTime, default=datetime.utcnow)
     last_updated = Column(DateTime, default=datetime.utcnow)
-
+    
     health_records = relationship("HealthRecord", back_populates="patient", cascade="all, delete-orphan")
+    health_summary = relationship("PatientHealthSummary", back_populates="patient", uselist=False, cascade="all, delete-orphan")
 
 class HealthRecord(Base):
     __tablename__ = "health_records"
@@ -54,11 +164,222 @@ class HealthRecord(Base):
     id = Column(Integer, primary_key=True, index=True)
     patient_id = Column(Integer, ForeignKey("patients.id"), nullable=False)
     record_type = Column(String, nullable=False)
-    data = Column(Text)  # JSON serialized string of record data
+    data = Column(JSON)  # Record payload document
     timestamp = Column(DateTime, default=datetime.utcnow)
     
+    # Typed copies of vital sign readings so range queries run in SQL
+    blood_pressure_systolic = Column(Float, nullable=True)
+    blood_pressure_diastolic = Column(Float, nullable=True)
+    heart_rate = Column(Float, nullable=True)
+    temperature = Column(Float, nullable=True)
+    weight = Column(Float, nullable=True)
+    
     patient = relationship("Patient", back_populates="health_records")
+    
+    __table_args__ = (
+        # Serves "latest N records of a type" (vitals, symptoms) without a sort step
+        Index("ix_health_records_patient_type_time", patient_id, record_type, timestamp.desc()),
+        # Serves "latest record of any type" (last visit)
+        Index("ix_health_records_patient_time", patient_id, timestamp.desc()),
+        # Serves population-wide vitals range queries over a time window
+        Index("ix_health_records_type_time", record_type, timestamp),
+    )
+
+class PatientHealthSummary(Base):
+    __tablename__ = "patient_health_summary"
+    
+    # Materialized from health_records; maintained by HealthDataManager.add_health_record
+    patient_id = Column(Integer, ForeignKey("patients.id"), primary_key=True)
+    health_score = Column(Integer, nullable=False, default=100, index=True)
+    last_visit = Column(DateTime, nullable=True)
+    last_vitals = Column(JSON)  # Payload of the newest vital signs record
+    recent_vitals = Column(JSON)  # Newest vital sign payloads (scoring window)
+    recent_symptoms = Column(JSON)  # Newest symptom payloads (scoring window)
+    high_bp_pattern = Column(Boolean, nullable=False, default=False)
+    severe_symptom_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    
+    patient = relationship("Patient", back_populates="health_summary")
+
+class Notification(Base):
+    __tablename__ = "notifications"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    type = Column(String, nullable=False)  # SMS, EMAIL, HEALTH_REMINDER, EMERGENCY
+    user = Column(String, nullable=False, default="system")
+    recipient = Column(String, nullable=True)
+    message = Column(Text, nullable=False)
+    status = Column(String, nullable=False)
+    details = Column(Text, default="")
+    reminder_type = Column(String, nullable=True)
+    schedule_time = Column(DateTime, nullable=True)
+    timestamp = Column(DateTime, default=datetime.utcnow)
+    read = Column(Boolean, nullable=False, default=False)
+    read_at = Column(DateTime, nullable=True)
+    
+    __table_args__ = (
+        # Newest-first feed per user, with id as the keyset tie-breaker
+        Index("ix_notifications_user_time", user, timestamp.desc(), id.desc()),
+        Index("ix_notifications_user_type_time", user, type, timestamp.desc(), id.desc()),
+    )
+
+class NotificationCounter(Base):
+    __tablename__ = "notification_counters"
+    
+    # Unread count per user, maintained in the same transaction as notification writes
+    user = Column(String, primary_key=True)
+    unread = Column(Integer, nullable=False, default=0)
+
+class Facility(Base):
+    __tablename__ = "facilities"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    facility_id = Column(String, unique=True, index=True, nullable=False)  # External id, e.g. hosp_001
+    type = Column(String, nullable=False)  # hospitals, pharmacies, urgent_care
+    name = Column(String, nullable=False)
+    address = Column(String, nullable=False, default="")
+    phone = Column(String, nullable=False, default="")
+    lat = Column(Float, nullable=False)
+    lng = Column(Float, nullable=False)
+    emergency_room = Column(Boolean, nullable=False, default=False)
+    trauma_center = Column(Boolean, nullable=False, default=False)
+    specialties = Column(JSON)  # List of specialty names
+    services = Column(JSON)  # List of service names
+    hours = Column(String, nullable=True)  # e.g. "24/7", "8 AM - 10 PM"
+    wait_time = Column(String, nullable=True)
+    rating = Column(Float, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, index=True)
+    
+    __table_args__ = (
+        # Bounding-box prefilter for SQL-side radius queries by type
+        Index("ix_facilities_type_lat_lng", type, lat, lng),
+    )
+
+class ImportCheckpoint(Base):
+    __tablename__ = "import_checkpoints"
+    
+    # Resume position of a bulk import, committed in the same transaction as each batch
+    source = Column(String, primary_key=True)
+    item_index = Column(Integer, nullable=False, default=0)  # Top-level entries fully processed
+    item_offset = Column(Integer, nullable=False, default=0)  # Rows consumed within the next entry
+    rows_imported = Column(Integer, nullable=False, default=0)
+    completed = Column(Boolean, nullable=False, default=False)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class OutboxEvent(Base):
+    __tablename__ = "emergency_outbox"
+    
+    # One emergency event, persisted before any alert for it is sent
+    id = Column(Integer, primary_key=True, index=True)
+    event_key = Column(String, unique=True, nullable=False)  # Idempotency key; enqueueing it again is a no-op
+    event_type = Column(String, nullable=False)  # ambulance_call, share_location, notify_contacts, emergency_activation
+    user = Column(String, nullable=False, default="system")
+    payload = Column(JSON)  # The emergency record or activation log
+    status = Column(String, nullable=False, default="queued")  # queued, sent, failed, recorded
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = Column(String, nullable=True)  # Worker holding the lease
+    locked_until = Column(DateTime, nullable=True)  # Lease expiry; another worker may retry after it
+    last_error = Column(Text, default="")
+    detected_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    queued_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    completed_at = Column(DateTime, nullable=True)
+    
+    deliveries = relationship("OutboxDelivery", back_populates="event", cascade="all, delete-orphan")
+    
+    __table_args__ = (
+        # Serves the worker's "due events, oldest first" poll
+        Index("ix_emergency_outbox_status_due", status, next_attempt_at),
+    )
+
+class OutboxDelivery(Base):
+    __tablename__ = "emergency_outbox_deliveries"
+    
+    # One recipient of an outbox event; a recipient marked sent is never sent to again
+    id = Column(Integer, primary_key=True, index=True)
+    event_id = Column(Integer, ForeignKey("emergency_outbox.id"), nullable=False)
+    idempotency_key = Column(String, unique=True, nullable=False)  # Event key plus destination
+    contact = Column(String, nullable=False)
+    method = Column(String, nullable=False, default="SMS")
+    destination = Column(String, nullable=False)
+    body = Column(Text, nullable=False)
+    status = Column(String, nullable=False, default="pending")  # pending, sent, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    sid = Column(String, nullable=True)
+    last_error = Column(Text, default="")
+    queued_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+    
+    event = relationship("OutboxEvent", back_populates="deliveries")
+    
+    __table_args__ = (
+        Index("ix_emergency_outbox_deliveries_event_status", event_id, status),
+        # Serves the recent alert latency window
+        Index("ix_emergency_outbox_deliveries_sent", sent_at),
+    )
+
+class SchemaMigration(Base):
+    __tablename__ = "schema_migrations"
+    
+    version = Column(Integer, primary_key=True)
+    description = Column(String, nullable=False)
+    applied_at = Column(DateTime, default=datetime.utcnow)
+
+@contextmanager
+def get_session():
+    """Provide a request-scoped session that commits on success and always releases its connection.
+
+    Nested calls on the same thread share the outermost session and transaction,
+    so a manager method can call another without opening a second connection.
+    """
+    depth = getattr(_session_depth, "value", 0)
+    session = ScopedSession()
+    _session_depth.value = depth + 1
+    try:
+        yield session
+        if depth == 0:
+            session.commit()
+    except Exception:
+        if depth == 0:
+            session.rollback()
+        raise
+    finally:
+        _session_depth.value = depth
+        if depth == 0:
+            ScopedSession.remove()
+
+def get_pool_metrics():
+    """Get current connection pool metrics"""
+    pool = engine.pool
+    metrics = {
+        "pool_size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(0, pool.overflow()),
+        "max_overflow": MAX_OVERFLOW,
+    }
+    metrics.update(pool_stats.snapshot())
+    return metrics
+
+def render_pool_metrics():
+    """Render pool metrics in Prometheus text exposition format"""
+    lines = []
+    for name, value in get_pool_metrics().items():
+        lines.append(f"healthassist_db_pool_{name} {value}")
+    return "\n".join(lines) + "\n"
+
+def get_engine_profile():
+    """Get the pragmas actually in effect on a pooled connection"""
+    if not IS_SQLITE:
+        return {"dialect": engine.dialect.name}
+    profile = {"dialect": engine.dialect.name}
+    with engine.connect() as connection:
+        for name in SQLITE_PRAGMAS:
+            profile[name] = connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+    return profile
 
 def init_db():
-    """Create all tables"""
+    """Create all tables and apply pending schema migrations"""
+    from utils.migrations import run_migrations
     Base.metadata.create_all(bind=engine)
+    run_migrations()
@@ -0,0 +1,351 @@
+"""
+Durable outbox for emergency events and contact alerts
+An emergency is written to the emergency_outbox table, together with one row
+per recipient, before any alert is sent. Workers lease due events, send the
+recipients not yet marked sent and retry transient failures with backoff, so
+an alert survives a Streamlit rerun or a crash; failures a retry cannot fix
+(no credentials, a rejected number) are final at once. Delivery is at least
+once: a crash between the gateway accepting a message and the row being
+marked sent can repeat that one message
+"""
+
+import os
+import math
+import uuid
+import hashlib
+import argparse
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import or_, func
+from sqlalchemy.exc import IntegrityError
+from utils.db import get_session, init_db, OutboxEvent, OutboxDelivery
+from utils.alert_dispatch import AlertDispatcher, AlertDispatchResult, ALERT_MAX_WORKERS, ALERT_RECIPIENT_TIMEOUT
+from utils.notification_utils import NotificationManager
+
+# Attempts per event before its unsent recipients are given up on
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_BACKOFF_BASE = float(os.getenv("OUTBOX_BACKOFF_BASE", "2"))  # seconds, doubled per attempt
+OUTBOX_BACKOFF_MAX = float(os.getenv("OUTBOX_BACKOFF_MAX", "300"))
+# How long a claimed event stays with its worker before its dispatch starts; process() then
+# extends the lease by the dispatch's own worst case (see get_dispatch_seconds)
+OUTBOX_LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", "60"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "20"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "1"))
+# Identical events from the same user within this many seconds are one event (double clicks, reruns)
+OUTBOX_DEDUP_WINDOW = int(os.getenv("OUTBOX_DEDUP_WINDOW", "60"))
+# Run a worker thread inside the app process; set to 0 when `python -m utils.emergency_outbox` runs separately
+OUTBOX_IN_PROCESS_WORKER = os.getenv("OUTBOX_IN_PROCESS_WORKER", "1") == "1"
+
+QUEUED = "queued"
+SENT = "sent"
+FAILED = "failed"
+RECORDED = "recorded"  # Nothing to deliver; the event is only persisted
+
+PENDING = "pending"
+
+
+def make_idempotency_key(event_type, user, *parts, detected_at=None, window=OUTBOX_DEDUP_WINDOW):
+    """Derive an event key that is the same for repeats of one event within the dedup window"""
+    detected_at = detected_at or datetime.utcnow()
+    bucket = int(detected_at.timestamp() // window) if window else uuid.uuid4().hex
+    raw = "|".join(str(part) for part in (event_type, user, bucket) + parts)
+    return f"{event_type}:{hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]}"
+
+
+def enqueue_event(event_type, user, payload=None, recipients=(), idempotency_key=None, detected_at=None):
+    """Persist an emergency event and its (contact, phone, message) recipients in one transaction.
+
+    Returns (event, created); created is False when an event with the same
+    idempotency key already exists, in which case nothing new is queued.
+    """
+    detected_at = detected_at or datetime.utcnow()
+    idempotency_key = idempotency_key or make_idempotency_key(event_type, user, detected_at=detected_at)
+
+    with get_session() as db:
+        existing = db.query(OutboxEvent).filter(OutboxEvent.event_key == idempotency_key).first()
+        if existing:
+            return existing, False
+
+        queued_at = datetime.utcnow()
+        event = OutboxEvent(
+            event_key=idempotency_key,
+            event_type=event_type,
+            user=user or "system",
+            payload=payload,
+            status=QUEUED if recipients else RECORDED,
+            next_attempt_at=queued_at,
+            detected_at=detected_at,
+            queued_at=queued_at,
+            completed_at=None if recipients else queued_at
+        )
+        seen = set()
+        for contact, phone, body in recipients:
+            # One row per destination, even if two contacts share a number
+            if phone in seen:
+                continue
+            seen.add(phone)
+            event.deliveries.append(OutboxDelivery(
+                idempotency_key=f"{idempotency_key}:{phone}",
+                contact=contact,
+                destination=phone,
+                body=body,
+                queued_at=queued_at
+            ))
+        try:
+            with db.begin_nested():
+                db.add(event)
+        except IntegrityError:
+            # Another session enqueued the same event first
+            return db.query(OutboxEvent).filter(OutboxEvent.event_key == idempotency_key).one(), False
+        return event, True
+
+
+def get_backoff(attempts, base=OUTBOX_BACKOFF_BASE, maximum=OUTBOX_BACKOFF_MAX):
+    """Seconds to wait before the next attempt of an event that has failed `attempts` times"""
+    return min(maximum, base * (2 ** max(0, attempts - 1)))
+
+
+def get_dispatch_seconds(recipients, max_workers=ALERT_MAX_WORKERS, recipient_timeout=ALERT_RECIPIENT_TIMEOUT):
+    """Upper bound on how long AlertDispatcher takes to fan out to `recipients` numbers"""
+    return math.ceil(recipients / max(1, max_workers)) * recipient_timeout
+
+
+class OutboxWorker:
+    """Leases due outbox events and delivers their unsent alerts"""
+
+    def __init__(self, notification_manager=None, worker_id=None, lease_seconds=OUTBOX_LEASE_SECONDS,
+                 max_attempts=OUTBOX_MAX_ATTEMPTS):
+        self.notification_manager = notification_manager or NotificationManager()
+        self.worker_id = worker_id or f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+    def claim(self, limit=OUTBOX_BATCH_SIZE, event_ids=None):
+        """Lease up to `limit` due events to this worker and return their ids"""
+        now = datetime.utcnow()
+        claimable = (
+            OutboxEvent.status == QUEUED,
+            OutboxEvent.next_attempt_at <= now,
+            or_(OutboxEvent.locked_until.is_(None), OutboxEvent.locked_until < now)
+        )
+        claimed = []
+        with get_session() as db:
+            query = db.query(OutboxEvent.id).filter(*claimable)
+            if event_ids is not None:
+                query = query.filter(OutboxEvent.id.in_(event_ids))
+            candidates = [row.id for row in query.order_by(OutboxEvent.next_attempt_at, OutboxEvent.id).limit(limit)]
+            for event_id in candidates:
+                # Conditional update, so two workers racing for one event cannot both win
+                updated = db.query(OutboxEvent).filter(OutboxEvent.id == event_id, *claimable).update({
+                    OutboxEvent.locked_by: self.worker_id,
+                    OutboxEvent.locked_until: now + timedelta(seconds=self.lease_seconds),
+                    OutboxEvent.attempts: OutboxEvent.attempts + 1
+                }, synchronize_session=False)
+                if updated:
+                    claimed.append(event_id)
+        return claimed
+
+    def process(self, event_id):
+        """Send a leased event's pending alerts and record the outcome.
+
+        Returns (AlertDispatchResult, event status); the status is still QUEUED
+        when a retry has been scheduled. Returns (None, None) if the lease was
+        lost to another worker before the dispatch started.
+        """
+        with get_session() as db:
+            event = db.get(OutboxEvent, event_id)
+            if event.status != QUEUED or event.locked_by != self.worker_id:
+                return None, None
+            user = event.user
+            pending = (
+                db.query(OutboxDelivery)
+                .filter(OutboxDelivery.event_id == event_id, OutboxDelivery.status == PENDING)
+                .order_by(OutboxDelivery.id)
+                .all()
+            )
+            delivery_ids = [delivery.id for delivery in pending]
+            messages = [(delivery.contact, delivery.destination, delivery.body) for delivery in pending]
+            # Hold the lease for the whole dispatch plus the usual margin, so a slow gateway
+            # cannot let another worker claim the event and send the same alerts again
+            event.locked_until = datetime.utcnow() + timedelta(
+                seconds=get_dispatch_seconds(len(messages)) + self.lease_seconds
+            )
+
+        # No transaction is held while the gateway is called. Sends are not logged
+        # here: the notification log gets one row per recipient once its outcome is final
+        error = ""
+        try:
+            result = AlertDispatcher().dispatch(messages) if messages else AlertDispatchResult()
+        except Exception as e:
+            result = AlertDispatchResult()
+            error = f"{type(e).__name__}: {e}"
+
+        outcomes = [
+            (delivery_id, body, delivery)
+            for delivery_id, (_, _, body), delivery in zip(delivery_ids, messages, result.deliveries)
+        ]
+        return result, self._record(event_id, user, outcomes, error)
+
+    def _record(self, event_id, user, outcomes, error=""):
+        """Mark final outcomes, then finish the event or schedule its retry; returns the event status"""
+        now = datetime.utcnow()
+        with get_session() as db:
+            for delivery_id, body, outcome in outcomes:
+                values = {
+                    OutboxDelivery.attempts: OutboxDelivery.attempts + outcome.attempts,
+                    OutboxDelivery.last_error: outcome.error
+                }
+                if outcome.success:
+                    values.update({OutboxDelivery.status: SENT, OutboxDelivery.sid: outcome.sid,
+                                   OutboxDelivery.sent_at: now})
+                elif not outcome.retryable:
+                    # No credentials or a rejected number; another attempt would fail the same way
+                    values[OutboxDelivery.status] = FAILED
+                updated = db.query(OutboxDelivery).filter(
+                    OutboxDelivery.id == delivery_id, OutboxDelivery.status == PENDING
+                ).update(values, synchronize_session=False)
+                if updated and (outcome.success or not outcome.retryable):
+                    self.notification_manager.log_delivery(outcome, body, user)
+                error = error or outcome.error
+
+            event = db.get(OutboxEvent, event_id)
+            event.locked_by = None
+            event.locked_until = None
+            event.last_error = error
+            pending = db.query(OutboxDelivery).filter(
+                OutboxDelivery.event_id == event_id, OutboxDelivery.status == PENDING
+            ).all()
+            if pending and event.attempts >= self.max_attempts:
+                for delivery in pending:
+                    delivery.status = FAILED
+                    self.notification_manager.log_notification(
+                        "SMS", delivery.destination, delivery.body, "failed",
+                        f"{delivery.last_error} (gave up after {delivery.attempts} attempt(s))", user
+                    )
+                pending = []
+            if pending:
+                event.next_attempt_at = now + timedelta(seconds=get_backoff(event.attempts))
+            else:
+                failed = db.query(OutboxDelivery).filter(
+                    OutboxDelivery.event_id == event_id, OutboxDelivery.status == FAILED
+                ).count()
+                event.status = FAILED if failed else SENT
+                event.completed_at = now
+            return event.status
+
+    def deliver(self, event_id):
+        """Deliver one event now if no other worker holds it.
+
+        Returns (AlertDispatchResult, event status), or (None, None) if the event
+        is not due or another worker holds it.
+        """
+        if not self.claim(limit=1, event_ids=[event_id]):
+            return None, None
+        return self.process(event_id)
+
+    def run_once(self, limit=OUTBOX_BATCH_SIZE):
+        """Claim and process one batch of due events; returns how many were processed"""
+        event_ids = self.claim(limit)
+        for event_id in event_ids:
+            self.process(event_id)
+        return len(event_ids)
+
+    def run(self, interval=OUTBOX_POLL_INTERVAL, stop=None):
+        """Drain the outbox until `stop` (a threading.Event) is set, polling when it is empty"""
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            try:
+                processed = self.run_once()
+            except Exception as e:
+                print(f"Outbox worker error: {type(e).__name__}: {e}")
+                processed = 0
+            if not processed:
+                stop.wait(interval)
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def get_outbox_stats(recent=500):
+    """Get the outbox backlog and the alert latency of the most recent deliveries.
+
+    Latencies are in seconds: detected_to_queued is the time to persist the
+    event, queued_to_sent the time to deliver it, detected_to_sent the whole
+    path from detection to the gateway accepting the message.
+    """
+    now = datetime.utcnow()
+    with get_session() as db:
+        counts = dict(db.query(OutboxEvent.status, func.count()).group_by(OutboxEvent.status).all())
+        oldest_queued = db.query(func.min(OutboxEvent.queued_at)).filter(OutboxEvent.status == QUEUED).scalar()
+        rows = (
+            db.query(OutboxEvent.detected_at, OutboxEvent.queued_at, OutboxDelivery.sent_at)
+            .join(OutboxDelivery, OutboxDelivery.event_id == OutboxEvent.id)
+            .filter(OutboxDelivery.sent_at.isnot(None))
+            .order_by(OutboxDelivery.sent_at.desc())
+            .limit(recent)
+            .all()
+        )
+
+    stages = {
+        "detected_to_queued": sorted((queued - detected).total_seconds() for detected, queued, _ in rows),
+        "queued_to_sent": sorted((sent - queued).total_seconds() for _, queued, sent in rows),
+        "detected_to_sent": sorted((sent - detected).total_seconds() for detected, _, sent in rows),
+    }
+    stats = {
+        "events": counts,
+        "queued": counts.get(QUEUED, 0),
+        "failed": counts.get(FAILED, 0),
+        "oldest_queued_seconds": (now - oldest_queued).total_seconds() if oldest_queued else 0.0,
+        "deliveries_sampled": len(rows),
+    }
+    for stage, values in stages.items():
+        stats[f"{stage}_p50"] = _percentile(values, 0.50)
+        stats[f"{stage}_p95"] = _percentile(values, 0.95)
+    return stats
+
+
+_worker_thread = None
+_worker_lock = threading.Lock()
+
+
+def start_outbox_worker(interval=OUTBOX_POLL_INTERVAL):
+    """Start a process-wide background worker thread, once; returns the thread"""
+    global _worker_thread
+    with _worker_lock:
+        if _worker_thread is None or not _worker_thread.is_alive():
+            _worker_thread = threading.Thread(
+                target=OutboxWorker().run, args=(interval,), name="emergency-outbox", daemon=True
+            )
+            _worker_thread.start()
+        return _worker_thread
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Deliver queued emergency alerts from the outbox")
+    parser.add_argument("--once", action="store_true", help="Process the events due now and exit")
+    parser.add_argument("--interval", type=float, default=OUTBOX_POLL_INTERVAL, help="Seconds between polls of an empty outbox")
+    parser.add_argument("--stats", action="store_true", help="Print backlog and latency figures and exit")
+    args = parser.parse_args()
+
+    init_db()
+    if args.stats:
+        for name, value in get_outbox_stats().items():
+            print(f"{name}: {value}")
+    elif args.once:
+        worker = OutboxWorker()
+        total = 0
+        while True:
+            processed = worker.run_once()
+            if not processed:
+                break
+            total += processed
+        print(f"Processed {total} outbox events.")
+    else:
+        print("Outbox worker running; press Ctrl+C to stop.")
+        try:
+            OutboxWorker().run(args.interval)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,265 @@
+"""
+Core emergency pipeline, independent of Streamlit
+Each operation takes an explicit EmergencyContext (who, where, whom to notify)
+and returns an EmergencyResult with the record it produced and the messages to
+show the user, so the pipeline runs the same in the app, a background worker,
+a queue consumer or a load test. Emergencies and their contact alerts are
+written to the outbox (utils.emergency_outbox) before anything is sent
+"""
+
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from utils.alert_dispatch import AlertDispatcher, AlertDispatchResult
+from utils.emergency_outbox import QUEUED as OUTBOX_QUEUED, OutboxWorker, enqueue_event, make_idempotency_key
+from utils.location_utils import LocationManager
+from utils.notification_utils import NotificationManager
+from utils.triage import assess_text
+
+# Straight-line candidates fetched per wanted result before re-ranking by drive time
+ETA_CANDIDATE_FACTOR = 3
+
+# Event levels; the Streamlit adapter maps each to st.success/st.info/st.warning/st.error
+SUCCESS = "success"
+INFO = "info"
+WARNING = "warning"
+ERROR = "error"
+
+
+@dataclass
+class EmergencyContext:
+    """Who an emergency operation acts for and where they are.
+
+    contacts=None means "look up the user's saved emergency contacts".
+    """
+    user: Optional[str] = None
+    location: Optional[Dict] = None
+    contacts: Optional[List[Dict]] = None
+
+
+@dataclass
+class EmergencyEvent:
+    """A message for the user produced by an emergency operation"""
+    level: str
+    message: str
+
+
+@dataclass
+class EmergencyResult:
+    """Outcome of one emergency operation"""
+    action: str
+    success: bool = True
+    record: Dict = field(default_factory=dict)
+    events: List[EmergencyEvent] = field(default_factory=list)
+    dispatch: Optional[AlertDispatchResult] = None
+
+    def add_event(self, level, message):
+        self.events.append(EmergencyEvent(level, message))
+
+    def merge(self, other):
+        """Fold a sub-operation's events and deliveries into this result"""
+        self.events.extend(other.events)
+        if other.dispatch is not None:
+            self.dispatch = other.dispatch
+
+    def to_dict(self):
+        return {
+            "action": self.action,
+            "success": self.success,
+            "record": self.record,
+            "events": [{"level": event.level, "message": event.message} for event in self.events],
+            "deliveries": self.dispatch.to_list() if self.dispatch else [],
+        }
+
+
+class EmergencyService:
+    """Emergency operations over explicit contexts; safe to share between threads and users"""
+
+    def __init__(self, notification_manager=None, location_manager=None, deliver_inline=True):
+        self.notification_manager = notification_manager or NotificationManager()
+        self.location_manager = location_manager or LocationManager()
+        # Inline delivery sends a queued alert right away; a worker retries whatever it leaves unsent
+        self.deliver_inline = deliver_inline
+        self.outbox = OutboxWorker(self.notification_manager)
+
+    def assess(self, symptoms_text, additional_info="", include_severity_level=True):
+        """Triage symptom text; see utils.triage.assess_text"""
+        return assess_text(symptoms_text, additional_info, include_severity_level=include_severity_level)
+
+    def _location(self, context):
+        return context.location or self.location_manager.get_current_location()
+
+    def get_contacts(self, context):
+        """Get the contacts to notify for a context"""
+        if context.contacts is not None:
+            return context.contacts
+        if not context.user:
+            return []
+        from utils.auth_utils import AuthManager
+        return AuthManager().get_emergency_contacts(context.user)
+
+    def notify_emergency_contacts(self, context, message, emergency_data=None, event_type="notify_contacts",
+                                  detected_at=None):
+        """Queue an alert to every emergency contact, then send it unless a worker is left to"""
+        result = EmergencyResult(event_type, record={"message": message, "data": emergency_data})
+        if not context.user and context.contacts is None:
+            result.success = False
+            return result
+
+        contacts = self.get_contacts(context)
+        if not contacts:
+            result.success = False
+            result.add_event(WARNING, "⚠️ No emergency contacts configured")
+            return result
+
+        messages = [
+            (contact['name'], contact['phone'], f"EMERGENCY ALERT: {message} - {contact['name']}")
+            for contact in contacts
+        ]
+        detected_at = detected_at or datetime.utcnow()
+        try:
+            event, created = enqueue_event(
+                event_type, context.user, result.record, messages,
+                idempotency_key=make_idempotency_key(event_type, context.user, message, detected_at=detected_at),
+                detected_at=detected_at
+            )
+        except SQLAlchemyError:
+            # Without the outbox the alert still goes out, just without retries
+            result.add_event(WARNING, "⚠️ Alert could not be queued; sending once without retries")
+            result.dispatch = AlertDispatcher().dispatch(messages)
+            self._report_deliveries(result)
+            return result
+
+        result.record["outbox_id"] = event.id
+        if not created:
+            result.add_event(INFO, "ℹ️ This alert was already queued moments ago; not sending it twice")
+            return result
+
+        status = None
+        if self.deliver_inline:
+            result.dispatch, status = self.outbox.deliver(event.id)
+        if result.dispatch is None:
+            result.add_event(INFO, "📨 Emergency contact alerts queued for delivery")
+            return result
+
+        self._report_deliveries(result)
+        if status == OUTBOX_QUEUED:
+            result.add_event(INFO, "🔁 Failed alerts will be retried automatically")
+        return result
+
+    def _report_deliveries(self, result):
+        for delivery in result.dispatch.deliveries:
+            if delivery.success:
+                result.add_event(SUCCESS, f"✅ Emergency contact notified: {delivery.contact}")
+            else:
+                result.add_event(WARNING, f"⚠️ Failed to notify: {delivery.contact}")
+        result.success = bool(result.dispatch.delivered)
+
+    def call_emergency_services(self, context):
+        """Simulate emergency services call"""
+        detected_at = datetime.utcnow()
+        result = EmergencyResult("ambulance_call")
+        result.add_event(ERROR, "🚑 EMERGENCY SERVICES CONTACTED")
+
+        result.record = {
+            "timestamp": datetime.now().isoformat(),
+            "user": context.user or "emergency_user",
+            "location": self._location(context),
+            "type": "ambulance_call",
+            "status": "dispatched"
+        }
+
+        # In a real application, this would integrate with actual emergency services API
+        result.add_event(SUCCESS, "✅ Emergency services have been notified!")
+        result.add_event(INFO, "📍 Your location has been shared with emergency responders.")
+        result.add_event(INFO, "🕒 Estimated arrival time: 8-12 minutes")
+
+        # The record is persisted with the contact alert, or on its own if there is nobody to alert
+        notified = self.notify_emergency_contacts(
+            context, "Emergency services called", result.record, "ambulance_call", detected_at
+        )
+        if "outbox_id" not in notified.record:
+            self._record_event("ambulance_call", context, result.record, detected_at)
+        result.merge(notified)
+        return result
+
+    def _record_event(self, event_type, context, record, detected_at):
+        """Persist an emergency record that has no alerts to deliver"""
+        try:
+            enqueue_event(
+                event_type, context.user, record,
+                idempotency_key=make_idempotency_key(event_type, context.user, record.get("timestamp"),
+                                                     detected_at=detected_at),
+                detected_at=detected_at
+            )
+        except SQLAlchemyError:
+            return False
+        return True
+
+    def share_location(self, context):
+        """Share location with emergency contacts"""
+        result = EmergencyResult("share_location")
+        location = self._location(context)
+        if not location:
+            result.success = False
+            result.add_event(ERROR, "❌ Unable to get current location. Please enable location services.")
+            return result
+
+        result.record = {"location": location}
+        result.add_event(SUCCESS, f"📍 Location shared: {location.get('address', 'Location coordinates sent')}")
+        message = f"Emergency: Location shared - {location.get('address', 'Coordinates sent')}"
+        result.merge(self.notify_emergency_contacts(context, message, {"location": location}, "share_location"))
+        return result
+
+    def activate_emergency_mode(self, context, severity_assessment):
+        """Record an automatic emergency activation from a symptom assessment"""
+        detected_at = datetime.utcnow()
+        result = EmergencyResult("activate_emergency_mode", record={
+            "timestamp": datetime.now().isoformat(),
+            "user": context.user or "emergency_user",
+            "severity_assessment": severity_assessment,
+            "auto_activated": True
+        })
+        result.success = self._record_event("emergency_activation", context, result.record, detected_at)
+        return result
+
+    def find_facilities_for_assessment(self, assessment, location, max_distance=20, limit=3):
+        """Find the nearest open facilities able to treat the assessed condition.
+
+        If nothing within range has every capability, requirements are dropped
+        from the end of the list (least severe condition's first) down to any
+        emergency room. Each result carries the capabilities it was
+        matched on.
+        """
+        required = assessment.get("required_capabilities") or ["emergency_room"]
+        attempts = [required[:n] for n in range(len(required), 0, -1)]
+        if ["emergency_room"] not in attempts:
+            attempts.append(["emergency_room"])
+
+        for capabilities in attempts:
+            facilities = self.location_manager.find_capable_facilities(
+                capabilities, "hospitals", max_distance, open_now=True, location=location,
+                limit=limit * ETA_CANDIDATE_FACTOR
+            )
+            if facilities:
+                facilities = self.location_manager.rank_facilities_by_eta(facilities, location)[:limit]
+                for facility in facilities:
+                    facility["matched_capabilities"] = capabilities
+                    facility["missing_capabilities"] = [c for c in required if c not in capabilities]
+                return facilities
+        return []
+
+    def get_emergency_hospitals(self, location, count=3, max_distance=50):
+        """Get the nearest hospitals with an emergency room"""
+        # Straight-line nearest are the candidates; the road network decides the order
+        candidates = self.location_manager.find_nearest_facilities(
+            "hospitals",
+            count=count * ETA_CANDIDATE_FACTOR,
+            location=location,
+            max_distance=max_distance,
+            where=lambda facility: facility.get("emergency_room", False)
+        )
+        return self.location_manager.rank_facilities_by_eta(candidates, location)[:count]
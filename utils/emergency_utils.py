@@ -1,234 +1,88 @@
 import json
 import os
-from datetime import datetime
 import streamlit as st
 from utils.notification_utils import NotificationManager
 from utils.location_utils import LocationManager
+from utils.triage_rules import get_triage_catalog
+from utils.triage import get_required_capabilities, get_emergency_recommendation
+from utils.emergency_service import EmergencyContext, EmergencyService
+
+def render_result(result):
+    """Show an EmergencyResult's events with the matching Streamlit message boxes"""
+    for event in result.events:
+        getattr(st, event.level)(event.message)
+    return result
 
 class EmergencyManager:
+    """Streamlit adapter over EmergencyService: builds contexts from the session and renders results"""
+    
     def __init__(self):
         self.emergency_contacts_file = "data/emergency_contacts.json"
         self.ensure_data_directory()
-        self.notification_manager = NotificationManager()
-        self.location_manager = LocationManager()
-        
-        # Severity thresholds for automatic emergency detection
-        self.severe_symptoms = {
-            "chest_pain": {"severity": 9, "keywords": ["crushing", "severe", "radiating", "shortness of breath"]},
-            "difficulty_breathing": {"severity": 9, "keywords": ["can't breathe", "gasping", "suffocating"]},
-            "severe_headache": {"severity": 8, "keywords": ["worst headache", "sudden", "thunderclap"]},
-            "stroke_symptoms": {"severity": 10, "keywords": ["face drooping", "arm weakness", "speech difficulty"]},
-            "allergic_reaction": {"severity": 9, "keywords": ["swelling", "difficulty breathing", "hives", "anaphylaxis"]},
-            "severe_bleeding": {"severity": 9, "keywords": ["bleeding heavily", "won't stop", "spurting"]},
-            "loss_of_consciousness": {"severity": 10, "keywords": ["passed out", "unconscious", "fainted"]},
-            "severe_abdominal_pain": {"severity": 8, "keywords": ["stabbing", "sudden", "severe"]},
-            "poisoning": {"severity": 9, "keywords": ["poisoned", "overdose", "toxic"]},
-            "severe_burn": {"severity": 8, "keywords": ["severe burn", "large area", "chemical burn"]}
-        }
+        self.notification_manager = NotificationManager(st.session_state.get("username"))
+        self.location_manager = LocationManager(st.session_state)
+        self.service = EmergencyService(self.notification_manager, self.location_manager)
+    
+    @property
+    def severe_symptoms(self):
+        """Severity thresholds for automatic emergency detection, from the current rule catalog"""
+        return get_triage_catalog().rules["severe_symptoms"]
     
     def ensure_data_directory(self):
         """Ensure data directory exists"""
         os.makedirs("data", exist_ok=True)
     
+    def context(self, with_location=True):
+        """Build the emergency context for the signed-in user"""
+        return EmergencyContext(
+            user=st.session_state.get("username"),
+            location=self.location_manager.get_current_location() if with_location else None
+        )
+    
     def assess_symptom_severity(self, symptoms_text, additional_info=""):
         """Assess if symptoms require emergency response using AI and rule-based analysis"""
-        combined_text = f"{symptoms_text} {additional_info}".lower()
-        
-        # First try AI-based assessment if available
-        ai_assessment = None
-        try:
-            if hasattr(st.session_state, 'model_manager') and st.session_state.model_manager:
-                from utils.ai_models import model_manager
-                ai_assessment = model_manager.analyze_symptom_severity(combined_text)
-        except Exception:
-            pass  # Fall back to rule-based analysis
-        
-        # Rule-based analysis for critical detection
-        emergency_score = 0
-        detected_emergencies = []
-        
-        for condition, details in self.severe_symptoms.items():
-            for keyword in details["keywords"]:
-                if keyword.lower() in combined_text:
-                    emergency_score += details["severity"]
-                    detected_emergencies.append({
-                        "condition": condition,
-                        "severity": details["severity"],
-                        "keyword": keyword
-                    })
-        
-        # Combine AI assessment with rule-based analysis
-        if ai_assessment and ai_assessment.get("requires_emergency"):
-            emergency_score = max(emergency_score, 50)  # Ensure high priority for AI-detected emergencies
-        
-        # Direct emergency keywords
-        emergency_phrases = [
-            "call 911", "emergency", "ambulance", "can't breathe", 
-            "heart attack", "stroke", "unconscious", "severe pain",
-            "bleeding heavily", "overdose", "poisoning"
-        ]
-        
-        for phrase in emergency_phrases:
-            if phrase in combined_text:
-                emergency_score += 10
-                detected_emergencies.append({
-                    "condition": "direct_emergency_request",
-                    "severity": 10,
-                    "keyword": phrase
-                })
-        
-        is_emergency = emergency_score >= 8
-        
-        return {
-            "is_emergency": is_emergency,
-            "severity_score": emergency_score,
-            "detected_conditions": detected_emergencies,
-            "recommendation": self.get_emergency_recommendation(emergency_score, detected_emergencies)
-        }
+        # The AI severity analysis is rule-based; it only applies once models are loaded
+        models_loaded = bool(st.session_state.get('model_manager'))
+        return self.service.assess(symptoms_text, additional_info, include_severity_level=models_loaded)
+    
+    def get_required_capabilities(self, detected_conditions):
+        """Get the facility capabilities needed by the detected conditions, most severe condition's first"""
+        return get_required_capabilities(detected_conditions)
+    
+    def find_facilities_for_assessment(self, assessment, location=None, max_distance=20, limit=3):
+        """Find the nearest open facilities able to treat the assessed condition"""
+        location = location or self.location_manager.get_current_location()
+        return self.service.find_facilities_for_assessment(assessment, location, max_distance, limit)
     
     def get_emergency_recommendation(self, score, conditions):
         """Get emergency recommendation based on severity"""
-        if score >= 10:
-            return {
-                "level": "CRITICAL",
-                "action": "CALL 911 IMMEDIATELY",
-                "message": "Critical emergency detected. Call emergency services now!",
-                "color": "error"
-            }
-        elif score >= 8:
-            return {
-                "level": "URGENT",
-                "action": "SEEK IMMEDIATE MEDICAL ATTENTION",
-                "message": "Urgent medical attention required. Go to emergency room or call 911.",
-                "color": "error"
-            }
-        elif score >= 5:
-            return {
-                "level": "CONCERNING",
-                "action": "CONTACT HEALTHCARE PROVIDER",
-                "message": "Concerning symptoms. Contact your doctor or urgent care.",
-                "color": "warning"
-            }
-        else:
-            return {
-                "level": "MONITOR",
-                "action": "MONITOR SYMPTOMS",
-                "message": "Monitor symptoms and seek care if they worsen.",
-                "color": "info"
-            }
+        return get_emergency_recommendation(score)
     
     def call_emergency_services(self):
         """Simulate emergency services call"""
-        st.error("🚑 EMERGENCY SERVICES CONTACTED")
-        
-        # Get user location
-        location = self.location_manager.get_current_location()
-        
-        # Create emergency record
-        emergency_record = {
-            "timestamp": datetime.now().isoformat(),
-            "user": st.session_state.get("username", "emergency_user"),
-            "location": location,
-            "type": "ambulance_call",
-            "status": "dispatched"
-        }
-        
-        # In a real application, this would integrate with actual emergency services API
-        st.success("✅ Emergency services have been notified!")
-        st.info("📍 Your location has been shared with emergency responders.")
-        st.info("🕒 Estimated arrival time: 8-12 minutes")
-        
-        # Notify emergency contacts
-        self.notify_emergency_contacts("Emergency services called", emergency_record)
-        
-        return emergency_record
+        return render_result(self.service.call_emergency_services(self.context())).record
     
     def share_location(self):
         """Share location with emergency contacts"""
-        location = self.location_manager.get_current_location()
-        
-        if location:
-            st.success(f"📍 Location shared: {location.get('address', 'Location coordinates sent')}")
-            
-            # Notify emergency contacts with location
-            message = f"Emergency: Location shared - {location.get('address', 'Coordinates sent')}"
-            self.notify_emergency_contacts(message, {"location": location})
-        else:
-            st.error("❌ Unable to get current location. Please enable location services.")
+        render_result(self.service.share_location(self.context()))
     
     def notify_emergency_contacts(self, message, emergency_data=None):
         """Notify emergency contacts"""
-        if st.session_state.get("username"):
-            # Get emergency contacts from auth system
-            from utils.auth_utils import AuthManager
-            auth_manager = AuthManager()
-            contacts = auth_manager.get_emergency_contacts(st.session_state.username)
-            
-            if contacts:
-                for contact in contacts:
-                    # Send SMS notification
-                    full_message = f"EMERGENCY ALERT: {message} - {contact['name']}"
-                    success = self.notification_manager.send_sms(contact['phone'], full_message)
-                    
-                    if success:
-                        st.success(f"✅ Emergency contact notified: {contact['name']}")
-                    else:
-                        st.warning(f"⚠️ Failed to notify: {contact['name']}")
-            else:
-                st.warning("⚠️ No emergency contacts configured")
+        return render_result(
+            self.service.notify_emergency_contacts(self.context(with_location=False), message, emergency_data)
+        ).dispatch
     
-    def get_emergency_hospitals(self, location=None):
-        """Get nearby emergency hospitals"""
-        if not location:
-            location = self.location_manager.get_current_location()
-        
-        # This would integrate with a real hospital database/API
-        # For now, return mock data based on location
-        hospitals = [
-            {
-                "name": "City General Hospital",
-                "address": "123 Main St, Downtown",
-                "phone": "+1-555-0123",
-                "distance": "0.8 miles",
-                "emergency_room": True,
-                "trauma_center": True,
-                "wait_time": "15 minutes"
-            },
-            {
-                "name": "Regional Medical Center",
-                "address": "456 Oak Ave, Midtown",
-                "phone": "+1-555-0456",
-                "distance": "1.2 miles",
-                "emergency_room": True,
-                "trauma_center": False,
-                "wait_time": "25 minutes"
-            },
-            {
-                "name": "University Hospital",
-                "address": "789 College Blvd, University District",
-                "phone": "+1-555-0789",
-                "distance": "2.1 miles",
-                "emergency_room": True,
-                "trauma_center": True,
-                "wait_time": "30 minutes"
-            }
-        ]
-        
-        return hospitals
+    def get_emergency_hospitals(self, location=None, count=3, max_distance=50):
+        """Get the nearest hospitals with an emergency room"""
+        location = location or self.location_manager.get_current_location()
+        return self.service.get_emergency_hospitals(location, count, max_distance)
     
     def activate_emergency_mode(self, severity_assessment):
         """Activate emergency mode based on symptom assessment"""
         st.session_state.emergency_mode = True
         
         # Log emergency activation
-        emergency_log = {
-            "timestamp": datetime.now().isoformat(),
-            "user": st.session_state.get("username", "emergency_user"),
-            "severity_assessment": severity_assessment,
-            "auto_activated": True
-        }
-        
-        return emergency_log
+        return self.service.activate_emergency_mode(self.context(with_location=False), severity_assessment).record
     
     def get_emergency_instructions(self, condition_type):
         """Get first aid instructions for specific conditions"""
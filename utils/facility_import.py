@@ -0,0 +1,307 @@
+import csv
+import time
+import hashlib
+import argparse
+from datetime import datetime
+from sqlalchemy import insert, update
+from utils.db import get_session, init_db, Facility
+from utils.data_migration import DEFAULT_BATCH_SIZE, iter_json_array, print_progress
+from utils.import_checkpoints import checkpoint_source, load_checkpoint, save_checkpoint
+
+FACILITY_TYPES = ("hospitals", "pharmacies", "urgent_care")
+
+# Spellings seen in public facility datasets, mapped to the registry's type keys
+FACILITY_TYPE_ALIASES = {
+    "hospital": "hospitals",
+    "hospitals": "hospitals",
+    "general acute care": "hospitals",
+    "critical access": "hospitals",
+    "pharmacy": "pharmacies",
+    "pharmacies": "pharmacies",
+    "drugstore": "pharmacies",
+    "urgent care": "urgent_care",
+    "urgent_care": "urgent_care",
+    "urgentcare": "urgent_care",
+    "walk-in clinic": "urgent_care",
+}
+
+LAT_FIELDS = ("lat", "latitude", "y")
+LNG_FIELDS = ("lng", "lon", "long", "longitude", "x")
+
+# Seed registry used when neither the facilities table nor data/medical_facilities.json has data
+DEFAULT_MEDICAL_FACILITIES = {
+    "hospitals": [
+        {
+            "id": "hosp_001",
+            "name": "City General Hospital",
+            "address": "123 Main St, Downtown",
+            "phone": "+1-555-0123",
+            "coordinates": {"lat": 40.7128, "lng": -74.0060},
+            "emergency_room": True,
+            "trauma_center": True,
+            "specialties": ["Emergency Medicine", "Cardiology", "Neurology"],
+            "rating": 4.5
+        },
+        {
+            "id": "hosp_002",
+            "name": "Regional Medical Center",
+            "address": "456 Oak Ave, Midtown",
+            "phone": "+1-555-0456",
+            "coordinates": {"lat": 40.7580, "lng": -73.9855},
+            "emergency_room": True,
+            "trauma_center": False,
+            "specialties": ["Emergency Medicine", "Orthopedics", "Pediatrics"],
+            "rating": 4.2
+        },
+        {
+            "id": "hosp_003",
+            "name": "University Hospital",
+            "address": "789 College Blvd, University District",
+            "phone": "+1-555-0789",
+            "coordinates": {"lat": 40.6892, "lng": -74.0445},
+            "emergency_room": True,
+            "trauma_center": True,
+            "specialties": ["Emergency Medicine", "Surgery", "Oncology"],
+            "rating": 4.7
+        }
+    ],
+    "pharmacies": [
+        {
+            "id": "pharm_001",
+            "name": "Downtown Pharmacy",
+            "address": "100 Main St, Downtown",
+            "phone": "+1-555-1000",
+            "coordinates": {"lat": 40.7138, "lng": -74.0070},
+            "hours": "24/7",
+            "services": ["Prescription", "Over-the-counter", "Vaccinations"]
+        },
+        {
+            "id": "pharm_002",
+            "name": "MediMart Express",
+            "address": "500 Oak Ave, Midtown",
+            "phone": "+1-555-1001",
+            "coordinates": {"lat": 40.7590, "lng": -73.9865},
+            "hours": "6 AM - 12 AM",
+            "services": ["Prescription", "Over-the-counter", "Health screenings"]
+        }
+    ],
+    "urgent_care": [
+        {
+            "id": "urgent_001",
+            "name": "QuickCare Clinic",
+            "address": "200 Pine St, Westside",
+            "phone": "+1-555-2000",
+            "coordinates": {"lat": 40.7200, "lng": -74.0100},
+            "hours": "8 AM - 10 PM",
+            "wait_time": "15 minutes",
+            "services": ["Minor injuries", "Illness", "X-rays"]
+        }
+    ]
+}
+
+def normalize_facility_type(value, default=None):
+    """Map a dataset's facility type label to a registry type key"""
+    if not value:
+        return default
+    return FACILITY_TYPE_ALIASES.get(str(value).strip().lower(), default)
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value or "").strip().lower() in ("1", "true", "yes", "y", "t")
+
+def _parse_list(value):
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return [str(item).strip() for item in value if str(item).strip()]
+    value = str(value)
+    separator = "|" if "|" in value else ";"
+    return [item.strip() for item in value.split(separator) if item.strip()]
+
+def _parse_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _first(record, names):
+    for name in names:
+        if record.get(name) not in (None, ""):
+            return record[name]
+    return None
+
+def facility_to_row(facility_type, facility):
+    """Convert a registry facility dict to facilities table column values"""
+    coordinates = facility["coordinates"]
+    return {
+        "facility_id": facility["id"],
+        "type": facility_type,
+        "name": facility["name"],
+        "address": facility.get("address", ""),
+        "phone": facility.get("phone", ""),
+        "lat": float(coordinates["lat"]),
+        "lng": float(coordinates["lng"]),
+        "emergency_room": bool(facility.get("emergency_room", False)),
+        "trauma_center": bool(facility.get("trauma_center", False)),
+        "specialties": facility.get("specialties", []),
+        "services": facility.get("services", []),
+        "hours": facility.get("hours"),
+        "wait_time": facility.get("wait_time"),
+        "rating": facility.get("rating"),
+        "updated_at": datetime.utcnow()
+    }
+
+def facility_from_row(row):
+    """Convert a facilities table row to (facility_type, registry facility dict)"""
+    facility = {
+        "id": row.facility_id,
+        "name": row.name,
+        "address": row.address,
+        "phone": row.phone,
+        "coordinates": {"lat": row.lat, "lng": row.lng},
+        "emergency_room": row.emergency_room,
+        "trauma_center": row.trauma_center,
+        "specialties": row.specialties or [],
+        "services": row.services or []
+    }
+    for optional in ("hours", "wait_time", "rating"):
+        value = getattr(row, optional)
+        if value is not None:
+            facility[optional] = value
+    return row.type, facility
+
+def record_to_facility(record, lat=None, lng=None, default_type=None):
+    """Convert a flat dataset record (CSV row or GeoJSON properties) to (facility_type, facility dict).
+
+    Returns None for records without a usable type, name or coordinates.
+    """
+    facility_type = normalize_facility_type(record.get("type") or record.get("facility_type"), default_type)
+    lat = _parse_float(lat if lat is not None else _first(record, LAT_FIELDS))
+    lng = _parse_float(lng if lng is not None else _first(record, LNG_FIELDS))
+    name = str(record.get("name") or "").strip()
+    if facility_type is None or lat is None or lng is None or not name:
+        return None
+
+    facility_id = record.get("id") or record.get("facility_id")
+    if not facility_id:
+        # Stable id so re-importing the same dump updates rather than duplicates
+        digest = hashlib.sha1(f"{facility_type}|{name}|{lat:.5f}|{lng:.5f}".encode()).hexdigest()[:16]
+        facility_id = f"{facility_type}_{digest}"
+
+    facility = {
+        "id": str(facility_id),
+        "name": name,
+        "address": str(record.get("address") or ""),
+        "phone": str(record.get("phone") or ""),
+        "coordinates": {"lat": lat, "lng": lng},
+        "emergency_room": _parse_bool(record.get("emergency_room")),
+        "trauma_center": _parse_bool(record.get("trauma_center")),
+        "specialties": _parse_list(record.get("specialties")),
+        "services": _parse_list(record.get("services"))
+    }
+    if record.get("hours"):
+        facility["hours"] = str(record["hours"])
+    if record.get("wait_time"):
+        facility["wait_time"] = str(record["wait_time"])
+    rating = _parse_float(record.get("rating"))
+    if rating is not None:
+        facility["rating"] = rating
+    return facility_type, facility
+
+def iter_csv_facilities(path, default_type=None):
+    """Yield (facility_type, facility) from a CSV dump, one row at a time"""
+    with open(path, "r", newline="", encoding="utf-8-sig") as f:
+        for record in csv.DictReader(f):
+            yield record_to_facility(record, default_type=default_type)
+
+def iter_geojson_facilities(path, default_type=None):
+    """Yield (facility_type, facility) from a GeoJSON FeatureCollection of Points, one feature at a time"""
+    for feature in iter_json_array(path, "features"):
+        # Malformed features are counted as skipped rather than aborting the import
+        if not isinstance(feature, dict):
+            yield None
+            continue
+        geometry = feature.get("geometry")
+        if not isinstance(geometry, dict) or geometry.get("type") != "Point":
+            yield None
+            continue
+        coordinates = geometry.get("coordinates")
+        if not isinstance(coordinates, list) or len(coordinates) < 2:
+            yield None
+            continue
+        properties = feature.get("properties")
+        lng, lat = coordinates[:2]
+        yield record_to_facility(properties if isinstance(properties, dict) else {}, lat, lng, default_type)
+
+def import_facilities(path, file_format=None, default_type=None, batch_size=DEFAULT_BATCH_SIZE,
+                      progress=print_progress, restart=False):
+    """Upsert facilities from a CSV or GeoJSON dump, batch_size rows per transaction.
+
+    Rows are matched on facility_id, so re-running an import updates in place;
+    the checkpoint follows the file's size and mtime, so a changed file is
+    re-imported rather than skipped as already completed.
+    Returns (rows written, records skipped).
+    """
+    file_format = file_format or ("csv" if path.lower().endswith(".csv") else "geojson")
+    records = iter_csv_facilities(path, default_type) if file_format == "csv" else iter_geojson_facilities(path, default_type)
+
+    source = checkpoint_source("facilities", path)
+    start_index, _, _, completed = load_checkpoint(source, restart)
+    if completed:
+        return 0, 0
+
+    started = time.perf_counter()
+    written = 0
+    skipped = 0
+    batch = {}
+
+    def flush(next_index):
+        nonlocal written
+        with get_session() as db:
+            existing = dict(
+                db.query(Facility.facility_id, Facility.id).filter(Facility.facility_id.in_(list(batch)))
+            )
+            inserts = [row for facility_id, row in batch.items() if facility_id not in existing]
+            updates = [dict(row, id=existing[facility_id]) for facility_id, row in batch.items() if facility_id in existing]
+            if inserts:
+                db.execute(insert(Facility), inserts)
+            if updates:
+                db.execute(update(Facility), updates)
+            save_checkpoint(db, source, next_index, 0, len(batch))
+        written += len(batch)
+        batch.clear()
+        if progress:
+            progress("facilities", written, time.perf_counter() - started)
+
+    index = -1
+    for index, parsed in enumerate(records):
+        if index < start_index:
+            continue
+        if parsed is None:
+            skipped += 1
+            continue
+        facility_type, facility = parsed
+        batch[facility["id"]] = facility_to_row(facility_type, facility)
+        if len(batch) >= batch_size:
+            flush(index + 1)
+
+    if batch:
+        flush(index + 1)
+    with get_session() as db:
+        save_checkpoint(db, source, index + 1, 0, 0, completed=True)
+    return written, skipped
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk load a facility dataset into the facilities table")
+    parser.add_argument("path", help="CSV or GeoJSON FeatureCollection file")
+    parser.add_argument("--format", choices=["csv", "geojson"], help="Defaults to the file extension")
+    parser.add_argument("--type", dest="default_type", choices=FACILITY_TYPES,
+                        help="Facility type for records that do not carry one")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Rows per transaction")
+    parser.add_argument("--restart", action="store_true", help="Ignore the saved checkpoint and start over")
+    args = parser.parse_args()
+
+    init_db()
+    written, skipped = import_facilities(args.path, args.format, args.default_type, args.batch_size, restart=args.restart)
+    print(f"Facilities import completed: {written} rows written, {skipped} records skipped.")
@@ -0,0 +1,270 @@
+"""
+NumPy-backed facility store for vectorized distance queries
+All facilities of every type share contiguous coordinate arrays, so one
+pass computes the distance from a location to the whole registry
+"""
+
+import re
+from datetime import datetime
+import numpy as np
+from utils.spatial_index import EARTH_RADIUS_MILES, bounding_box
+
+# Bounds the (queries x facilities) distance matrix built per batch chunk
+BATCH_CELLS_LIMIT = 4_000_000
+
+# Capability bits shared by every facility; specialties get the bits after these
+CORE_CAPABILITIES = ("emergency_room", "trauma_center", "open_24_7")
+
+DAY_NAMES = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+ALL_DAYS = 0b1111111
+_TIME = r"(\d{1,2})(?::(\d{2}))?\s*(am|pm)"
+_HOURS_RANGE = re.compile(rf"^(?:(?P<days>[a-z]{{3}}(?:\s*-\s*[a-z]{{3}})?)\s*:?\s*)?{_TIME}\s*-\s*{_TIME}$")
+
+
+def _minutes(hour, minute, meridiem):
+    hour = int(hour) % 12 + (12 if meridiem == "pm" else 0)
+    return hour * 60 + int(minute or 0)
+
+
+def parse_hours(hours):
+    """Parse an hours string into (day_mask, open_minute, close_minute), or None if unrecognised.
+
+    Understands "24/7", "24 hours", "8 AM - 10 PM" and "Mon-Fri 8:30 AM - 6 PM".
+    Bit 0 of day_mask is Monday. A close at or before the open time means the
+    facility closes after midnight; "6 AM - 12 AM" closes at midnight.
+    """
+    text = (hours or "").strip().lower()
+    if text in ("24/7", "24 hours", "24hrs", "open 24 hours"):
+        return ALL_DAYS, 0, 24 * 60
+    match = _HOURS_RANGE.match(text)
+    if not match:
+        return None
+    day_mask = ALL_DAYS
+    if match.group("days"):
+        names = [name.strip() for name in match.group("days").split("-")]
+        if any(name not in DAY_NAMES for name in names):
+            return None
+        first, last = DAY_NAMES.index(names[0]), DAY_NAMES.index(names[-1])
+        day_mask = 0
+        for offset in range((last - first) % 7 + 1):
+            day_mask |= 1 << ((first + offset) % 7)
+    groups = match.groups()[1:]
+    open_minute = _minutes(*groups[0:3])
+    close_minute = _minutes(*groups[3:6])
+    if close_minute <= open_minute:
+        close_minute += 24 * 60
+    return day_mask, open_minute, close_minute
+
+
+def haversine_matrix(lat_rad, lng_rad, facility_lat, facility_lng, facility_cos_lat):
+    """Distances in miles between query points (rows) and facilities (columns), all in radians"""
+    lat_rad = np.asarray(lat_rad, dtype=np.float64).reshape(-1, 1)
+    lng_rad = np.asarray(lng_rad, dtype=np.float64).reshape(-1, 1)
+    a = (np.sin((facility_lat - lat_rad) / 2) ** 2 +
+         np.cos(lat_rad) * facility_cos_lat * np.sin((facility_lng - lng_rad) / 2) ** 2)
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def unit_vectors(lat_rad, lng_rad):
+    """Convert coordinates in radians to (x, y, z) on the unit sphere"""
+    cos_lat = np.cos(lat_rad)
+    return cos_lat * np.cos(lng_rad), cos_lat * np.sin(lng_rad), np.sin(lat_rad)
+
+
+class FacilityStore:
+    """Facilities of all types as parallel arrays: coordinates in radians plus a type code"""
+
+    def __init__(self, medical_facilities):
+        self.type_names = list(medical_facilities)
+        self.facilities = []
+        codes, lats, lngs = [], [], []
+        for code, facility_type in enumerate(self.type_names):
+            for facility in medical_facilities[facility_type]:
+                self.facilities.append(facility)
+                codes.append(code)
+                lats.append(facility["coordinates"]["lat"])
+                lngs.append(facility["coordinates"]["lng"])
+
+        self.type_codes = np.asarray(codes, dtype=np.int16)
+        self.lat = np.radians(np.asarray(lats, dtype=np.float64))
+        self.lng = np.radians(np.asarray(lngs, dtype=np.float64))
+        self.cos_lat = np.cos(self.lat)
+        # Unit vectors: ranking by dot product equals ranking by great-circle distance,
+        # which turns batch nearest-neighbour into a matrix multiply
+        self.xyz = np.ascontiguousarray(np.column_stack(unit_vectors(self.lat, self.lng)))
+        self._build_capabilities()
+
+    def _build_capabilities(self):
+        """Build the capability bitsets and parsed opening hours"""
+        self.capability_bits = {name: bit for bit, name in enumerate(CORE_CAPABILITIES)}
+        for facility in self.facilities:
+            for specialty in facility.get("specialties", []):
+                self.capability_bits.setdefault(specialty.strip().lower(), len(self.capability_bits))
+        words = (len(self.capability_bits) + 63) // 64
+        self.capabilities = np.zeros((len(self.facilities), words), dtype=np.uint64)
+
+        self.open_days = np.zeros(len(self.facilities), dtype=np.uint8)
+        self.open_minute = np.zeros(len(self.facilities), dtype=np.int16)
+        self.close_minute = np.zeros(len(self.facilities), dtype=np.int16)
+        self.hours_known = np.zeros(len(self.facilities), dtype=bool)
+
+        for i, facility in enumerate(self.facilities):
+            bits = set()
+            if facility.get("emergency_room"):
+                bits.add(self.capability_bits["emergency_room"])
+            if facility.get("trauma_center"):
+                bits.add(self.capability_bits["trauma_center"])
+            for specialty in facility.get("specialties", []):
+                bits.add(self.capability_bits[specialty.strip().lower()])
+            schedule = parse_hours(facility.get("hours"))
+            if schedule is None and facility.get("emergency_room"):
+                # Emergency rooms without published hours are open around the clock
+                schedule = (ALL_DAYS, 0, 24 * 60)
+            if schedule is not None:
+                self.hours_known[i] = True
+                self.open_days[i], self.open_minute[i], self.close_minute[i] = schedule
+                if schedule == (ALL_DAYS, 0, 24 * 60):
+                    bits.add(self.capability_bits["open_24_7"])
+            for bit in bits:
+                self.capabilities[i, bit // 64] |= np.uint64(1 << (bit % 64))
+
+    def capability_mask(self, required):
+        """Build the bitset for a list of capability names; None if any name is unknown to the registry"""
+        mask = np.zeros(self.capabilities.shape[1], dtype=np.uint64)
+        for name in required:
+            bit = self.capability_bits.get(name.strip().lower())
+            if bit is None:
+                return None
+            mask[bit // 64] |= np.uint64(1 << (bit % 64))
+        return mask
+
+    def open_at(self, when):
+        """Boolean array of facilities open at a datetime; unknown hours count as closed"""
+        minute = when.hour * 60 + when.minute
+        today = np.uint8(1 << when.weekday())
+        yesterday = np.uint8(1 << ((when.weekday() - 1) % 7))
+        # Opened today and not yet closed, or opened yesterday and still open past midnight
+        open_today = ((self.open_days & today) != 0) & (self.open_minute <= minute) & (minute < self.close_minute)
+        open_overnight = ((self.open_days & yesterday) != 0) & (minute + 24 * 60 < self.close_minute)
+        return self.hours_known & (open_today | open_overnight)
+
+    def find_capable(self, lat, lng, required=(), facility_type=None, max_distance=None, open_at=None, limit=None):
+        """Get (index, distance) of facilities having every required capability, nearest first.
+
+        Capabilities are "emergency_room", "trauma_center", "open_24_7" or a
+        specialty name (case-insensitive). open_at filters to facilities open at
+        that datetime. Equal distances are ranked by rating.
+        """
+        if not len(self.facilities):
+            return []
+        mask = self.capability_mask(required)
+        if mask is None:
+            return []
+        selected = np.all((self.capabilities & mask) == mask, axis=1)
+        if facility_type is not None:
+            if facility_type not in self.type_names:
+                return []
+            selected &= self.type_codes == self.type_names.index(facility_type)
+        if open_at is not None:
+            selected &= self.open_at(open_at)
+        if max_distance is not None:
+            min_lat, max_lat, min_lng, max_lng = np.radians(bounding_box(lat, lng, max_distance))
+            selected &= (self.lat >= min_lat) & (self.lat <= max_lat) & (self.lng >= min_lng) & (self.lng <= max_lng)
+
+        candidates = np.flatnonzero(selected)
+        if not len(candidates):
+            return []
+        distances = haversine_matrix(
+            np.radians(lat), np.radians(lng), self.lat[candidates], self.lng[candidates], self.cos_lat[candidates]
+        )[0]
+        if max_distance is not None:
+            keep = distances <= max_distance
+            candidates, distances = candidates[keep], distances[keep]
+        ratings = np.array([self.facilities[i].get("rating") or 0.0 for i in candidates])
+        order = np.lexsort((-ratings, np.round(distances, 1)))
+        if limit is not None:
+            order = order[:limit]
+        return [(int(candidates[i]), float(distances[i])) for i in order]
+
+    def __len__(self):
+        return len(self.facilities)
+
+    def distances_from(self, lat, lng):
+        """Distance in miles from one location to every facility, in store order"""
+        return haversine_matrix(np.radians(lat), np.radians(lng), self.lat, self.lng, self.cos_lat)[0]
+
+    def nearby_by_type(self, lat, lng, max_distance):
+        """Get {facility_type: [facility with distance, ...]} nearest first, from a single distance pass.
+
+        max_distance is either one radius for every type or a {facility_type: radius} dict;
+        types missing from the dict are skipped.
+        """
+        if isinstance(max_distance, dict):
+            wanted = {self.type_names.index(t): r for t, r in max_distance.items() if t in self.type_names}
+        else:
+            wanted = {code: max_distance for code in range(len(self.type_names))}
+        results = {self.type_names[code]: [] for code in wanted}
+        if not len(self.facilities) or not wanted:
+            return results
+
+        distances = self.distances_from(lat, lng)
+        radii = np.full(len(self.type_names), -1.0)
+        for code, radius in wanted.items():
+            radii[code] = radius
+        within = np.flatnonzero(distances <= radii[self.type_codes])
+
+        for i in within[np.argsort(distances[within], kind="stable")]:
+            facility = self.facilities[i].copy()
+            facility["distance"] = round(float(distances[i]), 1)
+            results[self.type_names[self.type_codes[i]]].append(facility)
+        return results
+
+    def nearest_batch(self, locations, count=1, facility_type=None, max_distance=None):
+        """Answer many "nearest `count` facilities" queries at once.
+
+        locations is a sequence of (lat, lng). Returns (indices, distances), each
+        of shape (len(locations), count), nearest first; slots with no facility
+        (too few candidates or beyond max_distance) hold -1 and inf. Indices
+        refer to self.facilities.
+        """
+        points = np.asarray(locations, dtype=np.float64).reshape(-1, 2)
+        candidates = np.arange(len(self.facilities))
+        if facility_type is not None:
+            if facility_type not in self.type_names:
+                candidates = candidates[:0]
+            else:
+                candidates = np.flatnonzero(self.type_codes == self.type_names.index(facility_type))
+
+        indices = np.full((len(points), count), -1, dtype=np.int64)
+        distances = np.full((len(points), count), np.inf)
+        if not len(candidates) or not len(points) or count <= 0:
+            return indices, distances
+
+        xyz = self.xyz[candidates]
+        k = min(count, len(candidates))
+        chunk = max(1, BATCH_CELLS_LIMIT // len(candidates))
+        for start in range(0, len(points), chunk):
+            block = np.radians(points[start:start + chunk])
+            similarity = np.column_stack(unit_vectors(block[:, 0], block[:, 1])) @ xyz.T
+            if k < len(candidates):
+                part = np.argpartition(-similarity, k - 1, axis=1)[:, :k]
+            else:
+                part = np.broadcast_to(np.arange(k), (len(block), k))
+            # Exact Haversine distances for the k winners only
+            chosen = candidates[part]
+            part_distances = 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.clip(
+                np.sin((self.lat[chosen] - block[:, :1]) / 2) ** 2 +
+                np.cos(block[:, :1]) * self.cos_lat[chosen] * np.sin((self.lng[chosen] - block[:, 1:]) / 2) ** 2,
+                0.0, 1.0
+            )))
+            order = np.argsort(part_distances, axis=1, kind="stable")
+
+            rows = slice(start, start + len(block))
+            indices[rows, :k] = np.take_along_axis(chosen, order, axis=1)
+            distances[rows, :k] = np.take_along_axis(part_distances, order, axis=1)
+
+        if max_distance is not None:
+            beyond = distances > max_distance
+            indices[beyond] = -1
+            distances[beyond] = np.inf
+        return indices, distances
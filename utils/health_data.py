@@ -1,82 +1,178 @@
 
-import json
-from datetime import datetime
-from utils.db import SessionLocal, Patient, HealthRecord
-from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+from sqlalchemy import func, or_, and_, case
+from utils.db import get_session, Patient, HealthRecord, PatientHealthSummary
 
-class HealthDataManager:
-    def __init__(self):
-        self.db: Session = SessionLocal()
+# Number of most recent vitals / symptom records that feed the health score
+HEALTH_SCORE_WINDOW = 7
+
+def get_health_status(health_score):
+    """Get status label for a health score"""
+    if health_score >= 90:
+        return "Excellent"
+    elif health_score >= 70:
+        return "Good"
+    else:
+        return "Needs Attention"
+
+# Score range (inclusive lower, exclusive upper) covered by each status label
+HEALTH_STATUS_RANGES = {
+    "Excellent": (90, None),
+    "Good": (70, 90),
+    "Needs Attention": (None, 70),
+}
+
+# Vital sign fields stored as typed, queryable columns on HealthRecord
+VITAL_SIGN_FIELDS = (
+    "blood_pressure_systolic",
+    "blood_pressure_diastolic",
+    "heart_rate",
+    "temperature",
+    "weight",
+)
 
+def extract_vital_columns(record_type, data):
+    """Map a vital signs payload onto the typed HealthRecord columns"""
+    if record_type != "vital_signs":
+        return {}
+    columns = {}
+    for field in VITAL_SIGN_FIELDS:
+        value = data.get(field)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            columns[field] = float(value)
+    return columns
+
+class HealthDataManager:
     def add_patient(self, patient_id, patient_data):
         """Add a new patient"""
-        existing_patient = self.db.query(Patient).filter(Patient.patient_id == patient_id).first()
-        if existing_patient:
-            return False
-        patient = Patient(
-            patient_id=patient_id,
-            data=json.dumps(patient_data),
-            created_at=datetime.utcnow(),
-            last_updated=datetime.utcnow()
-        )
-        self.db.add(patient)
-        self.db.commit()
-        self.db.refresh(patient)
+        with get_session() as db:
+            existing_patient = db.query(Patient).filter(Patient.patient_id == patient_id).first()
+            if existing_patient:
+                return False
+            patient = Patient(
+                patient_id=patient_id,
+                data=patient_data,
+                created_at=datetime.utcnow(),
+                last_updated=datetime.utcnow()
+            )
+            db.add(patient)
         return True
 
     def get_patient(self, patient_id):
         """Get patient by ID"""
-        patient = self.db.query(Patient).filter(Patient.patient_id == patient_id).first()
-        if patient:
-            return json.loads(patient.data)
+        with get_session() as db:
+            patient = db.query(Patient).filter(Patient.patient_id == patient_id).first()
+            if patient:
+                return patient.data
         return None
 
     def get_all_patients(self):
         """Get all patients"""
-        patients = self.db.query(Patient).all()
-        return [json.loads(p.data) for p in patients]
+        with get_session() as db:
+            patients = db.query(Patient).all()
+            return [p.data for p in patients]
 
     def update_patient(self, patient_id, updates):
         """Update patient information"""
-        patient = self.db.query(Patient).filter(Patient.patient_id == patient_id).first()
-        if not patient:
-            return False
-        data = json.loads(patient.data)
-        data.update(updates)
-        patient.data = json.dumps(data)
-        patient.last_updated = datetime.utcnow()
-        self.db.commit()
+        with get_session() as db:
+            patient = db.query(Patient).filter(Patient.patient_id == patient_id).first()
+            if not patient:
+                return False
+            data = dict(patient.data)
+            data.update(updates)
+            patient.data = data
+            patient.last_updated = datetime.utcnow()
         return True
 
     def add_health_record(self, patient_id, record_type, data):
         """Add health record for patient"""
-        patient = self.db.query(Patient).filter(Patient.patient_id == patient_id).first()
-        if not patient:
-            return None
-        record = HealthRecord(
-            patient_id=patient.id,
-            record_type=record_type,
-            data=json.dumps(data),
-            timestamp=datetime.utcnow()
+        with get_session() as db:
+            patient = db.query(Patient).filter(Patient.patient_id == patient_id).first()
+            if not patient:
+                return None
+            record = HealthRecord(
+                patient_id=patient.id,
+                record_type=record_type,
+                data=data,
+                timestamp=datetime.utcnow(),
+                **extract_vital_columns(record_type, data)
+            )
+            db.add(record)
+            db.flush()
+            if record_type in ("vital_signs", "symptoms"):
+                self._apply_record_to_summary(db, patient, record_type, data, record.timestamp)
+            else:
+                self._touch_summary_last_visit(db, patient, record.timestamp)
+            return record.id
+
+    def _get_or_create_summary(self, db, patient):
+        """Get the materialized summary row for a patient, creating an empty one"""
+        summary = db.get(PatientHealthSummary, patient.id)
+        if summary is None:
+            summary = PatientHealthSummary(
+                patient_id=patient.id,
+                health_score=100,
+                recent_vitals=[],
+                recent_symptoms=[],
+                high_bp_pattern=False,
+                severe_symptom_count=0
+            )
+            db.add(summary)
+        return summary
+
+    def _touch_summary_last_visit(self, db, patient, timestamp):
+        """Advance the materialized last visit for a record that does not affect the score"""
+        summary = self._get_or_create_summary(db, patient)
+        if summary.last_visit is None or timestamp > summary.last_visit:
+            summary.last_visit = timestamp
+        summary.updated_at = datetime.utcnow()
+
+    def _apply_record_to_summary(self, db, patient, record_type, data, timestamp):
+        """Fold a new vitals/symptoms record into the patient's materialized summary"""
+        summary = self._get_or_create_summary(db, patient)
+        recent_vitals = summary.recent_vitals or []
+        recent_symptoms = summary.recent_symptoms or []
+
+        if record_type == "vital_signs":
+            recent_vitals = [data] + recent_vitals[:HEALTH_SCORE_WINDOW - 1]
+            summary.last_vitals = data
+        else:
+            recent_symptoms = [data] + recent_symptoms[:HEALTH_SCORE_WINDOW - 1]
+
+        self._fill_summary(summary, recent_vitals, recent_symptoms)
+        if summary.last_visit is None or timestamp > summary.last_visit:
+            summary.last_visit = timestamp
+
+    def _fill_summary(self, summary, recent_vitals, recent_symptoms):
+        """Recompute score and rolling flags on a summary from its scoring windows"""
+        summary.recent_vitals = recent_vitals
+        summary.recent_symptoms = recent_symptoms
+        summary.health_score = self.score_health_data(recent_vitals, recent_symptoms)
+        summary.high_bp_pattern = len(recent_vitals) >= 3 and all(
+            v.get("blood_pressure_systolic", 120) > 140 for v in recent_vitals[:3]
         )
-        self.db.add(record)
-        self.db.commit()
-        self.db.refresh(record)
-        return record.id
+        summary.severe_symptom_count = sum(1 for s in recent_symptoms if s.get("severity") == "severe")
+        summary.updated_at = datetime.utcnow()
 
-    def get_health_records(self, patient_id, record_type=None, limit=None):
-        """Get health records for patient"""
-        patient = self.db.query(Patient).filter(Patient.patient_id == patient_id).first()
-        if not patient:
-            return []
-        query = self.db.query(HealthRecord).filter(HealthRecord.patient_id == patient.id)
+    @staticmethod
+    def build_records_query(db, patient_pk, record_type=None, limit=None):
+        """Build the newest-first health record query served by the composite indexes"""
+        query = db.query(HealthRecord).filter(HealthRecord.patient_id == patient_pk)
         if record_type:
             query = query.filter(HealthRecord.record_type == record_type)
         query = query.order_by(HealthRecord.timestamp.desc())
         if limit:
             query = query.limit(limit)
-        records = query.all()
-        return [ {"type": r.record_type, "data": json.loads(r.data), "timestamp": r.timestamp.isoformat(), "id": r.id} for r in records]
+        return query
+
+    def get_health_records(self, patient_id, record_type=None, limit=None):
+        """Get health records for patient"""
+        with get_session() as db:
+            patient = db.query(Patient).filter(Patient.patient_id == patient_id).first()
+            if not patient:
+                return []
+            records = self.build_records_query(db, patient.id, record_type, limit).all()
+            return [ {"type": r.record_type, "data": r.data, "timestamp": r.timestamp.isoformat(), "id": r.id} for r in records]
 
     def get_vital_signs(self, patient_id, days=30):
         """Get recent vital signs for patient"""
@@ -86,15 +182,49 @@ class HealthDataManager:
         """Get recent symptoms for patient"""
         return self.get_health_records(patient_id, "symptoms", limit=days)
 
+    def get_health_summary(self, patient_id):
+        """Get the materialized health summary for a patient"""
+        with get_session() as db:
+            summary = (
+                db.query(PatientHealthSummary)
+                .join(Patient, Patient.id == PatientHealthSummary.patient_id)
+                .filter(Patient.patient_id == patient_id)
+                .first()
+            )
+            if not summary:
+                return None
+            return {
+                "health_score": summary.health_score,
+                "status": get_health_status(summary.health_score),
+                "last_visit": summary.last_visit,
+                "last_vitals": summary.last_vitals,
+                "high_bp_pattern": summary.high_bp_pattern,
+                "severe_symptom_count": summary.severe_symptom_count,
+                "updated_at": summary.updated_at
+            }
+
     def calculate_health_score(self, patient_id):
-        """Calculate overall health score based on recent data"""
-        vital_signs = self.get_vital_signs(patient_id, 7)
-        symptoms = self.get_symptoms_history(patient_id, 7)
+        """Get overall health score, read from the materialized summary when present"""
+        summary = self.get_health_summary(patient_id)
+        if summary:
+            return summary["health_score"]
+        return self.recompute_health_score(patient_id)
+
+    def recompute_health_score(self, patient_id):
+        """Calculate overall health score from the underlying health records"""
+        vital_signs = self.get_vital_signs(patient_id, HEALTH_SCORE_WINDOW)
+        symptoms = self.get_symptoms_history(patient_id, HEALTH_SCORE_WINDOW)
+        return self.score_health_data(
+            [r["data"] for r in vital_signs],
+            [r["data"] for r in symptoms]
+        )
 
+    @staticmethod
+    def score_health_data(vital_signs, symptoms):
+        """Score the most recent vital sign and symptom payloads (newest first)"""
         score = 100
 
-        for record in vital_signs:
-            data = record["data"]
+        for data in vital_signs:
             if "blood_pressure_systolic" in data:
                 systolic = data["blood_pressure_systolic"]
                 if systolic > 140 or systolic < 90:
@@ -110,8 +240,8 @@ class HealthDataManager:
                 if temp > 38 or temp < 36:
                     score -= 10
 
-        for record in symptoms:
-            severity = record["data"].get("severity", "mild")
+        for data in symptoms:
+            severity = data.get("severity", "mild")
             if severity == "severe":
                 score -= 20
             elif severity == "moderate":
@@ -121,10 +251,244 @@ class HealthDataManager:
 
         return max(0, score)
 
+    def find_patients_by_vital(self, field, min_value=None, max_value=None, days=7):
+        """Find patients with a vital sign reading in range during the last N days.
+
+        For example find_patients_by_vital("blood_pressure_systolic", min_value=140)
+        returns everyone with a systolic reading of 140 or more this week. The
+        filter and aggregation run in the database on the typed vitals columns.
+        """
+        if field not in VITAL_SIGN_FIELDS:
+            raise ValueError(f"Unknown vital sign field: {field}")
+        column = getattr(HealthRecord, field)
+        since = datetime.utcnow() - timedelta(days=days)
+
+        with get_session() as db:
+            query = (
+                db.query(
+                    Patient.patient_id,
+                    func.count(HealthRecord.id),
+                    func.min(column),
+                    func.max(column),
+                    func.max(HealthRecord.timestamp)
+                )
+                .join(Patient, Patient.id == HealthRecord.patient_id)
+                .filter(HealthRecord.record_type == "vital_signs")
+                .filter(HealthRecord.timestamp >= since)
+                .filter(column.isnot(None))
+            )
+            if min_value is not None:
+                query = query.filter(column >= min_value)
+            if max_value is not None:
+                query = query.filter(column <= max_value)
+            rows = query.group_by(Patient.patient_id).order_by(Patient.patient_id).all()
+
+        return [
+            {
+                "patient_id": patient_id,
+                "readings": readings,
+                "min": lowest,
+                "max": highest,
+                "last_reading": last_reading
+            }
+            for patient_id, readings, lowest, highest, last_reading in rows
+        ]
+
+    def get_patient_directory(self, search=None, status=None, page=1, page_size=50):
+        """Get one page of the patient directory with last visit and health score.
+
+        Scores come from the materialized summary table, so search, status
+        filtering and pagination all run in SQL.
+        """
+        with get_session() as db:
+            health_score = func.coalesce(PatientHealthSummary.health_score, 100)
+            query = (
+                db.query(Patient, health_score, PatientHealthSummary.last_visit)
+                .outerjoin(PatientHealthSummary, PatientHealthSummary.patient_id == Patient.id)
+            )
+            if search:
+                pattern = f"%{search.lower()}%"
+                full_name = func.lower(
+                    func.coalesce(Patient.data["first_name"].as_string(), "") + " " +
+                    func.coalesce(Patient.data["last_name"].as_string(), "")
+                )
+                query = query.filter(or_(func.lower(Patient.patient_id).like(pattern), full_name.like(pattern)))
+            if status:
+                low, high = HEALTH_STATUS_RANGES[status]
+                bounds = []
+                if low is not None:
+                    bounds.append(health_score >= low)
+                if high is not None:
+                    bounds.append(health_score < high)
+                query = query.filter(and_(*bounds))
+
+            total = query.count()
+            results = (
+                query.order_by(Patient.patient_id)
+                .offset((page - 1) * page_size)
+                .limit(page_size)
+                .all()
+            )
+
+            rows = []
+            for patient, score, last_visit in results:
+                info = patient.data
+                rows.append({
+                    "patient_id": patient.patient_id,
+                    "first_name": info.get("first_name", ""),
+                    "last_name": info.get("last_name", ""),
+                    "age": info.get("age"),
+                    "gender": info.get("gender"),
+                    "last_visit": last_visit,
+                    "health_score": score,
+                    "status": get_health_status(score)
+                })
+
+        return {"patients": rows, "total": total, "page": page, "page_size": page_size}
+
+    def get_health_score_stats(self):
+        """Get population health score aggregates from the summary table"""
+        with get_session() as db:
+            health_score = func.coalesce(PatientHealthSummary.health_score, 100)
+            total, average, needs_attention, high_risk = (
+                db.query(
+                    func.count(Patient.id),
+                    func.avg(health_score),
+                    func.sum(case((health_score < 70, 1), else_=0)),
+                    func.sum(case((health_score < 50, 1), else_=0))
+                )
+                .outerjoin(PatientHealthSummary, PatientHealthSummary.patient_id == Patient.id)
+                .one()
+            )
+        return {
+            "total_patients": total,
+            "average_score": float(average or 0),
+            "needs_attention": int(needs_attention or 0),
+            "high_risk": int(high_risk or 0)
+        }
+
+    def _load_recent_windows(self, db, patient_pks):
+        """Load each patient's scoring windows and last visit in two grouped queries"""
+        windows = {pk: {"vital_signs": [], "symptoms": [], "last_visit": None} for pk in patient_pks}
+        if not patient_pks:
+            return windows
+
+        last_visits = (
+            db.query(HealthRecord.patient_id, func.max(HealthRecord.timestamp))
+            .filter(HealthRecord.patient_id.in_(patient_pks))
+            .group_by(HealthRecord.patient_id)
+            .all()
+        )
+        for patient_pk, last_visit in last_visits:
+            windows[patient_pk]["last_visit"] = last_visit
+
+        # Newest HEALTH_SCORE_WINDOW vitals and symptoms per patient in one pass
+        ranked = (
+            db.query(
+                HealthRecord.patient_id,
+                HealthRecord.record_type,
+                HealthRecord.data,
+                func.row_number().over(
+                    partition_by=(HealthRecord.patient_id, HealthRecord.record_type),
+                    order_by=(HealthRecord.timestamp.desc(), HealthRecord.id.desc())
+                ).label("position")
+            )
+            .filter(HealthRecord.patient_id.in_(patient_pks))
+            .filter(HealthRecord.record_type.in_(("vital_signs", "symptoms")))
+            .subquery()
+        )
+        recent = (
+            db.query(ranked.c.patient_id, ranked.c.record_type, ranked.c.data)
+            .filter(ranked.c.position <= HEALTH_SCORE_WINDOW)
+            .order_by(ranked.c.patient_id, ranked.c.record_type, ranked.c.position)
+            .all()
+        )
+        for patient_pk, record_type, data in recent:
+            windows[patient_pk][record_type].append(data)
+        return windows
+
+    def rebuild_health_summaries(self, db=None, batch_size=500):
+        """Rebuild every materialized health summary from health_records (backfill)"""
+        if db is None:
+            with get_session() as session:
+                return self.rebuild_health_summaries(db=session, batch_size=batch_size)
+
+        rebuilt = 0
+        last_pk = 0
+        while True:
+            patients = (
+                db.query(Patient)
+                .filter(Patient.id > last_pk)
+                .order_by(Patient.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not patients:
+                break
+            windows = self._load_recent_windows(db, [p.id for p in patients])
+            for patient in patients:
+                window = windows[patient.id]
+                summary = self._get_or_create_summary(db, patient)
+                self._fill_summary(summary, window["vital_signs"], window["symptoms"])
+                summary.last_vitals = window["vital_signs"][0] if window["vital_signs"] else None
+                summary.last_visit = window["last_visit"]
+            db.flush()
+            rebuilt += len(patients)
+            last_pk = patients[-1].id
+        return rebuilt
+
+    def check_health_summaries(self, batch_size=500):
+        """Compare materialized summaries against values recomputed from health_records"""
+        mismatches = []
+        with get_session() as db:
+            last_pk = 0
+            while True:
+                patients = (
+                    db.query(Patient)
+                    .filter(Patient.id > last_pk)
+                    .order_by(Patient.id)
+                    .limit(batch_size)
+                    .all()
+                )
+                if not patients:
+                    break
+                windows = self._load_recent_windows(db, [p.id for p in patients])
+                summaries = {
+                    s.patient_id: s for s in
+                    db.query(PatientHealthSummary).filter(PatientHealthSummary.patient_id.in_([p.id for p in patients]))
+                }
+                for patient in patients:
+                    window = windows[patient.id]
+                    summary = summaries.get(patient.id)
+                    expected = {
+                        "health_score": self.score_health_data(window["vital_signs"], window["symptoms"]),
+                        "last_visit": window["last_visit"]
+                    }
+                    actual = {
+                        "health_score": summary.health_score if summary else 100,
+                        "last_visit": summary.last_visit if summary else None
+                    }
+                    for field, value in expected.items():
+                        if actual[field] != value:
+                            mismatches.append({
+                                "patient_id": patient.patient_id,
+                                "field": field,
+                                "materialized": actual[field],
+                                "recomputed": value
+                            })
+                last_pk = patients[-1].id
+        return mismatches
+
     def generate_wellness_insights(self, patient_id):
         """Generate wellness insights for patient"""
-        health_score = self.calculate_health_score(patient_id)
-        vital_signs = self.get_vital_signs(patient_id, 30)
+        summary = self.get_health_summary(patient_id)
+        if summary:
+            health_score = summary["health_score"]
+            high_bp_pattern = summary["high_bp_pattern"]
+        else:
+            health_score = self.recompute_health_score(patient_id)
+            recent_bp = [r["data"].get("blood_pressure_systolic", 120) for r in self.get_vital_signs(patient_id, 3)]
+            high_bp_pattern = len(recent_bp) >= 3 and all(bp > 140 for bp in recent_bp)
         symptoms = self.get_symptoms_history(patient_id, 30)
 
         insights = []
@@ -148,14 +512,12 @@ class HealthDataManager:
                 "message": "Several health metrics need attention. Consider consulting a healthcare provider."
             })
 
-        if len(vital_signs) >= 3:
-            recent_bp = [r["data"].get("blood_pressure_systolic", 120) for r in vital_signs[:3]]
-            if all(bp > 140 for bp in recent_bp):
-                insights.append({
-                    "type": "danger",
-                    "title": "High Blood Pressure Pattern",
-                    "message": "Your blood pressure has been consistently high. Please consult a doctor."
-                })
+        if high_bp_pattern:
+            insights.append({
+                "type": "danger",
+                "title": "High Blood Pressure Pattern",
+                "message": "Your blood pressure has been consistently high. Please consult a doctor."
+            })
 
         if len(symptoms) >= 3:
             severe_symptoms = [s for s in symptoms if s["data"].get("severity") == "severe"]
@@ -0,0 +1,47 @@
+"""
+Resume checkpoints for bulk imports
+A checkpoint is keyed on the import kind and the source file's identity (path,
+size, modification time), so an interrupted import resumes where it stopped
+while a changed file at the same path is imported afresh
+"""
+
+import os
+from datetime import datetime
+from utils.db import get_session, ImportCheckpoint
+
+
+def checkpoint_source(kind, path):
+    """Key an import on the file's path, size and modification time"""
+    stat = os.stat(path)
+    return f"{kind}:{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def load_checkpoint(source, restart=False):
+    """Get (item_index, item_offset, rows_imported, completed) for an import source"""
+    with get_session() as db:
+        checkpoint = db.get(ImportCheckpoint, source)
+        if checkpoint is None or restart:
+            if checkpoint is None:
+                # Checkpoints of earlier versions of the same file can never match again
+                prefix = source.rsplit(":", 2)[0] + ":"
+                db.query(ImportCheckpoint).filter(
+                    ImportCheckpoint.source.startswith(prefix, autoescape=True)
+                ).delete(synchronize_session=False)
+                checkpoint = ImportCheckpoint(source=source)
+                db.add(checkpoint)
+            checkpoint.item_index = 0
+            checkpoint.item_offset = 0
+            checkpoint.rows_imported = 0
+            checkpoint.completed = False
+            checkpoint.updated_at = datetime.utcnow()
+        return checkpoint.item_index, checkpoint.item_offset, checkpoint.rows_imported, checkpoint.completed
+
+
+def save_checkpoint(db, source, item_index, item_offset, rows_added, completed=False):
+    """Advance a checkpoint inside the caller's transaction"""
+    checkpoint = db.get(ImportCheckpoint, source)
+    checkpoint.item_index = item_index
+    checkpoint.item_offset = item_offset
+    checkpoint.rows_imported += rows_added
+    checkpoint.completed = completed
+    checkpoint.updated_at = datetime.utcnow()
@@ -0,0 +1,156 @@
+"""
+Result cache for AI inference calls
+An in-memory LRU with TTL per process, optionally backed by a SQLite file
+shared by every worker process on the host
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+INFERENCE_CACHE_TTL = float(os.getenv("INFERENCE_CACHE_TTL", "3600"))
+INFERENCE_CACHE_MAX_ENTRIES = int(os.getenv("INFERENCE_CACHE_MAX_ENTRIES", "1000"))
+# e.g. data/inference_cache.db; unset keeps the cache in memory only
+INFERENCE_CACHE_DB = os.getenv("INFERENCE_CACHE_DB")
+
+# Expired disk rows are purged once every this many writes
+PURGE_EVERY_WRITES = 500
+
+_NON_WORD = re.compile(r"[^a-z0-9']+")
+
+
+def normalize_input(text):
+    """Normalize text so trivially different phrasings share a key.
+
+    Case, punctuation and whitespace are ignored: "What should I do for
+    chest pain?" and "what should i do for  chest pain" are the same input.
+    """
+    return " ".join(_NON_WORD.sub(" ", str(text).lower()).split())
+
+
+def make_cache_key(model, inputs, parameters=None):
+    """Build the cache key for a model, normalized input and generation parameters"""
+    material = json.dumps([model, normalize_input(inputs), parameters or {}], sort_keys=True)
+    return hashlib.sha256(material.encode()).hexdigest()
+
+
+class InferenceCache:
+    """Two-tier LRU+TTL cache of JSON-serializable inference results"""
+
+    def __init__(self, max_entries=INFERENCE_CACHE_MAX_ENTRIES, ttl=INFERENCE_CACHE_TTL, db_path=INFERENCE_CACHE_DB):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path
+        self._memory = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        if db_path:
+            self._connection().execute(
+                "CREATE TABLE IF NOT EXISTS inference_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def _connection(self):
+        """Get this thread's connection to the shared cache file"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            connection = sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key):
+        """Get a cached value, or None on a miss"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return entry[1]
+                del self._memory[key]
+
+        if self.db_path:
+            try:
+                row = self._connection().execute(
+                    "SELECT value, expires_at FROM inference_cache WHERE key = ? AND expires_at > ?", (key, now)
+                ).fetchone()
+            except sqlite3.Error:
+                row = None
+            if row is not None:
+                value = json.loads(row[0])
+                with self._lock:
+                    self.disk_hits += 1
+                    self._remember(key, row[1], value)
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, value):
+        """Store a value in both tiers"""
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, expires_at, value)
+            self._writes += 1
+            purge = self._writes % PURGE_EVERY_WRITES == 0
+
+        if self.db_path:
+            try:
+                connection = self._connection()
+                connection.execute(
+                    "INSERT OR REPLACE INTO inference_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), expires_at)
+                )
+                if purge:
+                    connection.execute("DELETE FROM inference_cache WHERE expires_at <= ?", (time.time(),))
+            except sqlite3.Error:
+                pass  # The disk tier is best-effort; the memory tier still holds the value
+
+    def _remember(self, key, expires_at, value):
+        """Insert into the memory tier, evicting the least recently used entries (lock held)"""
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def record_bypass(self):
+        """Count a lookup deliberately skipped, e.g. for an emergency message"""
+        with self._lock:
+            self.bypassed += 1
+
+    def clear(self):
+        """Drop every cached entry from both tiers"""
+        with self._lock:
+            self._memory.clear()
+        if self.db_path:
+            self._connection().execute("DELETE FROM inference_cache")
+
+    def get_stats(self):
+        """Get hit/miss counters and the overall hit rate"""
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "entries": len(self._memory),
+                "disk_tier": bool(self.db_path),
+            }
@@ -0,0 +1,205 @@
+"""
+Local CPU inference backend for the medical assistant model
+Loads the model once per process into a warm pool of replicas; each replica
+serves one generation at a time, which bounds concurrency and CPU contention
+"""
+
+import os
+import queue
+import threading
+from typing import Dict, Iterator, Optional
+
+# "int8" quantizes a transformers model with torch dynamic quantization,
+# "onnx" exports it to ONNX Runtime; any other value disables local inference
+LOCAL_MODEL_BACKEND = os.getenv("LOCAL_MODEL_BACKEND", "").strip().lower()
+# Hub name or local directory; set HF_HUB_OFFLINE=1 to serve from a pre-downloaded copy
+LOCAL_MODEL_NAME = os.getenv("LOCAL_MODEL_NAME", "ibm-granite/granite-3.3-2b-instruct")
+LOCAL_MODEL_REPLICAS = int(os.getenv("LOCAL_MODEL_REPLICAS", "1"))
+LOCAL_MODEL_THREADS = int(os.getenv("LOCAL_MODEL_THREADS", str(max(1, (os.cpu_count() or 1) // LOCAL_MODEL_REPLICAS))))
+# How long a request waits for a free replica before giving up
+LOCAL_MODEL_WAIT_TIMEOUT = float(os.getenv("LOCAL_MODEL_WAIT_TIMEOUT", "10"))
+# Longest gap allowed between two streamed tokens
+LOCAL_MODEL_TOKEN_TIMEOUT = float(os.getenv("LOCAL_MODEL_TOKEN_TIMEOUT", "30"))
+
+LOCAL_BACKENDS = ("int8", "onnx")
+
+SYSTEM_PROMPT = (
+    "You are a careful medical information assistant. Give brief, general health "
+    "information, never a diagnosis, and tell the user to call emergency services "
+    "for anything that could be life-threatening."
+)
+
+DISABLED = "disabled"
+LOADING = "loading"
+READY = "ready"
+FAILED = "failed"
+
+
+class LocalModelError(Exception):
+    """Raised when the local model cannot serve a request"""
+
+
+class LocalModelBackend:
+    """Pool of identical CPU model replicas for one model"""
+
+    def __init__(self, backend=LOCAL_MODEL_BACKEND, model_name=LOCAL_MODEL_NAME,
+                 replicas=LOCAL_MODEL_REPLICAS, threads=LOCAL_MODEL_THREADS):
+        self.backend = backend
+        self.model_name = model_name
+        self.replicas = max(1, replicas)
+        self.threads = threads
+        self.state = LOADING if backend in LOCAL_BACKENDS else DISABLED
+        self.error = None
+        self.tokenizer = None
+        self._pool = queue.Queue()
+        self._loaded = 0
+        self._lock = threading.Lock()
+        self._started = False
+
+    def start(self):
+        """Load the replicas in the background so the first request finds them warm"""
+        with self._lock:
+            if self._started or self.state == DISABLED:
+                return
+            self._started = True
+        threading.Thread(target=self._load_all, name="local-model-loader", daemon=True).start()
+
+    def _load_all(self):
+        try:
+            from transformers import AutoTokenizer
+            self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+            for _ in range(self.replicas):
+                model = self._load_model()
+                self._warm_up(model)
+                with self._lock:
+                    self._loaded += 1
+                    self.state = READY
+                self._pool.put(model)
+        except Exception as e:  # ImportError for missing deps, OSError for a missing model
+            with self._lock:
+                self.error = f"{type(e).__name__}: {e}"
+                if not self._loaded:
+                    self.state = FAILED
+
+    def _load_model(self):
+        """Load one replica with the configured CPU backend"""
+        if self.backend == "onnx":
+            import onnxruntime
+            from optimum.onnxruntime import ORTModelForCausalLM
+            options = onnxruntime.SessionOptions()
+            options.intra_op_num_threads = self.threads
+            return ORTModelForCausalLM.from_pretrained(
+                self.model_name, export=True, session_options=options, provider="CPUExecutionProvider"
+            )
+
+        import torch
+        from transformers import AutoModelForCausalLM
+        torch.set_num_threads(self.threads)
+        model = AutoModelForCausalLM.from_pretrained(self.model_name, torch_dtype=torch.float32)
+        model.eval()
+        # Weights of every Linear layer become int8; activations are quantized on the fly
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    def _warm_up(self, model):
+        """Run one short generation so first-request latency excludes lazy initialization"""
+        inputs = self._encode("Hello")
+        model.generate(**inputs, max_new_tokens=4, do_sample=False)
+
+    def _encode(self, user_message):
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": user_message},
+        ]
+        prompt = self.tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+        return self.tokenizer(prompt, return_tensors="pt")
+
+    def is_available(self):
+        """Check whether a replica has loaded; while the model is still loading, callers use the remote API"""
+        return self.state == READY
+
+    def stream(self, user_message: str, parameters: Optional[Dict] = None) -> Iterator[str]:
+        """Yield generated text chunks for a user message.
+
+        Raises LocalModelError at once while the model is loading; once loaded,
+        waits up to LOCAL_MODEL_WAIT_TIMEOUT for a free replica and raises it
+        if none frees up or generation fails.
+        """
+        self.start()
+        if self.state == LOADING:
+            raise LocalModelError("Local model is still loading")
+        if not self.is_available():
+            raise LocalModelError(self.error or "Local model backend is disabled")
+        try:
+            model = self._pool.get(timeout=LOCAL_MODEL_WAIT_TIMEOUT)
+        except queue.Empty:
+            raise LocalModelError("Local model is busy or still loading")
+
+        from transformers import StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+
+        cancelled = threading.Event()
+
+        class StopWhenCancelled(StoppingCriteria):
+            def __call__(self, input_ids, scores, **kwargs):
+                return cancelled.is_set()
+
+        parameters = parameters or {}
+        temperature = parameters.get("temperature", 0.7)
+        streamer = TextIteratorStreamer(
+            self.tokenizer, skip_prompt=True, skip_special_tokens=True, timeout=LOCAL_MODEL_TOKEN_TIMEOUT
+        )
+        failure = []
+
+        def generate():
+            try:
+                model.generate(
+                    **self._encode(user_message),
+                    max_new_tokens=parameters.get("max_length", 200),
+                    do_sample=temperature > 0,
+                    temperature=temperature if temperature > 0 else None,
+                    streamer=streamer,
+                    stopping_criteria=StoppingCriteriaList([StopWhenCancelled()])
+                )
+            except Exception as e:
+                failure.append(e)
+                streamer.end()
+            finally:
+                # The replica goes back to the pool only once its generation has stopped
+                self._pool.put(model)
+
+        threading.Thread(target=generate, name="local-model-generate", daemon=True).start()
+        try:
+            for text in streamer:
+                if text:
+                    yield text
+        except queue.Empty:
+            raise LocalModelError("Local model stalled while generating")
+        finally:
+            cancelled.set()
+        if failure:
+            raise LocalModelError(f"Local generation failed: {failure[0]}")
+
+    def get_status(self) -> Dict:
+        """Get the load state and pool occupancy for status displays"""
+        with self._lock:
+            return {
+                "backend": self.backend or None,
+                "model": self.model_name,
+                "state": self.state,
+                "replicas_loaded": self._loaded,
+                "replicas_idle": self._pool.qsize(),
+                "error": self.error,
+            }
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_local_backend():
+    """Get the process-wide local model backend, starting its warm-up on first use"""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = LocalModelBackend()
+            _backend.start()
+        return _backend
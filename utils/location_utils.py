@@ -1,109 +1,189 @@
-import json
 import os
+import time
+import threading
 import requests
 from datetime import datetime
-import streamlit as st
+from sqlalchemy import func
+from utils.db import get_session, Facility
+from utils.facility_import import FACILITY_TYPES, facility_from_row, facility_to_row
+from utils.spatial_index import GeoGridIndex, haversine_miles
+from utils.facility_store import FacilityStore
+from utils.routing import rank_by_eta
+
+# Seconds between registry version checks; writes made in this process apply immediately
+FACILITY_REGISTRY_CHECK_INTERVAL = float(os.getenv("FACILITY_REGISTRY_CHECK_INTERVAL", "2"))
+
+class FacilityRegistrySnapshot:
+    """Loaded facilities with their spatial index and vectorized store; never modified once built"""
+    
+    def __init__(self, medical_facilities, version=None, facility_indexes=None):
+        self.medical_facilities = medical_facilities
+        self.version = version
+        # Indexes of types that did not change can be shared with the previous snapshot
+        self.facility_indexes = dict(facility_indexes or {})
+        for facility_type, facilities in medical_facilities.items():
+            if facility_type in self.facility_indexes:
+                continue
+            index = GeoGridIndex()
+            for facility in facilities:
+                coordinates = facility["coordinates"]
+                index.insert(facility["id"], coordinates["lat"], coordinates["lng"], facility)
+            self.facility_indexes[facility_type] = index
+        self.facility_store = FacilityStore(medical_facilities)
+
+class FacilityRegistry:
+    """Process-wide cache of the facilities table, reloaded only when the table's version changes"""
+    
+    def __init__(self, check_interval=FACILITY_REGISTRY_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+    
+    @staticmethod
+    def _table_version(db):
+        """Row count, newest id and newest update; any insert, update or delete changes it"""
+        return tuple(db.query(func.count(Facility.id), func.max(Facility.id), func.max(Facility.updated_at)).one())
+    
+    def get(self):
+        """Get the current snapshot, reloading it if the facilities table changed"""
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._checked_at < self.check_interval:
+            self.hits += 1
+            return snapshot
+        
+        with self._lock:
+            with get_session() as db:
+                version = self._table_version(db)
+                self._checked_at = time.monotonic()
+                if self._snapshot is not None and version == self._snapshot.version:
+                    self.hits += 1
+                    return self._snapshot
+                
+                self.misses += 1
+                if self._snapshot is not None:
+                    self.reloads += 1
+                medical_facilities = {facility_type: [] for facility_type in FACILITY_TYPES}
+                for row in db.query(*Facility.__table__.c).order_by(Facility.id).yield_per(10000):
+                    facility_type, facility = facility_from_row(row)
+                    medical_facilities.setdefault(facility_type, []).append(facility)
+            self._snapshot = FacilityRegistrySnapshot(medical_facilities, version)
+            return self._snapshot
+    
+    def invalidate(self):
+        """Force the next get() to check the table version, e.g. after a bulk load"""
+        self._checked_at = 0.0
+    
+    def upsert_facility(self, facility_type, facility):
+        """Add or replace a facility row and swap in a snapshot that includes it"""
+        self.get()
+        with self._lock:
+            with get_session() as db:
+                row = facility_to_row(facility_type, facility)
+                existing = db.query(Facility).filter(Facility.facility_id == facility["id"]).first()
+                if existing is None:
+                    db.add(Facility(**row))
+                else:
+                    for column, value in row.items():
+                        setattr(existing, column, value)
+                db.flush()
+                version = self._table_version(db)
+            self._swap(version, facility["id"], facility_type, facility)
+    
+    def remove_facility(self, facility_type, facility_id):
+        """Delete a facility row and swap in a snapshot without it"""
+        self.get()
+        with self._lock:
+            with get_session() as db:
+                deleted = db.query(Facility).filter(
+                    Facility.facility_id == facility_id, Facility.type == facility_type
+                ).delete(synchronize_session=False)
+                version = self._table_version(db)
+            if not deleted:
+                return False
+            self._swap(version, facility_id)
+            return True
+    
+    def _swap(self, version, facility_id, facility_type=None, facility=None):
+        """Replace the current snapshot with a copy that drops a facility and, if given, re-adds it.
+
+        Called under the lock, so the copy starts from the newest snapshot; readers
+        holding the old one keep a consistent view.
+        """
+        current = self._snapshot
+        medical_facilities = {}
+        changed = set()
+        for current_type, facilities in current.medical_facilities.items():
+            kept = [f for f in facilities if f["id"] != facility_id]
+            if len(kept) != len(facilities):
+                changed.add(current_type)
+            medical_facilities[current_type] = kept
+        if facility is not None:
+            medical_facilities[facility_type] = medical_facilities.get(facility_type, []) + [facility]
+            changed.add(facility_type)
+        
+        unchanged_indexes = {t: index for t, index in current.facility_indexes.items() if t not in changed}
+        self._snapshot = FacilityRegistrySnapshot(medical_facilities, version, unchanged_indexes)
+        self._checked_at = time.monotonic()
+    
+    def get_stats(self):
+        """Get cache hit/miss counters"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "reloads": self.reloads,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "facilities": len(self._snapshot.facility_store) if self._snapshot else 0
+        }
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_facility_registry():
+    """Get the process-wide facility registry"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = FacilityRegistry()
+        return _registry
 
 class LocationManager:
-    def __init__(self):
-        self.medical_facilities_file = "data/medical_facilities.json"
-        self.ensure_data_directory()
-        self.load_medical_facilities()
-    
-    def ensure_data_directory(self):
-        """Ensure data directory exists"""
-        os.makedirs("data", exist_ok=True)
-    
-    def load_medical_facilities(self):
-        """Load medical facilities data"""
-        try:
-            with open(self.medical_facilities_file, 'r') as f:
-                self.medical_facilities = json.load(f)
-        except FileNotFoundError:
-            # Default medical facilities data
-            self.medical_facilities = {
-                "hospitals": [
-                    {
-                        "id": "hosp_001",
-                        "name": "City General Hospital",
-                        "address": "123 Main St, Downtown",
-                        "phone": "+1-555-0123",
-                        "coordinates": {"lat": 40.7128, "lng": -74.0060},
-                        "emergency_room": True,
-                        "trauma_center": True,
-                        "specialties": ["Emergency Medicine", "Cardiology", "Neurology"],
-                        "rating": 4.5
-                    },
-                    {
-                        "id": "hosp_002",
-                        "name": "Regional Medical Center",
-                        "address": "456 Oak Ave, Midtown",
-                        "phone": "+1-555-0456",
-                        "coordinates": {"lat": 40.7580, "lng": -73.9855},
-                        "emergency_room": True,
-                        "trauma_center": False,
-                        "specialties": ["Emergency Medicine", "Orthopedics", "Pediatrics"],
-                        "rating": 4.2
-                    },
-                    {
-                        "id": "hosp_003",
-                        "name": "University Hospital",
-                        "address": "789 College Blvd, University District",
-                        "phone": "+1-555-0789",
-                        "coordinates": {"lat": 40.6892, "lng": -74.0445},
-                        "emergency_room": True,
-                        "trauma_center": True,
-                        "specialties": ["Emergency Medicine", "Surgery", "Oncology"],
-                        "rating": 4.7
-                    }
-                ],
-                "pharmacies": [
-                    {
-                        "id": "pharm_001",
-                        "name": "Downtown Pharmacy",
-                        "address": "100 Main St, Downtown",
-                        "phone": "+1-555-1000",
-                        "coordinates": {"lat": 40.7138, "lng": -74.0070},
-                        "hours": "24/7",
-                        "services": ["Prescription", "Over-the-counter", "Vaccinations"]
-                    },
-                    {
-                        "id": "pharm_002",
-                        "name": "MediMart Express",
-                        "address": "500 Oak Ave, Midtown",
-                        "phone": "+1-555-1001",
-                        "coordinates": {"lat": 40.7590, "lng": -73.9865},
-                        "hours": "6 AM - 12 AM",
-                        "services": ["Prescription", "Over-the-counter", "Health screenings"]
-                    }
-                ],
-                "urgent_care": [
-                    {
-                        "id": "urgent_001",
-                        "name": "QuickCare Clinic",
-                        "address": "200 Pine St, Westside",
-                        "phone": "+1-555-2000",
-                        "coordinates": {"lat": 40.7200, "lng": -74.0100},
-                        "hours": "8 AM - 10 PM",
-                        "wait_time": "15 minutes",
-                        "services": ["Minor injuries", "Illness", "X-rays"]
-                    }
-                ]
-            }
-            self.save_medical_facilities()
-    
-    def save_medical_facilities(self):
-        """Save medical facilities to JSON file"""
-        with open(self.medical_facilities_file, 'w') as f:
-            json.dump(self.medical_facilities, f, indent=2)
+    def __init__(self, state=None):
+        # Mapping that remembers the user's location, e.g. st.session_state; a plain dict when headless
+        self.state = state if state is not None else {}
+        self.registry = get_facility_registry()
+    
+    @property
+    def medical_facilities(self):
+        return self.registry.get().medical_facilities
+    
+    @property
+    def facility_indexes(self):
+        return self.registry.get().facility_indexes
+    
+    @property
+    def facility_store(self):
+        return self.registry.get().facility_store
+    
+    def upsert_facility(self, facility_type, facility):
+        """Add or replace a facility and update its index in place"""
+        self.registry.upsert_facility(facility_type, facility)
+    
+    def remove_facility(self, facility_type, facility_id):
+        """Remove a facility and drop it from its index"""
+        return self.registry.remove_facility(facility_type, facility_id)
     
     def get_current_location(self):
         """Get current user location"""
         # In a real application, this would use actual geolocation
-        # For now, return a mock location or use session state
+        # For now, return a mock location or the one remembered in state
         
-        if 'user_location' in st.session_state and st.session_state.user_location:
-            return st.session_state.user_location
+        if self.state.get('user_location'):
+            return self.state['user_location']
         
         # Mock location for demo purposes
         mock_location = {
@@ -114,7 +194,7 @@ class LocationManager:
             "timestamp": datetime.now().isoformat()
         }
         
-        st.session_state.user_location = mock_location
+        self.state['user_location'] = mock_location
         return mock_location
     
     def set_user_location(self, latitude, longitude):
@@ -130,7 +210,7 @@ class LocationManager:
         if address:
             location["address"] = address
         
-        st.session_state.user_location = location
+        self.state['user_location'] = location
         return location
     
     def reverse_geocode(self, lat, lng):
@@ -141,48 +221,99 @@ class LocationManager:
     
     def calculate_distance(self, lat1, lng1, lat2, lng2):
         """Calculate distance between two points using Haversine formula"""
-        import math
-        
-        R = 3959  # Earth's radius in miles
-        
-        lat1_rad = math.radians(lat1)
-        lat2_rad = math.radians(lat2)
-        delta_lat = math.radians(lat2 - lat1)
-        delta_lng = math.radians(lng2 - lng1)
-        
-        a = (math.sin(delta_lat / 2) ** 2 +
-             math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lng / 2) ** 2)
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-        
-        return R * c
+        return haversine_miles(lat1, lng1, lat2, lng2)
+    
+    @staticmethod
+    def _with_distance(matches):
+        """Copy indexed facilities and attach their rounded distance"""
+        results = []
+        for distance, _, facility in matches:
+            facility_with_distance = facility.copy()
+            facility_with_distance["distance"] = round(distance, 1)
+            results.append(facility_with_distance)
+        return results
     
-    def find_nearby_facilities(self, facility_type="hospitals", max_distance=10):
-        """Find nearby medical facilities"""
+    def find_nearby_facilities(self, facility_type="hospitals", max_distance=10, limit=None):
+        """Find nearby medical facilities, nearest first"""
         user_location = self.get_current_location()
         if not user_location:
             return []
         
-        user_lat = user_location["lat"]
-        user_lng = user_location["lng"]
-        
-        facilities = self.medical_facilities.get(facility_type, [])
-        nearby_facilities = []
-        
-        for facility in facilities:
-            facility_lat = facility["coordinates"]["lat"]
-            facility_lng = facility["coordinates"]["lng"]
-            
-            distance = self.calculate_distance(user_lat, user_lng, facility_lat, facility_lng)
-            
-            if distance <= max_distance:
-                facility_with_distance = facility.copy()
-                facility_with_distance["distance"] = round(distance, 1)
-                nearby_facilities.append(facility_with_distance)
-        
-        # Sort by distance
-        nearby_facilities.sort(key=lambda x: x["distance"])
+        index = self.facility_indexes.get(facility_type)
+        if index is None:
+            return []
         
-        return nearby_facilities
+        if limit is not None:
+            matches = index.nearest(user_location["lat"], user_location["lng"], k=limit, max_distance=max_distance)
+        else:
+            matches = index.within(user_location["lat"], user_location["lng"], max_distance)
+        return self._with_distance(matches)
+    
+    def find_nearest_facilities(self, facility_type="hospitals", count=1, location=None, max_distance=None, where=None):
+        """Find the `count` nearest facilities to a location (the user's by default), with no radius needed.
+
+        where is an optional predicate on the facility dict, applied inside the index search.
+        """
+        location = location or self.get_current_location()
+        index = self.facility_indexes.get(facility_type)
+        if not location or index is None:
+            return []
+        matches = index.nearest(location["lat"], location["lng"], k=count, max_distance=max_distance, where=where)
+        return self._with_distance(matches)
+    
+    def find_nearby_facilities_by_type(self, max_distance, location=None):
+        """Find nearby facilities of several types in one vectorized pass.
+
+        max_distance is a radius for all types or a {facility_type: radius} dict.
+        """
+        location = location or self.get_current_location()
+        if not location:
+            return {}
+        return self.facility_store.nearby_by_type(location["lat"], location["lng"], max_distance)
+    
+    def find_nearest_facilities_batch(self, locations, count=1, facility_type=None, max_distance=None):
+        """Find the nearest facilities for many (lat, lng) locations at once, e.g. for dispatch planning"""
+        store = self.facility_store
+        indices, distances = store.nearest_batch(locations, count, facility_type, max_distance)
+        results = []
+        for row_indices, row_distances in zip(indices, distances):
+            matches = []
+            for i, distance in zip(row_indices, row_distances):
+                if i < 0:
+                    continue
+                facility = store.facilities[i].copy()
+                facility["distance"] = round(float(distance), 1)
+                matches.append(facility)
+            results.append(matches)
+        return results
+    
+    def find_capable_facilities(self, required=(), facility_type="hospitals", max_distance=20, open_now=False,
+                                location=None, limit=None):
+        """Find facilities with every required capability (ER, trauma, specialties), nearest first.
+
+        e.g. find_capable_facilities(["trauma_center", "Neurology"], max_distance=20, open_now=True)
+        """
+        location = location or self.get_current_location()
+        if not location:
+            return []
+        store = self.facility_store
+        matches = store.find_capable(
+            location["lat"], location["lng"], required, facility_type, max_distance,
+            open_at=datetime.now() if open_now else None, limit=limit
+        )
+        results = []
+        for i, distance in matches:
+            facility = store.facilities[i].copy()
+            facility["distance"] = round(distance, 1)
+            results.append(facility)
+        return results
+    
+    def rank_facilities_by_eta(self, facilities, location=None):
+        """Re-rank facilities by estimated drive time plus reported ER wait (see utils.routing)"""
+        location = location or self.get_current_location()
+        if not location or not facilities:
+            return facilities
+        return rank_by_eta(location, facilities)
     
     def get_directions_url(self, destination_address):
         """Get Google Maps directions URL"""
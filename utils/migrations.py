@@ -0,0 +1,294 @@
+"""
+Schema migrations and query-plan checks for the HealthAssist database
+Each migration runs once, in order, and is recorded in schema_migrations
+"""
+
+import sys
+from datetime import datetime
+from sqlalchemy import inspect
+from utils.db import engine, get_session, SchemaMigration, HealthRecord, PatientHealthSummary
+
+
+def _create_health_record_indexes(connection):
+    """Add the composite time-series indexes on health_records"""
+    for index in HealthRecord.__table__.indexes:
+        if index.name.startswith("ix_health_records_patient_"):
+            index.create(connection, checkfirst=True)
+
+
+def _backfill_health_summaries(connection):
+    """Create and populate patient_health_summary from existing records"""
+    from sqlalchemy.orm import Session
+    from utils.health_data import HealthDataManager
+
+    PatientHealthSummary.__table__.create(connection, checkfirst=True)
+    db = Session(bind=connection)
+    HealthDataManager().rebuild_health_summaries(db=db)
+    db.flush()
+
+
+def _add_typed_vital_columns(connection):
+    """Move JSON payloads to native JSON columns and add typed vitals columns"""
+    from utils.health_data import VITAL_SIGN_FIELDS
+
+    dialect = connection.dialect.name
+    existing = {column["name"] for column in inspect(connection).get_columns("health_records")}
+
+    for field in VITAL_SIGN_FIELDS:
+        if field not in existing:
+            connection.exec_driver_sql(f"ALTER TABLE health_records ADD COLUMN {field} FLOAT")
+
+    if dialect == "postgresql":
+        # SQLite stores JSON as text already; PostgreSQL needs a real type change
+        for table, columns in (
+            ("patients", ("data",)),
+            ("health_records", ("data",)),
+            ("patient_health_summary", ("last_vitals", "recent_vitals", "recent_symptoms")),
+        ):
+            for column in columns:
+                connection.exec_driver_sql(
+                    f"ALTER TABLE {table} ALTER COLUMN {column} TYPE JSON USING {column}::json"
+                )
+        extract = "(data->>'{field}')::float"
+    else:
+        extract = "CAST(json_extract(data, '$.{field}') AS REAL)"
+
+    # Backfill from the payload; only numeric values are copied
+    for field in VITAL_SIGN_FIELDS:
+        value = extract.format(field=field)
+        if dialect == "postgresql":
+            guard = f"json_typeof(data->'{field}') = 'number'"
+        else:
+            guard = f"json_type(data, '$.{field}') IN ('integer', 'real')"
+        connection.exec_driver_sql(
+            f"UPDATE health_records SET {field} = {value} "
+            f"WHERE record_type = 'vital_signs' AND {guard}"
+        )
+
+    for index in HealthRecord.__table__.indexes:
+        if index.name == "ix_health_records_type_time":
+            index.create(connection, checkfirst=True)
+
+
+def _import_notification_log(connection):
+    """Copy the legacy data/notifications.json log into the notifications table"""
+    import os
+    import json
+    from utils.db import Notification
+
+    Notification.__table__.create(connection, checkfirst=True)
+    legacy_file = "data/notifications.json"
+    if not os.path.exists(legacy_file):
+        return
+    with open(legacy_file, "r") as f:
+        try:
+            entries = json.load(f)
+        except ValueError:
+            entries = []
+
+    def parse_time(value):
+        return datetime.fromisoformat(value) if value else None
+
+    rows = []
+    for entry in entries:
+        rows.append({
+            "type": entry.get("type", "SYSTEM"),
+            "user": entry.get("user", "system"),
+            "recipient": entry.get("recipient"),
+            "message": entry.get("message", ""),
+            "status": entry.get("status", "unknown"),
+            "details": entry.get("details", ""),
+            "reminder_type": entry.get("reminder_type"),
+            "schedule_time": parse_time(entry.get("schedule_time")),
+            "timestamp": parse_time(entry.get("timestamp") or entry.get("created_at")) or datetime.utcnow(),
+            "read": bool(entry.get("read", False)),
+            "read_at": parse_time(entry.get("read_at"))
+        })
+    if rows:
+        connection.execute(Notification.__table__.insert(), rows)
+
+
+def _index_notifications(connection):
+    """Add notification feed indexes and backfill per-user unread counters"""
+    from sqlalchemy import func, select
+    from utils.db import Notification, NotificationCounter
+
+    for index in Notification.__table__.indexes:
+        index.create(connection, checkfirst=True)
+    NotificationCounter.__table__.create(connection, checkfirst=True)
+
+    notifications = Notification.__table__
+    unread = connection.execute(
+        select(notifications.c.user, func.count())
+        .where(notifications.c.read.is_(False))
+        .group_by(notifications.c.user)
+    ).all()
+    connection.execute(NotificationCounter.__table__.delete())
+    if unread:
+        connection.execute(
+            NotificationCounter.__table__.insert(),
+            [{"user": user, "unread": count} for user, count in unread]
+        )
+
+
+def _create_facility_registry(connection):
+    """Create the facilities table and seed it from data/medical_facilities.json"""
+    import os
+    import json
+    from sqlalchemy import func, select
+    from utils.db import Facility
+    from utils.facility_import import DEFAULT_MEDICAL_FACILITIES, facility_to_row
+
+    Facility.__table__.create(connection, checkfirst=True)
+    for index in Facility.__table__.indexes:
+        index.create(connection, checkfirst=True)
+    if connection.execute(select(func.count()).select_from(Facility.__table__)).scalar():
+        return
+
+    legacy_file = "data/medical_facilities.json"
+    medical_facilities = DEFAULT_MEDICAL_FACILITIES
+    if os.path.exists(legacy_file):
+        with open(legacy_file, "r") as f:
+            try:
+                medical_facilities = json.load(f)
+            except ValueError:
+                pass
+
+    rows = [
+        facility_to_row(facility_type, facility)
+        for facility_type, facilities in medical_facilities.items()
+        for facility in facilities
+    ]
+    if rows:
+        connection.execute(Facility.__table__.insert(), rows)
+
+
+def _create_emergency_outbox(connection):
+    """Create the emergency outbox and its per-recipient delivery table"""
+    from utils.db import OutboxEvent, OutboxDelivery
+
+    for model in (OutboxEvent, OutboxDelivery):
+        model.__table__.create(connection, checkfirst=True)
+        for index in model.__table__.indexes:
+            index.create(connection, checkfirst=True)
+
+
+# (version, description, upgrade function) in application order
+MIGRATIONS = [
+    (1, "composite time-series indexes on health_records", _create_health_record_indexes),
+    (2, "materialized patient_health_summary", _backfill_health_summaries),
+    (3, "native JSON payloads and typed vital sign columns", _add_typed_vital_columns),
+    (4, "notifications table replacing data/notifications.json", _import_notification_log),
+    (5, "notification feed indexes and unread counters", _index_notifications),
+    (6, "facilities table seeded from data/medical_facilities.json", _create_facility_registry),
+    (7, "emergency outbox for durable contact alerts", _create_emergency_outbox),
+]
+
+
+def get_applied_versions():
+    """Get the set of migration versions already applied"""
+    if not inspect(engine).has_table(SchemaMigration.__tablename__):
+        return set()
+    with get_session() as db:
+        return {row.version for row in db.query(SchemaMigration.version).all()}
+
+
+def run_migrations():
+    """Apply all pending migrations, each in its own transaction"""
+    SchemaMigration.__table__.create(engine, checkfirst=True)
+    applied = get_applied_versions()
+    newly_applied = []
+
+    for version, description, upgrade in MIGRATIONS:
+        if version in applied:
+            continue
+        with engine.begin() as connection:
+            upgrade(connection)
+            connection.execute(
+                SchemaMigration.__table__.insert().values(
+                    version=version,
+                    description=description,
+                    applied_at=datetime.utcnow()
+                )
+            )
+        newly_applied.append(version)
+
+    return newly_applied
+
+
+def get_hot_queries():
+    """Get the SQL for the health record queries that must stay index-backed"""
+    from utils.health_data import HealthDataManager
+
+    with get_session() as db:
+        build = HealthDataManager.build_records_query
+        queries = {
+            "get_vital_signs": (build(db, 1, "vital_signs", 30), "ix_health_records_patient_type_time"),
+            "get_symptoms_history": (build(db, 1, "symptoms", 30), "ix_health_records_patient_type_time"),
+            "get_last_visit": (build(db, 1, limit=1), "ix_health_records_patient_time"),
+        }
+        return {
+            name: (str(query.statement.compile(engine, compile_kwargs={"literal_binds": True})), index_name)
+            for name, (query, index_name) in queries.items()
+        }
+
+
+def explain(sql):
+    """Return the query plan for a statement as a list of text lines"""
+    with engine.connect() as connection:
+        if engine.dialect.name == "sqlite":
+            rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+            return [row[-1] for row in rows]
+        # Tiny tables make a sequential scan look cheapest; ask only whether the index is usable
+        connection.exec_driver_sql("SET enable_seqscan = off")
+        rows = connection.exec_driver_sql(f"EXPLAIN {sql}").fetchall()
+        return [row[0] for row in rows]
+
+
+def check_query_plans():
+    """Check that every hot query uses its index and needs no separate sort.
+
+    Returns a dict of query name to a list of problems; an empty list means
+    the plan is fine.
+    """
+    results = {}
+    for name, (sql, index_name) in get_hot_queries().items():
+        plan = explain(sql)
+        plan_text = "\n".join(plan)
+        problems = []
+        if index_name not in plan_text:
+            problems.append(f"does not use {index_name}")
+        if "TEMP B-TREE" in plan_text or "Sort" in plan_text:
+            problems.append("requires a separate sort step")
+        results[name] = problems
+    return results
+
+
+def verify_query_plans():
+    """Raise RuntimeError if any hot query has regressed to a scan or sort"""
+    failures = {name: problems for name, problems in check_query_plans().items() if problems}
+    if failures:
+        details = "; ".join(f"{name}: {', '.join(problems)}" for name, problems in failures.items())
+        raise RuntimeError(f"Query plan regression detected - {details}")
+
+
+if __name__ == "__main__":
+    from utils.db import init_db
+
+    init_db()
+    if "--check-plans" in sys.argv:
+        verify_query_plans()
+        print("All hot health record queries are index-backed.")
+    elif "--rebuild-summaries" in sys.argv:
+        from utils.health_data import HealthDataManager
+        rebuilt = HealthDataManager().rebuild_health_summaries()
+        print(f"Rebuilt health summaries for {rebuilt} patients.")
+    elif "--check-summaries" in sys.argv:
+        from utils.health_data import HealthDataManager
+        mismatches = HealthDataManager().check_health_summaries()
+        for mismatch in mismatches:
+            print(f"{mismatch['patient_id']}: {mismatch['field']} materialized={mismatch['materialized']} recomputed={mismatch['recomputed']}")
+        print(f"{len(mismatches)} inconsistent summary fields found.")
+        sys.exit(1 if mismatches else 0)
+    else:
+        print("Migrations applied.")
@@ -1,99 +1,117 @@
-import os
-import json
 from datetime import datetime
-import streamlit as st
+from sqlalchemy import or_, and_, func
+from sqlalchemy.exc import IntegrityError
+from utils.db import get_session, Notification, NotificationCounter
+from utils.alert_dispatch import AlertDispatcher, DeliveryResult
 
 class NotificationManager:
-    def __init__(self):
-        self.notifications_file = "data/notifications.json"
-        self.ensure_data_directory()
-        self.load_notifications()
+    """Sends notifications and keeps their log in the notifications table.
+
+    Each log entry is a single-row INSERT, so logging cost does not grow with
+    history and concurrent sessions or processes never overwrite each other.
+    Nothing here touches Streamlit: entries are attributed to the user passed
+    in, falling back to the manager's user, then "system".
+    """
     
-    def ensure_data_directory(self):
-        """Ensure data directory exists"""
-        os.makedirs("data", exist_ok=True)
+    def __init__(self, user=None):
+        self.user = user
     
-    def load_notifications(self):
-        """Load notifications from JSON file"""
-        try:
-            with open(self.notifications_file, 'r') as f:
-                self.notifications = json.load(f)
-        except FileNotFoundError:
-            self.notifications = []
-            self.save_notifications()
-    
-    def save_notifications(self):
-        """Save notifications to JSON file"""
-        with open(self.notifications_file, 'w') as f:
-            json.dump(self.notifications, f, indent=2)
-    
-    def send_sms(self, phone_number, message):
-        """Send SMS notification using Twilio"""
+    @staticmethod
+    def _to_dict(notification):
+        """Convert a Notification row to the dict shape the pages expect"""
+        record = {
+            "id": notification.id,
+            "type": notification.type,
+            "recipient": notification.recipient,
+            "message": notification.message,
+            "status": notification.status,
+            "details": notification.details,
+            "timestamp": notification.timestamp.isoformat(),
+            "user": notification.user,
+            "read": notification.read
+        }
+        if notification.read_at:
+            record["read_at"] = notification.read_at.isoformat()
+        if notification.reminder_type:
+            record["reminder_type"] = notification.reminder_type
+            record["schedule_time"] = notification.schedule_time.isoformat() if notification.schedule_time else None
+        return record
+    
+    @staticmethod
+    def _adjust_unread(db, user, delta):
+        """Adjust a user's maintained unread counter inside the caller's transaction"""
+        updated = (
+            db.query(NotificationCounter)
+            .filter(NotificationCounter.user == user)
+            .update({NotificationCounter.unread: NotificationCounter.unread + delta}, synchronize_session=False)
+        )
+        if updated:
+            return
         try:
-            # Import Twilio client
-            from twilio.rest import Client
-            
-            # Get Twilio credentials from environment
-            account_sid = os.getenv("TWILIO_ACCOUNT_SID")
-            auth_token = os.getenv("TWILIO_AUTH_TOKEN")
-            twilio_phone = os.getenv("TWILIO_PHONE_NUMBER")
-            
-            if not all([account_sid, auth_token, twilio_phone]):
-                # Log the attempt but don't fail
-                self.log_notification("SMS", phone_number, message, "failed", "Twilio credentials not configured")
-                st.warning("SMS notifications not configured. Check Twilio credentials.")
-                return False
-            
-            # Initialize Twilio client
-            client = Client(account_sid, auth_token)
-            
-            # Send SMS
-            message_obj = client.messages.create(
-                body=message,
-                from_=twilio_phone,
-                to=phone_number
+            with db.begin_nested():
+                db.add(NotificationCounter(user=user, unread=max(0, delta)))
+        except IntegrityError:
+            # Another writer created the row first
+            db.query(NotificationCounter).filter(NotificationCounter.user == user).update(
+                {NotificationCounter.unread: NotificationCounter.unread + delta}, synchronize_session=False
             )
-            
-            # Log successful notification
-            self.log_notification("SMS", phone_number, message, "sent", f"SID: {message_obj.sid}")
-            return True
-            
-        except Exception as e:
-            # Log failed notification
-            self.log_notification("SMS", phone_number, message, "failed", str(e))
-            st.error(f"Failed to send SMS: {str(e)}")
-            return False
     
-    def send_email(self, email_address, subject, message):
+    def send_sms(self, phone_number, message, user=None):
+        """Send SMS notification using Twilio"""
+        return self.send_sms_delivery(phone_number, message, user).success
+    
+    def send_sms_delivery(self, phone_number, message, user=None):
+        """Send one SMS and return its DeliveryResult, whose error says why a send failed"""
+        dispatcher = AlertDispatcher()
+        if dispatcher.client is None:
+            # Log the attempt but don't fail
+            error = "SMS notifications not configured. Check Twilio credentials."
+            self.log_notification("SMS", phone_number, message, "failed", "Twilio credentials not configured", user)
+            return DeliveryResult(contact=phone_number, method="SMS", destination=phone_number, success=False,
+                                  error=error, retryable=False)
+        
+        delivery = dispatcher.dispatch([(phone_number, phone_number, message)]).deliveries[0]
+        self.log_delivery(delivery, message, user)
+        return delivery
+    
+    def log_delivery(self, delivery, message, user=None):
+        """Log one dispatched SMS with its attempt count and latency"""
+        if delivery.success:
+            details = f"SID: {delivery.sid} ({delivery.attempts} attempt(s), {delivery.latency_ms:.0f} ms)"
+            status = "sent"
+        else:
+            details = f"{delivery.error} ({delivery.attempts} attempt(s), {delivery.latency_ms:.0f} ms)"
+            status = "failed"
+        return self.log_notification("SMS", delivery.destination, message, status, details, user)
+    
+    def send_email(self, email_address, subject, message, user=None):
         """Send email notification"""
         # This would integrate with an email service like SendGrid, AWS SES, etc.
         # For now, just log the attempt
-        self.log_notification("EMAIL", email_address, f"{subject}: {message}", "simulated", "Email service not configured")
-        st.info(f"Email notification logged for {email_address}")
+        self.log_notification("EMAIL", email_address, f"{subject}: {message}", "simulated", "Email service not configured", user)
         return True
     
-    def log_notification(self, notification_type, recipient, message, status, details=""):
+    def log_notification(self, notification_type, recipient, message, status, details="", user=None):
         """Log notification attempt"""
-        notification_record = {
-            "id": len(self.notifications),
-            "type": notification_type,
-            "recipient": recipient,
-            "message": message,
-            "status": status,
-            "details": details,
-            "timestamp": datetime.now().isoformat(),
-            "user": st.session_state.get("username", "system")
-        }
-        
-        self.notifications.append(notification_record)
-        self.save_notifications()
-        
-        return notification_record["id"]
+        with get_session() as db:
+            notification = Notification(
+                type=notification_type,
+                recipient=recipient,
+                message=message,
+                status=status,
+                details=details,
+                timestamp=datetime.now(),
+                user=user or self.user or "system"
+            )
+            db.add(notification)
+            db.flush()
+            self._adjust_unread(db, notification.user, 1)
+            return notification.id
     
-    def create_emergency_notification(self, emergency_type, location_data, severity="high"):
+    def create_emergency_notification(self, emergency_type, location_data, severity="high", user=None):
         """Create standardized emergency notification"""
         timestamp = datetime.now().strftime("%I:%M %p on %B %d, %Y")
-        user = st.session_state.get("username", "Emergency User")
+        user = user or self.user or "Emergency User"
         
         message = f"🚨 EMERGENCY ALERT\n\n"
         message += f"User: {user}\n"
@@ -112,84 +130,151 @@ class NotificationManager:
         
         return message
     
-    def send_emergency_alert(self, contacts, emergency_type, location_data, severity="high"):
-        """Send emergency alert to multiple contacts"""
-        message = self.create_emergency_notification(emergency_type, location_data, severity)
-        results = []
+    def dispatch_sms(self, messages, user=None):
+        """Send (contact name, phone, message) SMS in parallel and log every outcome.
+
+        Network calls run on worker threads; logging happens here on the calling
+        thread, in one transaction, once all recipients have an outcome.
+        """
+        result = AlertDispatcher().dispatch(messages)
+        with get_session():
+            for delivery, (_, _, message) in zip(result.deliveries, messages):
+                self.log_delivery(delivery, message, user)
+        return result
+    
+    def dispatch_emergency_alert(self, contacts, emergency_type, location_data, severity="high", user=None):
+        """Send an emergency alert to multiple contacts and return an AlertDispatchResult"""
+        message = self.create_emergency_notification(emergency_type, location_data, severity, user)
+        sms = [(contact["name"], contact["phone"], message) for contact in contacts if "phone" in contact]
+        result = self.dispatch_sms(sms, user)
         
         for contact in contacts:
-            if "phone" in contact:
-                success = self.send_sms(contact["phone"], message)
-                results.append({
-                    "contact": contact["name"],
-                    "method": "SMS",
-                    "phone": contact["phone"],
-                    "success": success
-                })
-            
             if "email" in contact:
                 subject = f"🚨 EMERGENCY ALERT - {emergency_type}"
-                success = self.send_email(contact["email"], subject, message)
-                results.append({
-                    "contact": contact["name"],
-                    "method": "EMAIL",
-                    "email": contact["email"],
-                    "success": success
-                })
+                success = self.send_email(contact["email"], subject, message, user)
+                result.deliveries.append(
+                    DeliveryResult(contact=contact["name"], method="EMAIL", destination=contact["email"], success=success)
+                )
         
-        return results
+        return result
+    
+    def send_emergency_alert(self, contacts, emergency_type, location_data, severity="high", user=None):
+        """Send emergency alert to multiple contacts"""
+        return self.dispatch_emergency_alert(contacts, emergency_type, location_data, severity, user).to_list()
     
-    def get_notifications(self, user=None, notification_type=None, limit=50):
+    def get_notifications(self, user=None, notification_type=None, limit=50, since=None, until=None,
+                          unread_only=False, before=None):
         """Get notifications with optional filtering"""
-        notifications = self.notifications.copy()
-        
-        # Filter by user
-        if user:
-            notifications = [n for n in notifications if n.get("user") == user]
-        
-        # Filter by type
-        if notification_type:
-            notifications = [n for n in notifications if n.get("type") == notification_type]
-        
-        # Sort by timestamp (newest first)
-        notifications.sort(key=lambda x: x["timestamp"], reverse=True)
-        
-        # Limit results
-        if limit:
-            notifications = notifications[:limit]
+        return self.get_notifications_page(
+            user=user,
+            notification_type=notification_type,
+            limit=limit,
+            since=since,
+            until=until,
+            unread_only=unread_only,
+            before=before
+        )["notifications"]
+    
+    def get_notifications_page(self, user=None, notification_type=None, limit=50, since=None, until=None,
+                               unread_only=False, before=None):
+        """Get one newest-first page of notifications plus the cursor for the next page.
+
+        All filters are applied in SQL before the limit, and paging is keyset
+        based: pass the returned next_cursor as before= to continue. With a
+        user filter the (user[, type], timestamp, id) indexes serve the query,
+        so the cost depends on the page size, not on the length of the history.
+        """
+        with get_session() as db:
+            query = db.query(Notification)
+            
+            # Filter by user
+            if user:
+                query = query.filter(Notification.user == user)
+            
+            # Filter by type
+            if notification_type:
+                query = query.filter(Notification.type == notification_type)
+            
+            # Filter by date range
+            if since:
+                query = query.filter(Notification.timestamp >= since)
+            if until:
+                query = query.filter(Notification.timestamp < until)
+            
+            if unread_only:
+                query = query.filter(Notification.read.is_(False))
+            
+            # Continue after the last row of the previous page
+            if before:
+                before_time, before_id = datetime.fromisoformat(before[0]), before[1]
+                query = query.filter(or_(
+                    Notification.timestamp < before_time,
+                    and_(Notification.timestamp == before_time, Notification.id < before_id)
+                ))
+            
+            # Sort by timestamp (newest first)
+            query = query.order_by(Notification.timestamp.desc(), Notification.id.desc())
+            
+            # Fetch one extra row to know whether another page exists
+            rows = query.limit(limit + 1).all() if limit else query.all()
+            has_more = bool(limit) and len(rows) > limit
+            if has_more:
+                rows = rows[:limit]
+            notifications = [self._to_dict(n) for n in rows]
         
-        return notifications
+        next_cursor = None
+        if has_more:
+            last = notifications[-1]
+            next_cursor = (last["timestamp"], last["id"])
+        return {"notifications": notifications, "next_cursor": next_cursor}
     
     def mark_notification_read(self, notification_id):
         """Mark notification as read"""
-        for notification in self.notifications:
-            if notification["id"] == notification_id:
-                notification["read"] = True
-                notification["read_at"] = datetime.now().isoformat()
-                self.save_notifications()
+        with get_session() as db:
+            notification = db.get(Notification, notification_id)
+            if notification:
+                if not notification.read:
+                    notification.read = True
+                    notification.read_at = datetime.now()
+                    self._adjust_unread(db, notification.user, -1)
                 return True
         return False
     
+    def mark_all_read(self, user, notification_ids=None):
+        """Mark a user's unread notifications (or just the given ones) as read in one statement"""
+        with get_session() as db:
+            query = db.query(Notification).filter(Notification.user == user, Notification.read.is_(False))
+            if notification_ids is not None:
+                query = query.filter(Notification.id.in_(notification_ids))
+            updated = query.update({Notification.read: True, Notification.read_at: datetime.now()}, synchronize_session=False)
+            if updated:
+                self._adjust_unread(db, user, -updated)
+            return updated
+    
     def get_unread_count(self, user=None):
         """Get count of unread notifications"""
-        notifications = self.get_notifications(user=user)
-        unread = [n for n in notifications if not n.get("read", False)]
-        return len(unread)
+        with get_session() as db:
+            if user:
+                counter = db.get(NotificationCounter, user)
+                return counter.unread if counter else 0
+            return db.query(func.coalesce(func.sum(NotificationCounter.unread), 0)).scalar()
     
     def create_health_reminder(self, user, reminder_type, message, schedule_time=None):
         """Create health reminder notification"""
-        reminder = {
-            "id": len(self.notifications),
-            "type": "HEALTH_REMINDER",
-            "user": user,
-            "reminder_type": reminder_type,
-            "message": message,
-            "schedule_time": schedule_time or datetime.now().isoformat(),
-            "status": "scheduled",
-            "created_at": datetime.now().isoformat()
-        }
+        if isinstance(schedule_time, str):
+            schedule_time = datetime.fromisoformat(schedule_time)
         
-        self.notifications.append(reminder)
-        self.save_notifications()
-        
-        return reminder["id"]
+        with get_session() as db:
+            reminder = Notification(
+                type="HEALTH_REMINDER",
+                user=user,
+                reminder_type=reminder_type,
+                message=message,
+                schedule_time=schedule_time or datetime.now(),
+                status="scheduled",
+                timestamp=datetime.now()
+            )
+            db.add(reminder)
+            db.flush()
+            self._adjust_unread(db, user, 1)
+            return reminder.id
@@ -0,0 +1,367 @@
+"""
+Offline drive-time estimation over a local road graph
+The graph is built from an OpenStreetMap extract once (see build_graph_from_osm)
+and loaded from disk, so routing never touches the network
+"""
+
+import os
+import re
+import sys
+import json
+import heapq
+import threading
+from collections import OrderedDict
+from utils.spatial_index import GeoGridIndex, haversine_miles
+
+ROAD_GRAPH_FILE = os.getenv("ROAD_GRAPH_FILE", "data/road_graph.json")
+ROUTING_TREE_CACHE_SIZE = int(os.getenv("ROUTING_TREE_CACHE_SIZE", "64"))
+# Searches never settle nodes past this drive time
+ROUTING_MAX_SECONDS = float(os.getenv("ROUTING_MAX_SECONDS", "5400"))
+
+# Speed for the straight-line legs between a location and its nearest road node,
+# and for the whole trip when no road graph is installed
+ACCESS_SPEED_MPH = 15.0
+FALLBACK_SPEED_MPH = 30.0
+# Locations farther than this from any road node are treated as off the graph
+MAX_SNAP_MILES = float(os.getenv("ROUTING_MAX_SNAP_MILES", "2"))
+METERS_PER_MILE = 1609.344
+
+# Default speeds (km/h) for OSM highway classes without a maxspeed tag
+HIGHWAY_SPEEDS_KPH = {
+    "motorway": 100, "motorway_link": 60,
+    "trunk": 80, "trunk_link": 50,
+    "primary": 60, "primary_link": 45,
+    "secondary": 50, "secondary_link": 40,
+    "tertiary": 40, "tertiary_link": 35,
+    "unclassified": 30, "residential": 25, "living_street": 10, "service": 15,
+}
+
+
+class ShortestPathSearch:
+    """Dijkstra search from one origin that settles nodes only as far as callers need.
+
+    A later call for farther targets resumes from the saved frontier instead
+    of starting over; settled distances are final.
+    """
+
+    def __init__(self, adjacency, origin, max_seconds):
+        self.adjacency = adjacency
+        self.max_seconds = max_seconds
+        self.settled = {}
+        self._best = {origin: 0.0}
+        self._heap = [(0.0, origin)]
+        self.lock = threading.Lock()
+
+    def settle(self, targets=None):
+        """Run until every target is settled or out of reach; with no targets, run to max_seconds.
+
+        Returns the settled {node: seconds}. Call with `lock` held.
+        """
+        remaining = None if targets is None else {node for node in targets if node not in self.settled}
+        heap, best, settled = self._heap, self._best, self.settled
+        while heap and (remaining is None or remaining):
+            seconds, node = heapq.heappop(heap)
+            if node in settled:
+                continue
+            settled[node] = seconds
+            if remaining:
+                remaining.discard(node)
+            for neighbor, cost in self.adjacency[node]:
+                candidate = seconds + cost
+                if candidate <= self.max_seconds and neighbor not in settled and candidate < best.get(neighbor, float("inf")):
+                    best[neighbor] = candidate
+                    heapq.heappush(heap, (candidate, neighbor))
+        if not heap:
+            # Tentative labels are only needed to resume
+            self._best = {}
+        return settled
+
+
+class RoadGraph:
+    """Directed road graph with per-edge travel times in seconds"""
+
+    def __init__(self, nodes, edges):
+        """nodes: iterable of (node_id, lat, lng); edges: iterable of (from_id, to_id, meters, speed_kph, oneway)"""
+        self.node_ids = []
+        self.coordinates = []
+        position = {}
+        for node_id, lat, lng in nodes:
+            position[node_id] = len(self.node_ids)
+            self.node_ids.append(node_id)
+            self.coordinates.append((lat, lng))
+
+        self.adjacency = [[] for _ in self.node_ids]
+        self.max_speed_mps = 1.0
+        for from_id, to_id, meters, speed_kph, oneway in edges:
+            if from_id not in position or to_id not in position or speed_kph <= 0:
+                continue
+            speed_mps = speed_kph / 3.6
+            self.max_speed_mps = max(self.max_speed_mps, speed_mps)
+            seconds = meters / speed_mps
+            a, b = position[from_id], position[to_id]
+            self.adjacency[a].append((b, seconds))
+            if not oneway:
+                self.adjacency[b].append((a, seconds))
+
+        self.node_index = GeoGridIndex(cell_size=0.02)
+        for i, (lat, lng) in enumerate(self.coordinates):
+            if self.adjacency[i]:
+                self.node_index.insert(i, lat, lng)
+
+        self._trees = OrderedDict()
+        self._lock = threading.Lock()
+        self.tree_hits = 0
+        self.tree_misses = 0
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    @classmethod
+    def load(cls, path):
+        """Load a graph written by build_graph_from_osm"""
+        with open(path, "r") as f:
+            data = json.load(f)
+        return cls(
+            (tuple(node) for node in data["nodes"]),
+            ((edge[0], edge[1], edge[2], edge[3], bool(edge[4]) if len(edge) > 4 else False) for edge in data["edges"])
+        )
+
+    def snap(self, lat, lng, max_miles=MAX_SNAP_MILES):
+        """Get (node, miles) for the road node nearest to a location, or (None, None) if none is within max_miles"""
+        match = self.node_index.nearest(lat, lng, k=1, max_distance=max_miles)
+        if not match:
+            return None, None
+        distance, node, _ = match[0]
+        return node, distance
+
+    def _search(self, origin, max_seconds):
+        """Get the cached, resumable search from an origin"""
+        key = (origin, max_seconds)
+        with self._lock:
+            search = self._trees.get(key)
+            if search is not None:
+                self._trees.move_to_end(key)
+                self.tree_hits += 1
+                return search
+            self.tree_misses += 1
+            search = ShortestPathSearch(self.adjacency, origin, max_seconds)
+            self._trees[key] = search
+            while len(self._trees) > ROUTING_TREE_CACHE_SIZE:
+                self._trees.popitem(last=False)
+        return search
+
+    def travel_seconds(self, origin, targets, max_seconds=ROUTING_MAX_SECONDS):
+        """Get {node: seconds} from origin for the targets reachable within max_seconds.
+
+        The search stops as soon as every target is settled, so ranking a few
+        nearby candidates explores only the area up to the farthest of them.
+        """
+        search = self._search(origin, max_seconds)
+        with search.lock:
+            settled = search.settle(targets)
+            return {node: settled[node] for node in targets if node in settled}
+
+    def shortest_path_tree(self, origin, max_seconds=ROUTING_MAX_SECONDS):
+        """Get {node: seconds} for every node within max_seconds of origin. Cached per origin."""
+        search = self._search(origin, max_seconds)
+        with search.lock:
+            # A finished search is never modified again, so its dict can be shared
+            return search.settle()
+
+    def route(self, origin, destination):
+        """A* between two nodes; returns (seconds, [node, ...]) or (None, []) if unreachable"""
+        dest_lat, dest_lng = self.coordinates[destination]
+
+        def heuristic(node):
+            lat, lng = self.coordinates[node]
+            return haversine_miles(lat, lng, dest_lat, dest_lng) * METERS_PER_MILE / self.max_speed_mps
+
+        best = {origin: 0.0}
+        previous = {}
+        heap = [(heuristic(origin), 0.0, origin)]
+        while heap:
+            _, seconds, node = heapq.heappop(heap)
+            if node == destination:
+                path = [node]
+                while node in previous:
+                    node = previous[node]
+                    path.append(node)
+                return seconds, path[::-1]
+            if seconds > best.get(node, float("inf")):
+                continue
+            for neighbor, cost in self.adjacency[node]:
+                candidate = seconds + cost
+                if candidate < best.get(neighbor, float("inf")):
+                    best[neighbor] = candidate
+                    previous[neighbor] = node
+                    heapq.heappush(heap, (candidate + heuristic(neighbor), candidate, neighbor))
+        return None, []
+
+    def isochrone(self, lat, lng, minutes):
+        """Get the (lat, lng) of road nodes reachable within `minutes` of driving from a location"""
+        origin, access_miles = self.snap(lat, lng)
+        if origin is None:
+            return []
+        budget = minutes * 60 - access_miles / ACCESS_SPEED_MPH * 3600
+        if budget < 0:
+            return []
+        tree = self.shortest_path_tree(origin, max(budget, ROUTING_MAX_SECONDS))
+        return [self.coordinates[node] for node, seconds in tree.items() if seconds <= budget]
+
+
+def convex_hull(points):
+    """Convex hull of (lat, lng) points in counter-clockwise order (monotone chain)"""
+    points = sorted(set(points))
+    if len(points) <= 2:
+        return points
+
+    def cross(o, a, b):
+        return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+    lower, upper = [], []
+    for point in points:
+        while len(lower) >= 2 and cross(lower[-2], lower[-1], point) <= 0:
+            lower.pop()
+        lower.append(point)
+    for point in reversed(points):
+        while len(upper) >= 2 and cross(upper[-2], upper[-1], point) <= 0:
+            upper.pop()
+        upper.append(point)
+    return lower[:-1] + upper[:-1]
+
+
+def parse_wait_minutes(wait_time):
+    """Parse a reported wait such as "15 minutes" or "1 hour" into minutes (0 if unknown)"""
+    if isinstance(wait_time, (int, float)):
+        return float(wait_time)
+    match = re.search(r"(\d+(?:\.\d+)?)\s*(h|hour|hours|min|mins|minute|minutes)?", str(wait_time or ""), re.I)
+    if not match:
+        return 0.0
+    value = float(match.group(1))
+    return value * 60 if (match.group(2) or "").lower().startswith("h") else value
+
+
+_graph = None
+_graph_version = None
+_graph_lock = threading.Lock()
+
+
+def get_road_graph(path=ROAD_GRAPH_FILE):
+    """Get the process-wide road graph, reloading it if the file changed; None if no graph is installed"""
+    global _graph, _graph_version
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    version = (path, stat.st_mtime_ns, stat.st_size)
+    with _graph_lock:
+        if version != _graph_version:
+            _graph = RoadGraph.load(path)
+            _graph_version = version
+        return _graph
+
+
+def estimate_eta_minutes(origin, destinations, graph=None):
+    """Drive time in minutes from one location to each destination location.
+
+    Uses the origin's cached search, grown only until every destination is
+    settled, plus straight-line access legs at each end. Without a road graph, or for destinations off the graph,
+    falls back to straight-line distance at FALLBACK_SPEED_MPH. Returns a list
+    of (minutes, routed) pairs, routed being False for fallback estimates.
+    """
+    graph = graph if graph is not None else get_road_graph()
+    results = []
+    snapped = [(None, None)] * len(destinations)
+    seconds = {}
+    if graph is not None:
+        origin_node, origin_access = graph.snap(origin["lat"], origin["lng"])
+        if origin_node is not None:
+            snapped = [graph.snap(destination["lat"], destination["lng"]) for destination in destinations]
+            seconds = graph.travel_seconds(origin_node, {node for node, _ in snapped if node is not None})
+
+    for destination, (node, access) in zip(destinations, snapped):
+        if node in seconds:
+            access_hours = (origin_access + access) / ACCESS_SPEED_MPH
+            results.append((seconds[node] / 60 + access_hours * 60, True))
+            continue
+        miles = haversine_miles(origin["lat"], origin["lng"], destination["lat"], destination["lng"])
+        results.append((miles / FALLBACK_SPEED_MPH * 60, False))
+    return results
+
+
+def rank_by_eta(origin, facilities, graph=None):
+    """Annotate facilities with eta_minutes, er_wait_minutes and total_minutes, and sort by total"""
+    etas = estimate_eta_minutes(origin, [facility["coordinates"] for facility in facilities], graph)
+    ranked = []
+    for facility, (eta, routed) in zip(facilities, etas):
+        facility = facility.copy()
+        facility["eta_minutes"] = round(eta, 1)
+        facility["eta_routed"] = routed
+        facility["er_wait_minutes"] = parse_wait_minutes(facility.get("wait_time"))
+        facility["total_minutes"] = round(eta + facility["er_wait_minutes"], 1)
+        ranked.append(facility)
+    ranked.sort(key=lambda facility: facility["total_minutes"])
+    return ranked
+
+
+def _parse_maxspeed(value):
+    """Parse an OSM maxspeed tag ("50", "30 mph") into km/h"""
+    match = re.match(r"\s*(\d+(?:\.\d+)?)\s*(mph)?", value or "")
+    if not match:
+        return None
+    speed = float(match.group(1))
+    return speed * 1.609344 if match.group(2) else speed
+
+
+def build_graph_from_osm(osm_path, output_path=ROAD_GRAPH_FILE):
+    """Convert an OSM XML extract into the road graph file, streaming the XML.
+
+    Keeps drivable highways only. Each way is split into node-to-node edges
+    with length from the Haversine distance and speed from maxspeed or the
+    highway class.
+    """
+    import xml.etree.ElementTree as ET
+
+    coordinates = {}
+    ways = []
+    for _, element in ET.iterparse(osm_path, events=("end",)):
+        if element.tag == "node":
+            coordinates[element.get("id")] = (float(element.get("lat")), float(element.get("lon")))
+            element.clear()
+        elif element.tag == "way":
+            tags = {tag.get("k"): tag.get("v") for tag in element.findall("tag")}
+            highway = tags.get("highway")
+            if highway in HIGHWAY_SPEEDS_KPH:
+                speed = _parse_maxspeed(tags.get("maxspeed")) or HIGHWAY_SPEEDS_KPH[highway]
+                oneway = tags.get("oneway") in ("yes", "1", "true", "-1") or highway.startswith("motorway")
+                refs = [nd.get("ref") for nd in element.findall("nd")]
+                if tags.get("oneway") == "-1":
+                    # One-way against the drawing direction of the way
+                    refs.reverse()
+                ways.append((refs, speed, oneway))
+            element.clear()
+        elif element.tag == "relation":
+            element.clear()
+
+    used = set()
+    edges = []
+    for refs, speed, oneway in ways:
+        for a, b in zip(refs, refs[1:]):
+            if a not in coordinates or b not in coordinates:
+                continue
+            meters = haversine_miles(*coordinates[a], *coordinates[b]) * METERS_PER_MILE
+            edges.append([a, b, round(meters, 1), speed, 1 if oneway else 0])
+            used.update((a, b))
+
+    nodes = [[node_id, *coordinates[node_id]] for node_id in used]
+    with open(output_path, "w") as f:
+        json.dump({"nodes": nodes, "edges": edges}, f)
+    return len(nodes), len(edges)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] != "build":
+        print("Usage: python -m utils.routing build <extract.osm> [output.json]")
+        sys.exit(1)
+    node_count, edge_count = build_graph_from_osm(sys.argv[2], *sys.argv[3:4])
+    print(f"Road graph written: {node_count} nodes, {edge_count} edges.")
@@ -0,0 +1,188 @@
+"""
+Grid-based spatial index for facility lookups
+Points are bucketed into fixed-size lat/lng cells so radius and k-nearest
+queries only visit the cells around the query point
+"""
+
+import math
+import heapq
+
+EARTH_RADIUS_MILES = 3959
+MILES_PER_DEGREE_LAT = 69.05
+
+# ~7 miles of latitude per cell; a regional registry averages a handful of points per cell
+DEFAULT_CELL_SIZE = 0.1
+
+
+def haversine_miles(lat1, lng1, lat2, lng2):
+    """Great-circle distance between two points in miles"""
+    lat1_rad = math.radians(lat1)
+    lat2_rad = math.radians(lat2)
+    delta_lat = math.radians(lat2 - lat1)
+    delta_lng = math.radians(lng2 - lng1)
+
+    a = (math.sin(delta_lat / 2) ** 2 +
+         math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lng / 2) ** 2)
+    return EARTH_RADIUS_MILES * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def bounding_box(lat, lng, radius_miles):
+    """Get (min_lat, max_lat, min_lng, max_lng) enclosing a radius around a point"""
+    delta_lat = radius_miles / MILES_PER_DEGREE_LAT
+    min_lat = max(-90.0, lat - delta_lat)
+    max_lat = min(90.0, lat + delta_lat)
+    # Longitude degrees shrink towards the poles; widen the box by the most poleward latitude
+    cos_lat = math.cos(math.radians(min(89.9, max(abs(min_lat), abs(max_lat)))))
+    delta_lng = min(180.0, radius_miles / (MILES_PER_DEGREE_LAT * cos_lat))
+    return min_lat, max_lat, lng - delta_lng, lng + delta_lng
+
+
+class GeoGridIndex:
+    """Fixed-grid spatial index supporting radius, k-nearest and incremental updates"""
+
+    def __init__(self, cell_size=DEFAULT_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}  # (row, col) -> set of item ids
+        self.items = {}  # item id -> (lat, lng, payload)
+        self._bounds = None  # (min_row, max_row, min_col, max_col) of occupied cells
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, item_id):
+        return item_id in self.items
+
+    def _cell(self, lat, lng):
+        return math.floor(lat / self.cell_size), math.floor(lng / self.cell_size)
+
+    def insert(self, item_id, lat, lng, payload=None):
+        """Add an item, replacing any existing item with the same id"""
+        if item_id in self.items:
+            self.remove(item_id)
+        cell = self._cell(lat, lng)
+        self.cells.setdefault(cell, set()).add(item_id)
+        self.items[item_id] = (lat, lng, payload)
+
+        row, col = cell
+        if self._bounds is None:
+            self._bounds = (row, row, col, col)
+        else:
+            min_row, max_row, min_col, max_col = self._bounds
+            self._bounds = (min(min_row, row), max(max_row, row), min(min_col, col), max(max_col, col))
+
+    def remove(self, item_id):
+        """Remove an item; returns False if it was not indexed"""
+        entry = self.items.pop(item_id, None)
+        if entry is None:
+            return False
+        cell = self._cell(entry[0], entry[1])
+        bucket = self.cells.get(cell)
+        if bucket is not None:
+            bucket.discard(item_id)
+            if not bucket:
+                del self.cells[cell]
+        # Bounds are left as-is; they only limit how far a search may expand
+        if not self.items:
+            self._bounds = None
+        return True
+
+    def within(self, lat, lng, radius_miles, limit=None, where=None):
+        """Get (distance, item_id, payload) for items within a radius, nearest first.
+
+        where, if given, is a predicate on the payload; items failing it are skipped.
+        """
+        min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius_miles)
+        min_row, min_col = self._cell(min_lat, min_lng)
+        max_row, max_col = self._cell(max_lat, max_lng)
+
+        matches = []
+        if (max_row - min_row + 1) * (max_col - min_col + 1) > len(self.cells):
+            # Radius covers more cells than are occupied; walk the occupied ones instead
+            candidate_cells = [
+                cell for cell in self.cells
+                if min_row <= cell[0] <= max_row and min_col <= cell[1] <= max_col
+            ]
+        else:
+            candidate_cells = [
+                (row, col) for row in range(min_row, max_row + 1) for col in range(min_col, max_col + 1)
+                if (row, col) in self.cells
+            ]
+
+        for cell in candidate_cells:
+            for item_id in self.cells[cell]:
+                item_lat, item_lng, payload = self.items[item_id]
+                # Cheap bounding-box rejection before the trigonometry
+                if not (min_lat <= item_lat <= max_lat and min_lng <= item_lng <= max_lng):
+                    continue
+                if where is not None and not where(payload):
+                    continue
+                distance = haversine_miles(lat, lng, item_lat, item_lng)
+                if distance <= radius_miles:
+                    matches.append((distance, item_id, payload))
+
+        matches.sort(key=lambda match: match[0])
+        return matches[:limit] if limit is not None else matches
+
+    def _ring_lower_bound(self, lat, ring):
+        """Lower bound in miles on the distance to any item in cells `ring` steps from the query cell"""
+        if ring <= 1:
+            return 0.0
+        degrees = (ring - 1) * self.cell_size
+        cos_lat = math.cos(math.radians(min(89.9, abs(lat) + ring * self.cell_size)))
+        return degrees * MILES_PER_DEGREE_LAT * cos_lat
+
+    def nearest(self, lat, lng, k=1, max_distance=None, where=None):
+        """Get the k nearest (distance, item_id, payload) whose payload passes `where`, nearest first"""
+        if not self.items or k <= 0:
+            return []
+        row0, col0 = self._cell(lat, lng)
+        min_row, max_row, min_col, max_col = self._bounds
+        max_ring = max(abs(row0 - min_row), abs(row0 - max_row), abs(col0 - min_col), abs(col0 - max_col))
+
+        best = []  # max-heap of (-distance, item_id, payload) holding the k nearest so far
+        for ring in range(max_ring + 1):
+            bound = self._ring_lower_bound(lat, ring)
+            if max_distance is not None and bound > max_distance:
+                break
+            if len(best) == k and bound > -best[0][0]:
+                break
+            if 8 * ring > len(self.cells):
+                # Rings now hold more cells than are occupied; scan the remaining occupied cells once
+                cells = [
+                    cell for cell in self.cells
+                    if max(abs(cell[0] - row0), abs(cell[1] - col0)) >= ring
+                ]
+            else:
+                cells = self._ring_cells(row0, col0, ring)
+            for cell in cells:
+                bucket = self.cells.get(cell)
+                if not bucket:
+                    continue
+                for item_id in bucket:
+                    item_lat, item_lng, payload = self.items[item_id]
+                    if where is not None and not where(payload):
+                        continue
+                    distance = haversine_miles(lat, lng, item_lat, item_lng)
+                    if max_distance is not None and distance > max_distance:
+                        continue
+                    if len(best) < k:
+                        heapq.heappush(best, (-distance, item_id, payload))
+                    elif distance < -best[0][0]:
+                        heapq.heapreplace(best, (-distance, item_id, payload))
+            if 8 * ring > len(self.cells):
+                break
+
+        return sorted(((-neg, item_id, payload) for neg, item_id, payload in best), key=lambda match: match[0])
+
+    @staticmethod
+    def _ring_cells(row0, col0, ring):
+        """Yield the cells on the square ring at Chebyshev distance `ring` from (row0, col0)"""
+        if ring == 0:
+            yield row0, col0
+            return
+        for col in range(col0 - ring, col0 + ring + 1):
+            yield row0 - ring, col
+            yield row0 + ring, col
+        for row in range(row0 - ring + 1, row0 + ring):
+            yield row, col0 - ring
+            yield row, col0 + ring
@@ -0,0 +1,204 @@
+"""
+Streamlit-free symptom triage
+assess_text scores one message against the triage rule catalog; triage_batch
+runs it over large lists or iterators across a process pool, e.g. to re-triage
+historical symptom text after a rule change
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from utils.triage_rules import TriageCatalog, TriageMatcher, get_triage_catalog, matches_in
+
+# Facility capabilities a detected condition needs, most specific first
+CONDITION_CAPABILITIES = {
+    "chest_pain": ["emergency_room", "cardiology"],
+    "difficulty_breathing": ["emergency_room"],
+    "severe_headache": ["emergency_room", "neurology"],
+    "stroke_symptoms": ["emergency_room", "neurology"],
+    "allergic_reaction": ["emergency_room"],
+    "severe_bleeding": ["emergency_room", "trauma_center"],
+    "loss_of_consciousness": ["emergency_room", "neurology"],
+    "severe_abdominal_pain": ["emergency_room", "surgery"],
+    "poisoning": ["emergency_room"],
+    "severe_burn": ["emergency_room", "trauma_center"],
+    "direct_emergency_request": ["emergency_room"]
+}
+
+EMERGENCY_SCORE_THRESHOLD = 8
+
+# Texts sent to a worker process at a time
+TRIAGE_BATCH_CHUNK_SIZE = 256
+
+
+def get_required_capabilities(detected_conditions):
+    """Get the facility capabilities needed by the detected conditions, most severe condition's first"""
+    required = []
+    for condition in sorted(detected_conditions, key=lambda c: c["severity"], reverse=True):
+        for capability in CONDITION_CAPABILITIES.get(condition["condition"], ["emergency_room"]):
+            if capability not in required:
+                required.append(capability)
+    return required
+
+
+def get_emergency_recommendation(score):
+    """Get emergency recommendation based on severity"""
+    if score >= 10:
+        return {
+            "level": "CRITICAL",
+            "action": "CALL 911 IMMEDIATELY",
+            "message": "Critical emergency detected. Call emergency services now!",
+            "color": "error"
+        }
+    elif score >= 8:
+        return {
+            "level": "URGENT",
+            "action": "SEEK IMMEDIATE MEDICAL ATTENTION",
+            "message": "Urgent medical attention required. Go to emergency room or call 911.",
+            "color": "error"
+        }
+    elif score >= 5:
+        return {
+            "level": "CONCERNING",
+            "action": "CONTACT HEALTHCARE PROVIDER",
+            "message": "Concerning symptoms. Contact your doctor or urgent care.",
+            "color": "warning"
+        }
+    else:
+        return {
+            "level": "MONITOR",
+            "action": "MONITOR SYMPTOMS",
+            "message": "Monitor symptoms and seek care if they worsen.",
+            "color": "info"
+        }
+
+
+def classify_severity_level(matches, catalog):
+    """Map triage matches to a critical/moderate/mild severity level"""
+    # Critical symptoms that always require emergency response
+    if matches_in(matches, "critical_symptoms"):
+        return {
+            "severity": "critical",
+            "requires_emergency": True,
+            "confidence": 0.95,
+            "recommendation": "Seek immediate emergency medical attention",
+            "rules_version": catalog.version
+        }
+
+    if matches_in(matches, "moderate_symptoms"):
+        return {
+            "severity": "moderate",
+            "requires_emergency": False,
+            "confidence": 0.7,
+            "recommendation": "Consider urgent care or contact your doctor today",
+            "rules_version": catalog.version
+        }
+
+    return {
+        "severity": "mild",
+        "requires_emergency": False,
+        "confidence": 0.6,
+        "recommendation": "Monitor symptoms and consult healthcare provider if they worsen",
+        "rules_version": catalog.version
+    }
+
+
+def assess_text(symptoms_text, additional_info="", catalog=None, include_severity_level=True):
+    """Assess if symptoms require emergency response.
+
+    include_severity_level adds the critical-symptom override that the AI
+    severity analysis contributes in the app when models are loaded.
+    """
+    combined_text = f"{symptoms_text} {additional_info}"
+
+    # One catalog version for the whole assessment, even if the file is reloaded meanwhile
+    catalog = catalog or get_triage_catalog()
+
+    # One pass over the text finds every rule keyword, with its position
+    matches = catalog.matcher.scan(combined_text)
+    severity_level = classify_severity_level(matches, catalog) if include_severity_level else None
+
+    emergency_score = 0
+    detected_emergencies = []
+
+    # Direct emergency keywords are scored after the condition keywords
+    for rule_set in ("severe_symptoms", "emergency_phrases"):
+        seen = set()
+        for match in matches_in(matches, rule_set):
+            # Each keyword counts once however often it is repeated
+            if match.order in seen:
+                continue
+            seen.add(match.order)
+            severity = catalog.rules[rule_set][match.label]["severity"]
+            emergency_score += severity
+            detected_emergencies.append({
+                "condition": match.label,
+                "severity": severity,
+                "keyword": match.keyword,
+                "position": [match.start, match.end]
+            })
+
+        if rule_set == "severe_symptoms" and severity_level and severity_level["requires_emergency"]:
+            emergency_score = max(emergency_score, 50)  # Ensure high priority for critical symptoms
+
+    return {
+        "is_emergency": emergency_score >= EMERGENCY_SCORE_THRESHOLD,
+        "severity_score": emergency_score,
+        "detected_conditions": detected_emergencies,
+        "required_capabilities": get_required_capabilities(detected_emergencies),
+        "recommendation": get_emergency_recommendation(emergency_score),
+        "rules_version": catalog.version
+    }
+
+
+_worker_catalog = None
+
+
+def _init_worker(version, rules, path):
+    """Compile the caller's catalog once per worker so the whole batch uses one rules version"""
+    global _worker_catalog
+    _worker_catalog = TriageCatalog(version, rules, TriageMatcher(rules), path)
+
+
+def _assess_chunk(texts, include_severity_level):
+    return [assess_text(text, catalog=_worker_catalog, include_severity_level=include_severity_level)
+            for text in texts]
+
+
+def _chunks(texts, size):
+    iterator = iter(texts)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def triage_batch(texts, processes=None, chunk_size=TRIAGE_BATCH_CHUNK_SIZE, include_severity_level=True, catalog=None):
+    """Yield assess_text results for texts, in input order.
+
+    texts may be any iterable, including a lazy one; at most two chunks per
+    worker are in flight, so memory stays bounded for very large inputs.
+    processes=1 runs in the calling process.
+    """
+    catalog = catalog or get_triage_catalog()
+    processes = processes or os.cpu_count() or 1
+    if processes == 1:
+        for text in texts:
+            yield assess_text(text, catalog=catalog, include_severity_level=include_severity_level)
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=processes, initializer=_init_worker,
+        initargs=(catalog.version, catalog.rules, catalog.path)
+    ) as executor:
+        pending = deque()
+        for chunk in _chunks(texts, chunk_size):
+            pending.append(executor.submit(_assess_chunk, chunk, include_severity_level))
+            if len(pending) >= processes * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
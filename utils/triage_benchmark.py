@@ -0,0 +1,197 @@
+"""
+Offline triage benchmark
+Runs the triage rules over a labeled corpus and reports throughput, per-text
+latency and the emergency/non-emergency confusion matrix. The bundled corpus is
+synthetic and regenerated with --generate
+"""
+
+import os
+import json
+import time
+import random
+import argparse
+
+from utils.triage import assess_text, triage_batch
+from utils.triage_rules import get_triage_catalog
+
+CORPUS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "triage_corpus.jsonl")
+
+# Messages that need emergency care, whatever words the rules happen to key on
+EMERGENCY_TEMPLATES = [
+    "{who} has crushing chest pain radiating to the left arm",
+    "{who} suddenly can't breathe and {pronoun} lips are turning blue",
+    "{who} collapsed and is unconscious on the floor",
+    "{who} has face drooping on one side and arm weakness",
+    "the cut on {pronoun} leg is bleeding heavily and won't stop",
+    "{who} took an overdose of {pronoun} sleeping pills",
+    "{who} is gasping for air after a bee sting and {pronoun} throat is swelling",
+    "worst headache of {pronoun} life came on suddenly {when}",
+    "{who} passed out {when} and is hard to wake up",
+    "{who} is having a seizure and won't respond",
+    "{who} spilled drain cleaner on {pronoun} arm, a chemical burn over a large area",
+    "{who} drank something toxic from under the sink",
+    "{who} fell off a ladder, blood is spurting from {pronoun} head",
+    "{who} says it feels like an elephant sitting on {pronoun} chest, sweating and nauseous",
+    "{who} is confused, slurring words and can't lift {pronoun} right arm",
+    "{who} has a stabbing pain in the belly and is vomiting blood",
+]
+
+# Messages that are not emergencies, including ones worded close to emergency keywords
+ROUTINE_TEMPLATES = [
+    "{who} has a runny nose and a mild cough since {when}",
+    "what are some tips for a healthy lifestyle",
+    "{who} has a mild headache after a long day at work",
+    "how much vitamin D should {who} take",
+    "{who} has a sore throat and a low fever since {when}",
+    "{who} gets heartburn after spicy food",
+    "{who} has some back pain after gardening {when}",
+    "is it normal to feel tired after a flu shot",
+    "{who} has a small rash on {pronoun} elbow that itches",
+    "{who} has no chest pain, just a stuffy nose",
+    "{who} has severe acne and wants to see a dermatologist",
+    "{who} had a sudden urge to sneeze all morning",
+    "can {who} take ibuprofen with {pronoun} blood pressure medication",
+    "{who} watched a movie about a heart attack and is anxious about {pronoun} diet",
+    "{who} twisted an ankle {when}, it is a bit swollen but can walk",
+    "{who} wants to know about emergency contraception options",
+]
+
+# Real phrasings that earlier rule engines got wrong, kept verbatim in every generated corpus
+REGRESSION_CASES = [
+    {"text": "I overdosed on sleeping pills", "is_emergency": True},
+    {"text": "he had two strokes last night", "is_emergency": True},
+    {"text": "my dad collapsed, unconsciousness", "is_emergency": True},
+    {"text": "my son is having seizures and won't wake up", "is_emergency": True},
+    {"text": "she's bleeding heavily from a cut on her hand", "is_emergency": True},
+    {"text": "my wife fainted and passed out again", "is_emergency": True},
+]
+
+FILLERS = {
+    "who": [("my father", "his"), ("my mother", "her"), ("my son", "his"), ("my daughter", "her"),
+            ("my husband", "his"), ("my wife", "her"), ("my grandfather", "his"), ("my roommate", "their")],
+    "when": ["this morning", "last night", "an hour ago", "yesterday", "two days ago", "after dinner"],
+    "prefix": ["", "", "help, ", "hi, ", "quick question: ", "please advise, "],
+    "suffix": ["", "", ".", "!", ". what should we do?", ". should i be worried?"],
+}
+
+
+def generate_corpus(size=2000, seed=7):
+    """Build a labeled synthetic corpus of {"text", "is_emergency"} records, half of each label, plus REGRESSION_CASES"""
+    rng = random.Random(seed)
+    corpus = []
+    for index in range(size):
+        is_emergency = index % 2 == 0
+        template = rng.choice(EMERGENCY_TEMPLATES if is_emergency else ROUTINE_TEMPLATES)
+        who, pronoun = rng.choice(FILLERS["who"])
+        text = template.format(who=who, pronoun=pronoun, when=rng.choice(FILLERS["when"]))
+        text = rng.choice(FILLERS["prefix"]) + text + rng.choice(FILLERS["suffix"])
+        corpus.append({"text": text, "is_emergency": is_emergency})
+    return corpus + [dict(case) for case in REGRESSION_CASES]
+
+
+def write_corpus(corpus, path=CORPUS_FILE):
+    """Write a corpus as JSON lines"""
+    with open(path, "w", encoding="utf-8") as f:
+        for record in corpus:
+            f.write(json.dumps(record) + "\n")
+
+
+def load_corpus(path=CORPUS_FILE):
+    """Read a JSON lines corpus of {"text", "is_emergency"} records"""
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+def run_benchmark(corpus, processes=None, repeat=1):
+    """Triage a labeled corpus and return throughput, latency and confusion-matrix figures.
+
+    Latency is per text, measured sequentially in this process; throughput is
+    for triage_batch over the corpus repeated `repeat` times.
+    """
+    catalog = get_triage_catalog()
+    texts = [record["text"] for record in corpus]
+
+    latencies = []
+    predictions = []
+    for text in texts:
+        started = time.perf_counter()
+        predictions.append(assess_text(text, catalog=catalog)["is_emergency"])
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+
+    started = time.perf_counter()
+    batch_count = sum(1 for _ in triage_batch((t for _ in range(repeat) for t in texts), processes, catalog=catalog))
+    elapsed = time.perf_counter() - started
+
+    confusion = {"true_positive": 0, "false_positive": 0, "false_negative": 0, "true_negative": 0}
+    misclassified = []
+    for record, predicted in zip(corpus, predictions):
+        actual = bool(record["is_emergency"])
+        if predicted and actual:
+            confusion["true_positive"] += 1
+        elif predicted:
+            confusion["false_positive"] += 1
+        elif actual:
+            confusion["false_negative"] += 1
+        else:
+            confusion["true_negative"] += 1
+        if predicted != actual:
+            misclassified.append(record)
+
+    flagged = confusion["true_positive"] + confusion["false_positive"]
+    emergencies = confusion["true_positive"] + confusion["false_negative"]
+    return {
+        "rules_version": catalog.version,
+        "texts": batch_count,
+        "processes": processes or os.cpu_count() or 1,
+        "throughput_per_second": batch_count / elapsed if elapsed else 0.0,
+        "latency_p50_ms": percentile(latencies, 0.50) * 1000,
+        "latency_p99_ms": percentile(latencies, 0.99) * 1000,
+        "confusion": confusion,
+        "precision": confusion["true_positive"] / flagged if flagged else 0.0,
+        "recall": confusion["true_positive"] / emergencies if emergencies else 0.0,
+        "accuracy": (confusion["true_positive"] + confusion["true_negative"]) / len(corpus) if corpus else 0.0,
+        "misclassified": misclassified,
+    }
+
+
+def print_report(report, show_errors=0):
+    """Print a benchmark report"""
+    confusion = report["confusion"]
+    print(f"Rules version: {report['rules_version']}")
+    print(f"Throughput: {report['throughput_per_second']:,.0f} texts/s "
+          f"({report['texts']} texts, {report['processes']} processes)")
+    print(f"Latency: p50 {report['latency_p50_ms']:.3f} ms, p99 {report['latency_p99_ms']:.3f} ms")
+    print("Confusion matrix (rows actual, columns predicted):")
+    print(f"{'':>16}{'emergency':>12}{'other':>12}")
+    print(f"{'emergency':>16}{confusion['true_positive']:>12}{confusion['false_negative']:>12}")
+    print(f"{'other':>16}{confusion['false_positive']:>12}{confusion['true_negative']:>12}")
+    print(f"Precision {report['precision']:.3f}, recall {report['recall']:.3f}, accuracy {report['accuracy']:.3f}")
+    for record in report["misclassified"][:show_errors]:
+        label = "emergency" if record["is_emergency"] else "other"
+        print(f"  misclassified, actually {label}: {record['text']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark triage rules against a labeled corpus")
+    parser.add_argument("--corpus", default=CORPUS_FILE, help="JSON lines file of {text, is_emergency} records")
+    parser.add_argument("--processes", type=int, help="Worker processes for the batch run (default: CPU count)")
+    parser.add_argument("--repeat", type=int, default=10, help="Times the corpus is repeated for the throughput run")
+    parser.add_argument("--show-errors", type=int, default=10, help="Misclassified texts to print")
+    parser.add_argument("--generate", type=int, metavar="SIZE", help="Regenerate the synthetic corpus with SIZE records and exit")
+    parser.add_argument("--seed", type=int, default=7, help="Random seed for --generate")
+    args = parser.parse_args()
+
+    if args.generate:
+        write_corpus(generate_corpus(args.generate, args.seed), args.corpus)
+        print(f"Wrote {args.generate + len(REGRESSION_CASES)} records to {args.corpus}")
+    else:
+        print_report(run_benchmark(load_corpus(args.corpus), args.processes, args.repeat), args.show_errors)
@@ -0,0 +1,248 @@
+"""
+Triage rule engine shared by the emergency and AI fallback paths
+Every keyword of the rule catalog is compiled into one Aho-Corasick automaton,
+so a message is scanned once regardless of how many rules there are; the
+catalog file is reloaded and recompiled when it changes
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import deque
+from dataclasses import dataclass
+
+# Versioned rule catalog: {"version": ..., "rules": {rule set -> label -> rule}}.
+# Every rule has "keywords"; other fields (e.g. "severity") are read by the caller
+DEFAULT_TRIAGE_RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "triage_rules.json")
+TRIAGE_RULES_FILE = os.getenv("TRIAGE_RULES_FILE", DEFAULT_TRIAGE_RULES_FILE)
+# How often, in seconds, the catalog file is checked for changes
+TRIAGE_RULES_CHECK_INTERVAL = float(os.getenv("TRIAGE_RULES_CHECK_INTERVAL", "2"))
+
+# Rule sets the triage code reads, and whether their rules need a severity
+REQUIRED_RULE_SETS = {
+    "severe_symptoms": True,
+    "emergency_phrases": True,
+    "critical_symptoms": False,
+    "moderate_symptoms": False,
+    "fallback_emergency": False,
+    "wellness_topics": False,
+}
+
+
+@dataclass(frozen=True)
+class TriageMatch:
+    """One keyword occurrence; order is the keyword's position in the rule catalog"""
+    rule_set: str
+    label: str
+    keyword: str
+    start: int
+    end: int
+    order: int
+
+
+def _fold_char(char):
+    lowered = char.lower()
+    # Some characters lowercase to more than one ("İ" -> "i" + combining dot); keep the base letter
+    return lowered[0] if lowered else char
+
+
+def normalize_text(text):
+    """Lowercase text and straighten typographic apostrophes, one character for one, so indices match text"""
+    lowered = text.lower()
+    if len(lowered) != len(text):
+        lowered = "".join(_fold_char(char) for char in text)
+    return lowered.replace("’", "'").replace("‘", "'")
+
+
+# Endings a keyword may carry and still match ("strokes", "overdosed", "unconsciousness")
+INFLECTION_SUFFIXES = frozenset(("s", "es", "d", "ed", "ing", "ly", "ness"))
+
+
+def _is_word_char(char):
+    return char.isalnum() or char == "_"
+
+
+def _word_end(text, end):
+    """Get where the word containing text[end - 1] ends if the rest of it is an allowed suffix, else None"""
+    stop = end
+    while stop < len(text) and _is_word_char(text[stop]):
+        stop += 1
+    if stop == end or text[end:stop] in INFLECTION_SUFFIXES:
+        return stop
+    return None
+
+
+class TriageMatcher:
+    """Aho-Corasick automaton over the keywords of a rule catalog"""
+
+    def __init__(self, rules):
+        self.rules = rules
+        self._goto = [{}]
+        self._fail = [0]
+        # node -> [(keyword length, rule_set, label, keyword, order)] for keywords ending there
+        self._outputs = [[]]
+        order = 0
+        for rule_set, labelled in rules.items():
+            for label, rule in labelled.items():
+                for keyword in rule["keywords"]:
+                    self._add(normalize_text(keyword), (rule_set, label, keyword, order))
+                    order += 1
+        self._build_failure_links()
+
+    def _add(self, keyword, output):
+        node = 0
+        for char in keyword:
+            nxt = self._goto[node].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append([])
+            node = nxt
+        self._outputs[node].append((len(keyword),) + output)
+
+    def _build_failure_links(self):
+        # Depth-one nodes keep the root as their failure link
+        pending = deque(self._goto[0].values())
+        while pending:
+            node = pending.popleft()
+            for char, child in self._goto[node].items():
+                pending.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                # A node also reports every keyword that is a suffix of its own
+                self._outputs[child] = self._outputs[child] + self._outputs[self._fail[child]]
+
+    def scan(self, text):
+        """Find every keyword occurrence in text in one pass, overlapping ones included.
+
+        A keyword must start at a word boundary and may end with one of
+        INFLECTION_SUFFIXES, which the match then spans. Matches are ordered by
+        the position the keyword ends at; start/end index into text.
+        """
+        text = normalize_text(text)
+        goto, fail, outputs = self._goto, self._fail, self._outputs
+        matches = []
+        node = 0
+        for index, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if not outputs[node]:
+                continue
+            end = index + 1
+            word_end = _word_end(text, end)
+            if word_end is None:
+                continue
+            for length, rule_set, label, keyword, order in outputs[node]:
+                start = end - length
+                if start > 0 and _is_word_char(text[start - 1]):
+                    continue
+                matches.append(TriageMatch(rule_set, label, keyword, start, word_end, order))
+        return matches
+
+
+def matches_in(matches, rule_set):
+    """Get the matches of one rule set, in catalog order"""
+    return sorted((m for m in matches if m.rule_set == rule_set), key=lambda m: (m.order, m.start))
+
+
+def validate_rules(rules):
+    """Raise ValueError if a rule catalog is missing rule sets or has malformed rules"""
+    if not isinstance(rules, dict):
+        raise ValueError("rules must be an object")
+    for rule_set in REQUIRED_RULE_SETS:
+        if not isinstance(rules.get(rule_set), dict):
+            raise ValueError(f"missing rule set {rule_set!r}")
+    for rule_set, labelled in rules.items():
+        for label, rule in labelled.items():
+            keywords = rule.get("keywords") if isinstance(rule, dict) else None
+            if not keywords or not all(isinstance(k, str) and k.strip() for k in keywords):
+                raise ValueError(f"{rule_set}.{label} needs a list of keywords")
+            if REQUIRED_RULE_SETS.get(rule_set) and not isinstance(rule.get("severity"), int):
+                raise ValueError(f"{rule_set}.{label} needs an integer severity")
+
+
+@dataclass(frozen=True)
+class TriageCatalog:
+    """One loaded version of the rule catalog and its compiled matcher.
+
+    version is the file's declared version plus a digest of its contents, so
+    an edit that forgets to bump the version is still distinguishable.
+    """
+    version: str
+    rules: dict
+    matcher: TriageMatcher
+    path: str
+
+
+def load_triage_catalog(path):
+    """Load, validate and compile a rule catalog file"""
+    with open(path, "rb") as f:
+        raw = f.read()
+    document = json.loads(raw)
+    if not isinstance(document, dict) or not document.get("version"):
+        raise ValueError("catalog needs a version")
+    validate_rules(document.get("rules"))
+    digest = hashlib.sha256(raw).hexdigest()[:12]
+    rules = document["rules"]
+    return TriageCatalog(f"{document['version']}+{digest}", rules, TriageMatcher(rules), path)
+
+
+_catalog = None
+_catalog_stamp = None
+_catalog_checked_at = 0.0
+_catalog_error = None
+_catalog_lock = threading.Lock()
+
+
+def _file_stamp(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (path, stat.st_mtime_ns, stat.st_size)
+
+
+def get_triage_catalog(path=None):
+    """Get the process-wide rule catalog, reloading it if the file changed.
+
+    A catalog that fails to load or validate is ignored and the previous one
+    stays in use; the first load falls back to the catalog shipped with the
+    package. Callers hold on to the returned snapshot, so a reload never
+    changes the rules in the middle of an assessment.
+    """
+    global _catalog, _catalog_stamp, _catalog_checked_at, _catalog_error
+    path = path or TRIAGE_RULES_FILE
+    now = time.monotonic()
+    catalog = _catalog
+    if catalog is not None and catalog.path == path and now - _catalog_checked_at < TRIAGE_RULES_CHECK_INTERVAL:
+        return catalog
+
+    with _catalog_lock:
+        _catalog_checked_at = now
+        stamp = _file_stamp(path)
+        if _catalog is not None and stamp == _catalog_stamp:
+            return _catalog
+        try:
+            _catalog = load_triage_catalog(path)
+            _catalog_stamp = stamp
+            _catalog_error = None
+        except (OSError, ValueError) as e:
+            _catalog_error = f"{path}: {e}"
+            # Remember the bad file so it is not re-parsed on every check
+            _catalog_stamp = stamp
+            if _catalog is None:
+                _catalog = load_triage_catalog(DEFAULT_TRIAGE_RULES_FILE)
+        return _catalog
+
+
+def get_catalog_status():
+    """Get the active catalog version and the last load error, for status displays"""
+    catalog = get_triage_catalog()
+    return {"version": catalog.version, "path": catalog.path, "error": _catalog_error}